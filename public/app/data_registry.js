@@ -4,7 +4,11 @@ const COUNTRY_INFRA_CONFIG = {
   ES: {
     stationsUrl: `${INFRA_BASE}/stations_es.json`,
     railNodesUrl: `${INFRA_BASE}/rail_nodes_es.json`,
-    railLinksUrl: `${INFRA_BASE}/rail_links_es.json`
+    railLinksUrl: `${INFRA_BASE}/rail_links_es.json`,
+    railBundleUrl: `${INFRA_BASE}/rail_bundle_es.bin`,
+    stationTimesUrl: `${INFRA_BASE}/station_times_es.bin`,
+    railChUrl: `${INFRA_BASE}/rail_ch_es.bin`,
+    railLodUrl: `${INFRA_BASE}/rail_lod_es.json`
   }
 };
 
@@ -13,7 +17,11 @@ function getCountryConfig(countryCode){
   return COUNTRY_INFRA_CONFIG[code] || {
     stationsUrl: null,
     railNodesUrl: null,
-    railLinksUrl: null
+    railLinksUrl: null,
+    railBundleUrl: null,
+    stationTimesUrl: null,
+    railChUrl: null,
+    railLodUrl: null
   };
 }
 
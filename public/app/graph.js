@@ -151,7 +151,90 @@ function multiSourceDijkstra(sources, adjacency, edgeTimeFn = defaultEdgeTime){
   return result;
 }
 
+// Precomputed routing (tools/build_es_routing.py). Both helpers take bundles
+// decoded by decodeRailBundle; node and station arguments are row indices.
+const UNREACHABLE_MINUTES = 0xffff;
+
+function stationMatrixMinutes(times, stationA, stationB){
+  const rows = times?.tables?.stations?.row;
+  const minutes = times?.tables?.matrix?.minutes;
+  const size = times?.header?.meta?.size;
+  if (!rows || !minutes || !size) return null;
+  const i = rows[stationA];
+  const j = rows[stationB];
+  if (i === undefined || j === undefined || i >= size || j >= size) return null;
+  const value = minutes[i * size + j];
+  return value === UNREACHABLE_MINUTES ? null : value;
+}
+
+function chTravelTime(ch, source, target){
+  const nodes = ch?.tables?.nodes;
+  const edges = ch?.tables?.edges;
+  if (!nodes || !edges || source == null || target == null) return null;
+  if (source === target) return 0;
+  const dist = [new Map([[source, 0]]), new Map([[target, 0]])];
+  const heaps = [[[0, source]], [[0, target]]];
+  const push = (heap, item) => {
+    heap.push(item);
+    let i = heap.length - 1;
+    while (i > 0){
+      const parent = (i - 1) >> 1;
+      if (heap[parent][0] <= heap[i][0]) break;
+      [heap[parent], heap[i]] = [heap[i], heap[parent]];
+      i = parent;
+    }
+  };
+  const pop = (heap) => {
+    const top = heap[0];
+    const last = heap.pop();
+    if (heap.length){
+      heap[0] = last;
+      let i = 0;
+      while (true){
+        const l = 2 * i + 1;
+        const r = l + 1;
+        let m = i;
+        if (l < heap.length && heap[l][0] < heap[m][0]) m = l;
+        if (r < heap.length && heap[r][0] < heap[m][0]) m = r;
+        if (m === i) break;
+        [heap[m], heap[i]] = [heap[i], heap[m]];
+        i = m;
+      }
+    }
+    return top;
+  };
+
+  let best = Infinity;
+  while (heaps[0].length || heaps[1].length){
+    for (let side = 0; side < 2; side++){
+      const heap = heaps[side];
+      if (!heap.length) continue;
+      const [d, node] = pop(heap);
+      if (d > (dist[side].get(node) ?? Infinity)) continue;
+      if (d >= best){
+        heap.length = 0;
+        continue;
+      }
+      const other = dist[1 - side].get(node);
+      if (other !== undefined) best = Math.min(best, d + other);
+      const start = nodes.up_start[node];
+      const end = start + nodes.up_count[node];
+      for (let e = start; e < end; e++){
+        const next = edges.target[e];
+        const alt = d + edges.minutes[e];
+        if (alt < (dist[side].get(next) ?? Infinity)){
+          dist[side].set(next, alt);
+          push(heap, [alt, next]);
+        }
+      }
+    }
+  }
+  return Number.isFinite(best) ? best : null;
+}
+
 window.haversineKm = haversineKm;
 window.buildAdjacencyFromTracks = buildAdjacencyFromTracks;
 window.dijkstraTravelTime = dijkstraTravelTime;
 window.multiSourceDijkstra = multiSourceDijkstra;
+window.stationMatrixMinutes = stationMatrixMinutes;
+window.chTravelTime = chTravelTime;
@@ -27,6 +27,82 @@ async function fetchJsonResource(url){
   return await response.json();
 }
 
+const RAIL_BUNDLE_MAGIC = "RAILBND\0";
+const RAIL_BUNDLE_VERSION = 1;
+const RAIL_BUNDLE_TYPES = {
+  float64: Float64Array,
+  float32: Float32Array,
+  int32: Int32Array,
+  uint32: Uint32Array,
+  uint16: Uint16Array,
+  uint8: Uint8Array
+};
+
+// Maps the columnar bundle written by tools/rail_bundle.py onto typed arrays.
+// Numeric columns are views over `buffer` (no copy); string columns decode on first access.
+function decodeRailBundle(buffer){
+  const bytes = new Uint8Array(buffer);
+  const magic = String.fromCharCode(...bytes.subarray(0, 8));
+  if (magic !== RAIL_BUNDLE_MAGIC) throw new Error("Not a rail bundle");
+  const headerLength = new DataView(buffer).getUint32(8, true);
+  const bodyStart = 12 + headerLength;
+  const header = JSON.parse(new TextDecoder().decode(bytes.subarray(12, bodyStart)));
+  if (header.schema !== "rail-bundle" || header.version !== RAIL_BUNDLE_VERSION) {
+    throw new Error(`Unsupported rail bundle ${header.schema} v${header.version}`);
+  }
+  const decoder = new TextDecoder();
+  const tables = {};
+  for (const column of header.columns) {
+    const count = header.counts[column.table];
+    const table = tables[column.table] || (tables[column.table] = { count });
+    const offset = bodyStart + column.offset;
+    if (column.type === "string") {
+      const offsets = new Uint32Array(buffer, offset, count + 1);
+      const data = bytes.subarray(bodyStart + column.data_offset, bodyStart + column.data_offset + column.data_length);
+      let cached = null;
+      Object.defineProperty(table, column.name, {
+        enumerable: true,
+        get(){
+          if (!cached) {
+            cached = new Array(count);
+            for (let i = 0; i < count; i++) cached[i] = decoder.decode(data.subarray(offsets[i], offsets[i + 1]));
+          }
+          return cached;
+        }
+      });
+    } else {
+      const ArrayType = RAIL_BUNDLE_TYPES[column.type];
+      if (!ArrayType) throw new Error(`Unknown rail bundle column type ${column.type}`);
+      table[column.name] = new ArrayType(buffer, offset, count);
+    }
+  }
+  return { header, bodyStart, tables };
+}
+
+async function verifyRailBundle(buffer, bundle){
+  if (!globalThis.crypto?.subtle) return true;
+  const body = buffer.slice(bundle.bodyStart, bundle.bodyStart + bundle.header.body_length);
+  const digest = new Uint8Array(await crypto.subtle.digest("SHA-256", body));
+  const hex = Array.from(digest, (b) => b.toString(16).padStart(2, "0")).join("");
+  return hex === bundle.header.checksum?.value;
+}
+
+// `urlKey` picks the bundle from the country config: railBundleUrl (graph),
+// stationTimesUrl (travel-time matrix) or railChUrl (contraction hierarchy).
+async function loadRailBundle(countryCode, { verify = true, urlKey = "railBundleUrl" } = {}){
+  const config = typeof getCountryConfig === "function" ? getCountryConfig(countryCode) : null;
+  const url = config?.[urlKey];
+  if (!url) return null;
+  const response = await fetch(url, { cache: "no-store" });
+  if (!response.ok) throw new Error(`Failed to load ${url} (${response.status})`);
+  const buffer = await response.arrayBuffer();
+  const bundle = decodeRailBundle(buffer);
+  if (verify && !(await verifyRailBundle(buffer, bundle))) {
+    throw new Error(`Checksum mismatch in ${url}`);
+  }
+  return bundle;
+}
+
 async function loadRealInfrastructure(countryCode){
   const fallbackPayload = { source: "FALLBACK", stationCount: 0, trackCount: 0, nodeCount: 0 };
   if (typeof getCountryConfig !== "function") {
@@ -81,3 +157,5 @@ async function loadRealInfrastructure(countryCode){
 
 window.loadRealInfrastructure = loadRealInfrastructure;
 window.getRealInfraStatus = getRealInfraStatus;
+window.decodeRailBundle = decodeRailBundle;
+window.loadRailBundle = loadRailBundle;
@@ -1339,6 +1339,67 @@ for (const id of nodeIds){
 
 
 
+// Contracted rail links carry their full geometry as an encoded polyline
+// (Google polyline algorithm, 1e-6 precision, lat/lon order).
+function decodeRailPolyline(encoded, precision = 6){
+  const scale = 10 ** precision;
+  const points = [];
+  let index = 0;
+  let lat = 0;
+  let lon = 0;
+  const nextValue = () => {
+    let result = 0;
+    let shift = 0;
+    let byte;
+    do {
+      byte = encoded.charCodeAt(index++) - 63;
+      result += (byte & 0x1f) * 2 ** shift;
+      shift += 5;
+    } while (byte >= 0x20 && index < encoded.length);
+    return result % 2 ? -(result + 1) / 2 : result / 2;
+  };
+  while (index < encoded.length){
+    lat += nextValue();
+    lon += nextValue();
+    points.push([lat / scale, lon / scale]);
+  }
+  return points;
+}
+
+// Simplified rail geometry per zoom (rail_lod_es.json + rail_lod_es_z<zoom>.json).
+// Levels load lazily; until one arrives the full-resolution polylines are drawn.
+const railLodCache = { index: undefined, levels: new Map() };
+
+function fetchRailLodJson(url, onLoad){
+  fetch(url)
+    .then(response => (response.ok ? response.json() : null))
+    .catch(() => null)
+    .then(data => {
+      onLoad(data);
+      renderRealInfrastructureOverlay();
+    });
+}
+
+function railLodPolylines(zoom){
+  const config = typeof getCountryConfig === "function" ? getCountryConfig(state.countryId || "ES") : null;
+  const indexUrl = config?.railLodUrl;
+  if (!indexUrl) return null;
+  if (railLodCache.index === undefined) {
+    railLodCache.index = null;
+    fetchRailLodJson(indexUrl, index => { railLodCache.index = index || { levels: [] }; });
+    return null;
+  }
+  const levels = (railLodCache.index?.levels || []).filter(level => level.zoom >= zoom);
+  if (!levels.length) return null;
+  const level = levels.reduce((best, candidate) => (candidate.zoom < best.zoom ? candidate : best));
+  if (!railLodCache.levels.has(level.zoom)) {
+    railLodCache.levels.set(level.zoom, null);
+    const url = indexUrl.slice(0, indexUrl.lastIndexOf("/") + 1) + level.file;
+    fetchRailLodJson(url, data => { railLodCache.levels.set(level.zoom, data?.links || null); });
+  }
+  return railLodCache.levels.get(level.zoom);
+}
+
 function renderRealInfrastructureOverlay(){
 
   if (!map) return;
@@ -1396,7 +1457,11 @@ function renderRealInfrastructureOverlay(){
 
   if (zoom < 5) return;
 
-  const sampleStep = zoom < 6 ? 5 : zoom < 7 ? 3 : 1;
+  const hasGeometry = railEdges.length > 0 && typeof railEdges[0].data?.polyline === "string";
+
+  const sampleStep = hasGeometry ? 1 : zoom < 6 ? 5 : zoom < 7 ? 3 : 1;
+
+  const lodPolylines = hasGeometry ? railLodPolylines(zoom) : null;
 
   const style = {
 
@@ -1447,6 +1512,13 @@ function renderRealInfrastructureOverlay(){
     const sourceId = String((edge.data.a ?? edge.data.from) || "").trim();
     const targetId = String((edge.data.b ?? edge.data.to) || "").trim();
     if (!edge.data || !sourceId || !targetId) continue;
+    if (edge.type === "rail" && typeof edge.data.polyline === "string" && edge.data.polyline) {
+      const points = decodeRailPolyline(lodPolylines?.[edge.data.id] || edge.data.polyline);
+      if (points.length >= 2) {
+        L.polyline(points, style).addTo(layers.railInfra);
+        continue;
+      }
+    }
     const from = edge.type === "rail"
       ? resolveRailNode(sourceId) || resolveStation(sourceId)
       : resolveStation(sourceId);
@@ -1,44 +1,135 @@
-/* global state, haversineKm */
+/* global state, haversineKm, decodeRailBundle */
 
 const POP_POINT_GRID_SCALE = 0.05;
 const POP_RADII_KM = [2, 5, 10, 20];
 
-let popPoints = [];
-let popGrid = new Map();
+// Pop points as columns (lat, lon, pop typed arrays, plus id/name/kind arrays when known),
+// Morton-ordered by the build so each 0.05° bucket is one contiguous run.
+let popColumns = null;
+// bucketKey -> [start, end) into the columns.
+let popBuckets = new Map();
+// Summed population per cell from pop_grid_es.json:
+// { cellDeg, cells: Map(cellKey -> { pop, lat, lon }) }, lat/lon being the population-weighted centroid.
+let popCellGrid = null;
+// Quadtree population pyramid from pop_pyramid_es.json and its per-zoom bundles:
+// { minZoom, maxZoom, levels: { [zoom]: cells table } }. Each level lists its populated
+// tile-z-x-y cells in Morton order, so a cell's children are one run [child, child + children).
+let popPyramid = null;
 
-function bucketKey(lat, lon){
-  const gx = Math.floor(lat / POP_POINT_GRID_SCALE);
-  const gy = Math.floor(lon / POP_POINT_GRID_SCALE);
+function cellKey(row, col){
+  return row * 1000000 + col;
+}
+
+function bucketKey(gx, gy){
   return `${gx}|${gy}`;
 }
 
-function buildPopGrid(){
-  popGrid.clear();
-  for (const point of popPoints){
-    if (!point) continue;
-    const key = bucketKey(point.lat, point.lon);
-    const list = popGrid.get(key) || [];
-    list.push(point);
-    popGrid.set(key, list);
+function setPopBuckets(rows, cols, starts, counts){
+  popBuckets = new Map();
+  for (let i = 0; i < starts.length; i++){
+    popBuckets.set(bucketKey(rows[i], cols[i]), [starts[i], starts[i] + counts[i]]);
   }
 }
 
+// Legacy pop_points_es.json (a plain array): order the points by bucket here.
+function indexPopRecords(records){
+  const keyed = records.map(point => ({
+    point,
+    gx: Math.floor(point.lat / POP_POINT_GRID_SCALE),
+    gy: Math.floor(point.lon / POP_POINT_GRID_SCALE)
+  }));
+  keyed.sort((a, b) => (a.gx - b.gx) || (a.gy - b.gy));
+  const rows = [];
+  const cols = [];
+  const starts = [];
+  const counts = [];
+  keyed.forEach((item, i) => {
+    if (!rows.length || rows[rows.length - 1] !== item.gx || cols[cols.length - 1] !== item.gy) {
+      rows.push(item.gx);
+      cols.push(item.gy);
+      starts.push(i);
+      counts.push(0);
+    }
+    counts[counts.length - 1] += 1;
+  });
+  return { points: keyed.map(item => item.point), buckets: { row: rows, col: cols, start: starts, count: counts } };
+}
+
+function setPopRecords(points, buckets){
+  popColumns = {
+    count: points.length,
+    lat: Float64Array.from(points, p => Number(p.lat)),
+    lon: Float64Array.from(points, p => Number(p.lon)),
+    pop: Float64Array.from(points, p => Math.max(0, Number(p.pop_est || 0))),
+    id: points.map(p => p.id),
+    name: points.map(p => p.name),
+    kind: points.map(p => p.kind)
+  };
+  setPopBuckets(buckets.row, buckets.col, buckets.start, buckets.count);
+}
+
+function setPopBundle(bundle){
+  const points = bundle.tables.points;
+  const kinds = bundle.header.meta?.kinds || [];
+  popColumns = {
+    count: points.count,
+    lat: points.lat,
+    lon: points.lon,
+    pop: points.pop_est,
+    get id(){ return points.id; },
+    get name(){ return points.name; },
+    get kind(){ return Array.from(points.kind, k => kinds[k]); }
+  };
+  const buckets = bundle.tables.buckets;
+  setPopBuckets(buckets.row, buckets.col, buckets.start, buckets.count);
+}
+
+function popPointRecord(i){
+  return {
+    id: popColumns.id?.[i],
+    name: popColumns.name?.[i],
+    lat: popColumns.lat[i],
+    lon: popColumns.lon[i],
+    pop_est: popColumns.pop[i],
+    kind: popColumns.kind?.[i]
+  };
+}
+
+// Indices of the points within radiusKm, reading only the buckets the radius can reach.
 function queryNearbyPoints(lat, lon, radiusKm){
-  if (!popPoints.length) return [];
+  if (!popColumns?.count) return [];
   const degRadius = radiusKm / 111;
   const delta = Math.ceil(degRadius / POP_POINT_GRID_SCALE) || 1;
+  // A degree of longitude shrinks with latitude, so the search needs more columns than rows.
+  const deltaLon = Math.ceil(degRadius / Math.max(0.1, Math.cos(lat * Math.PI / 180)) / POP_POINT_GRID_SCALE) || 1;
   const gx = Math.floor(lat / POP_POINT_GRID_SCALE);
   const gy = Math.floor(lon / POP_POINT_GRID_SCALE);
+  const { lat: lats, lon: lons } = popColumns;
   const result = [];
   for (let dx = -delta; dx <= delta; dx++){
-    for (let dy = -delta; dy <= delta; dy++){
-      const bucket = popGrid.get(`${gx + dx}|${gy + dy}`);
-      if (!bucket) continue;
-      for (const point of bucket){
-        if (!point) continue;
-        const d = haversineKm(lat, lon, point.lat, point.lon);
-        if (d <= radiusKm) {
-          result.push(point);
+    for (let dy = -deltaLon; dy <= deltaLon; dy++){
+      const range = popBuckets.get(bucketKey(gx + dx, gy + dy));
+      if (!range) continue;
+      for (let i = range[0]; i < range[1]; i++){
+        if (haversineKm(lat, lon, lats[i], lons[i]) <= radiusKm) result.push(i);
+      }
+    }
+  }
+  return result;
+}
+
+// Points inside a lat/lon box (e.g. the map viewport), read bucket by bucket.
+function popPointsInBounds(south, west, north, east){
+  if (!popColumns?.count) return [];
+  const result = [];
+  const { lat: lats, lon: lons } = popColumns;
+  for (let gx = Math.floor(south / POP_POINT_GRID_SCALE); gx <= Math.floor(north / POP_POINT_GRID_SCALE); gx++){
+    for (let gy = Math.floor(west / POP_POINT_GRID_SCALE); gy <= Math.floor(east / POP_POINT_GRID_SCALE); gy++){
+      const range = popBuckets.get(bucketKey(gx, gy));
+      if (!range) continue;
+      for (let i = range[0]; i < range[1]; i++){
+        if (lats[i] >= south && lats[i] <= north && lons[i] >= west && lons[i] <= east) {
+          result.push(popPointRecord(i));
         }
       }
     }
@@ -46,13 +137,43 @@ function queryNearbyPoints(lat, lon, radiusKm){
   return result;
 }
 
-function stationPlacementPopSummary(lat, lon){
+// Band totals from the summed cells whose centroid lies within each radius;
+// exact for single-place cells, otherwise accurate to about a cell (~1 km) at the band edges.
+function gridBandTotals(lat, lon){
+  const { cellDeg, cells } = popCellGrid;
+  const maxRadius = POP_RADII_KM[POP_RADII_KM.length - 1];
+  const cosLat = Math.max(0.1, Math.cos(lat * Math.PI / 180));
+  const dRow = Math.ceil(maxRadius / 111 / cellDeg) + 1;
+  const dCol = Math.ceil(maxRadius / (111 * cosLat) / cellDeg) + 1;
+  const row0 = Math.floor(lat / cellDeg);
+  const col0 = Math.floor(lon / cellDeg);
+  const totals = {};
+  for (const radius of POP_RADII_KM) totals[radius] = 0;
+  for (let row = row0 - dRow; row <= row0 + dRow; row++){
+    for (let col = col0 - dCol; col <= col0 + dCol; col++){
+      const cell = cells.get(cellKey(row, col));
+      if (!cell) continue;
+      const d = haversineKm(lat, lon, cell.lat, cell.lon);
+      for (const radius of POP_RADII_KM){
+        if (d <= radius) totals[radius] += cell.pop;
+      }
+    }
+  }
+  return totals;
+}
+
+function pointBandTotals(lat, lon){
   const totals = {};
   for (const radius of POP_RADII_KM){
-    const points = queryNearbyPoints(lat, lon, radius);
-    const sum = points.reduce((acc, p) => acc + Math.max(0, Number(p.pop_est || 0)), 0);
+    let sum = 0;
+    for (const i of queryNearbyPoints(lat, lon, radius)) sum += popColumns.pop[i];
     totals[radius] = sum;
   }
+  return totals;
+}
+
+function stationPlacementPopSummary(lat, lon){
+  const totals = popCellGrid ? gridBandTotals(lat, lon) : pointBandTotals(lat, lon);
   const nearest = findNearestStation(lat, lon);
   return {
     lat,
@@ -62,6 +183,92 @@ function stationPlacementPopSummary(lat, lon){
   };
 }
 
+// Exact band totals precomputed by the infra build, falling back to a live query.
+function stationPopBands(station){
+  if (!station) return null;
+  if (station.pop_bands && typeof station.pop_bands === "object") return station.pop_bands;
+  const lat = Number(station.lat);
+  const lon = Number(station.lon);
+  if (!Number.isFinite(lat) || !Number.isFinite(lon)) return null;
+  return popCellGrid ? gridBandTotals(lat, lon) : pointBandTotals(lat, lon);
+}
+
+function tileLat(y, n){
+  return Math.atan(Math.sinh(Math.PI * (1 - 2 * y / n))) * 180 / Math.PI;
+}
+
+function pyramidCellBounds(zoom, x, y){
+  const n = 2 ** zoom;
+  return { south: tileLat(y + 1, n), north: tileLat(y, n), west: x / n * 360 - 180, east: (x + 1) / n * 360 - 180 };
+}
+
+// Walk the pyramid from its root cells down to `zoom` (default: the finest loaded level).
+// classify(bounds) returns 1 when a cell lies inside the shape, 0 when outside and -1 when
+// the shape cuts it; only cut cells are opened, and cut cells at the last level count when
+// contains(lat, lon) holds for their population-weighted centroid.
+function pyramidPopulation(classify, contains, zoom){
+  if (!popPyramid) return null;
+  const { minZoom, maxZoom, levels } = popPyramid;
+  const last = Math.min(maxZoom, Math.max(minZoom, Math.floor(zoom ?? maxZoom)));
+  const stack = [];
+  for (let i = 0; i < levels[minZoom].count; i++) stack.push(minZoom, i);
+  let total = 0;
+  while (stack.length){
+    const i = stack.pop();
+    const z = stack.pop();
+    const cells = levels[z];
+    const side = classify(pyramidCellBounds(z, cells.x[i], cells.y[i]));
+    if (side === 0) continue;
+    if (side === 1) {
+      total += cells.pop[i];
+    } else if (z >= last || !cells.child) {
+      if (contains(cells.lat[i], cells.lon[i])) total += cells.pop[i];
+    } else {
+      for (let c = cells.child[i]; c < cells.child[i] + cells.children[i]; c++) stack.push(z + 1, c);
+    }
+  }
+  return total;
+}
+
+function popPyramidInBounds(south, west, north, east, zoom){
+  return pyramidPopulation(
+    b => {
+      if (b.north < south || b.south > north || b.east < west || b.west > east) return 0;
+      return b.south >= south && b.north <= north && b.west >= west && b.east <= east ? 1 : -1;
+    },
+    (lat, lon) => lat >= south && lat <= north && lon >= west && lon <= east,
+    zoom
+  );
+}
+
+// Shortest distance from a point to a lat/lon box: the nearest meridian of the box,
+// then the latitude on it closest to the point, clamped into the box.
+function boundsDistanceKm(lat, lon, b){
+  const nearLon = Math.min(Math.max(lon, b.west), b.east);
+  const dLon = (lon - nearLon) * Math.PI / 180;
+  if (Math.abs(dLon) >= Math.PI / 2) return 0;
+  const nearLat = Math.atan(Math.tan(lat * Math.PI / 180) / Math.cos(dLon)) * 180 / Math.PI;
+  return haversineKm(lat, lon, Math.min(Math.max(nearLat, b.south), b.north), nearLon);
+}
+
+function popPyramidWithin(lat, lon, radiusKm, zoom){
+  return pyramidPopulation(
+    b => {
+      // The farthest point of a lat/lon box is always one of its corners.
+      const far = Math.max(
+        haversineKm(lat, lon, b.south, b.west),
+        haversineKm(lat, lon, b.south, b.east),
+        haversineKm(lat, lon, b.north, b.west),
+        haversineKm(lat, lon, b.north, b.east)
+      );
+      if (far <= radiusKm) return 1;
+      return boundsDistanceKm(lat, lon, b) > radiusKm ? 0 : -1;
+    },
+    (cellLat, cellLon) => haversineKm(lat, lon, cellLat, cellLon) <= radiusKm,
+    zoom
+  );
+}
+
 function findNearestStation(lat, lon, maxKm = 30){
   if (!state?.stations?.size) return null;
   let best = null;
@@ -79,7 +286,76 @@ function findNearestStation(lat, lon, maxKm = 30){
   return { station: best, distanceKm: bestDist };
 }
 
+async function loadPopGrid(){
+  const url = "/data/es/pop_grid_es.json";
+  try {
+    const res = await fetch(url, { cache: "no-store" });
+    if (!res.ok) return;
+    const data = await res.json();
+    const cellDeg = Number(data?.cell_deg);
+    const columns = ["row", "col", "pop", "lat", "lon"];
+    if (!(cellDeg > 0) || !columns.every(name => Array.isArray(data[name]))) {
+      console.warn("[pop_points] invalid pop grid format");
+      return;
+    }
+    const cells = new Map();
+    for (let i = 0; i < data.pop.length; i++){
+      cells.set(cellKey(data.row[i], data.col[i]), {
+        pop: Number(data.pop[i]) || 0,
+        lat: Number(data.lat[i]),
+        lon: Number(data.lon[i])
+      });
+    }
+    popCellGrid = { cellDeg, cells };
+    console.info(`[pop_points] loaded pop grid with ${cells.size} cells`);
+  } catch (err) {
+    console.warn("Failed to load pop grid:", err);
+  }
+}
+
+// Loads the pyramid levels up to maxZoom; deeper queries stop at the finest level loaded.
+async function loadPopPyramid(maxZoom = Infinity){
+  if (typeof decodeRailBundle !== "function") return;
+  try {
+    const res = await fetch("/data/es/pop_pyramid_es.json", { cache: "no-store" });
+    if (!res.ok) return;
+    const index = await res.json();
+    const wanted = (index.levels || []).filter(level => level.zoom <= maxZoom);
+    if (!wanted.length || wanted[0].zoom !== index.min_zoom) return;
+    const tables = await Promise.all(wanted.map(async level => {
+      const levelRes = await fetch(`/data/es/${level.file}`, { cache: "no-store" });
+      if (!levelRes.ok) throw new Error(`${level.file} (${levelRes.status})`);
+      return decodeRailBundle(await levelRes.arrayBuffer()).tables.cells;
+    }));
+    const levels = {};
+    wanted.forEach((level, i) => { levels[level.zoom] = tables[i]; });
+    popPyramid = { minZoom: index.min_zoom, maxZoom: wanted[wanted.length - 1].zoom, levels };
+    console.info(`[pop_points] loaded pop pyramid z${popPyramid.minZoom}-z${popPyramid.maxZoom}`);
+  } catch (err) {
+    console.warn("[pop_points] pop pyramid unavailable:", err);
+  }
+}
+
+async function loadPopPointsBundle(){
+  if (typeof decodeRailBundle !== "function") return false;
+  try {
+    const res = await fetch("/data/es/pop_points_es.bin", { cache: "no-store" });
+    if (!res.ok) return false;
+    const bundle = decodeRailBundle(await res.arrayBuffer());
+    if (!bundle.tables.points || !bundle.tables.buckets) return false;
+    setPopBundle(bundle);
+    console.info(`[pop_points] loaded ${popColumns.count} entries in ${popBuckets.size} buckets (columnar)`);
+    return true;
+  } catch (err) {
+    console.warn("[pop_points] columnar pop points unavailable, falling back to JSON:", err);
+    return false;
+  }
+}
+
 async function loadPopPoints(){
+  loadPopGrid();
+  loadPopPyramid();
+  if (await loadPopPointsBundle()) return;
   const url = "/data/es/pop_points_es.json";
   try {
     const res = await fetch(url, { cache: "no-store" });
@@ -89,18 +365,22 @@ async function loadPopPoints(){
     }
     const text = await res.text();
     const trimmed = (text || "").trim();
-    if (!trimmed || trimmed[0] === "<") {
+    if (!trimmed || (trimmed[0] !== "{" && trimmed[0] !== "[")) {
       console.warn(`[pop_points] response at ${url} is not JSON (starts with '${trimmed[0] || ""}')`);
       return;
     }
     const data = JSON.parse(trimmed);
-    if (!Array.isArray(data)) {
-      console.warn("[pop_points] invalid format (expected array)");
+    const valid = item => item && Number.isFinite(Number(item.lat)) && Number.isFinite(Number(item.lon));
+    if (Array.isArray(data)) {
+      const indexed = indexPopRecords(data.filter(valid));
+      setPopRecords(indexed.points, indexed.buckets);
+    } else if (Array.isArray(data?.points) && data.buckets) {
+      setPopRecords(data.points, data.buckets);
+    } else {
+      console.warn("[pop_points] invalid format (expected an indexed document or an array)");
       return;
     }
-    popPoints = data.filter(item => item && Number.isFinite(Number(item.lat)) && Number.isFinite(Number(item.lon)));
-    buildPopGrid();
-    console.info(`[pop_points] loaded ${popPoints.length} entries`);
+    console.info(`[pop_points] loaded ${popColumns.count} entries in ${popBuckets.size} buckets`);
   } catch (err) {
     console.warn("Failed to load pop points:", err);
   }
@@ -108,3 +388,7 @@ async function loadPopPoints(){
 
 window.loadPopPoints = loadPopPoints;
 window.stationPlacementPopSummary = stationPlacementPopSummary;
+window.stationPopBands = stationPopBands;
+window.popPointsInBounds = popPointsInBounds;
+window.popPyramidInBounds = popPyramidInBounds;
+window.popPyramidWithin = popPyramidWithin;
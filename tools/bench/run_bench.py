@@ -0,0 +1,225 @@
+"""Time the stages of the Spanish infra build on synthetic inputs and track regressions.
+
+For every requested scale a seeded extract is written with
+``synthetic_es.py`` and then measured in a fresh child process, so peak RSS
+belongs to that scale alone. The child builds the pop points the way
+``build_pop_points.py`` does, then runs ``build_es_rail_infra.build`` --
+the same staged build ``main`` runs, including the ``--workers`` shard
+path. Results are written as JSON; pass an earlier result file as
+``--baseline`` to flag stages that got slower.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(TOOLS_DIR))
+
+import numpy as np  # noqa: E402
+
+from build_es_rail_infra import build  # noqa: E402
+from build_es_rail_infra import parse_args as parse_build_args  # noqa: E402
+from build_pop_points import (  # noqa: E402
+    build_pop_grid,
+    build_pop_points,
+    order_pop_points,
+    pop_points_bundle,
+    pop_points_document,
+)
+from build_pop_points import write_json as write_pop_json  # noqa: E402
+from build_pop_pyramid import build_pyramid  # noqa: E402
+from build_profile import StageProfiler, peak_rss_mb  # noqa: E402
+from geojson_stream import find_geojson, read_geojson  # noqa: E402
+from synthetic_es import generate, parse_count  # noqa: E402
+
+
+SCHEMA = "rail-bench"
+VERSION = 2
+DEFAULT_SCALES = "10k,100k,1m"
+# Stages faster than this in the baseline are too noisy to call regressions.
+NOISE_FLOOR_SECONDS = 0.05
+
+
+def write_pop_bundle(path, points, buckets):
+    path.write_bytes(pop_points_bundle(points, buckets))
+
+
+def write_pop_grid(path, points):
+    write_pop_json(path, build_pop_grid(points))
+
+
+def measure(work_dir, trace=False, workers=0, shard_zoom=8):
+    """Build ``work_dir/data/raw/es`` into ``work_dir/out`` and return the per-stage results."""
+    raw = work_dir / "data" / "raw" / "es"
+    out_dir = work_dir / "out"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stages = StageProfiler(trace_allocations=trace)
+
+    # Pop points first, as in the real pipeline, so the rail build's catchments stage has them.
+    points = stages.run("pop_points", lambda: build_pop_points(read_geojson(find_geojson(raw / "places"))))
+    points, buckets = stages.run("pop_order", order_pop_points, points)
+    stages.run("pop_write", write_pop_json, out_dir / "pop_points_es.json", pop_points_document(points, buckets))
+    stages.run("pop_bundle", write_pop_bundle, out_dir / "pop_points_es.bin", points, buckets)
+    stages.run("pop_grid", write_pop_grid, out_dir / "pop_grid_es.json", points)
+    pop = (
+        np.array([point["lat"] for point in points]),
+        np.array([point["lon"] for point in points]),
+        np.array([max(0, point["pop_est"]) for point in points], dtype=np.float64),
+    )
+    stages.run("pop_pyramid", build_pyramid, *pop)
+    pop_point_count = len(points)
+    # build_pop_points.py runs in its own process; don't count its data in the rail build's RSS.
+    del points, buckets, pop
+
+    args = parse_build_args(
+        [str(out_dir), "--workers", str(workers), "--shard-zoom", str(shard_zoom)]
+        + (["--trace-allocations"] if trace else [])
+    )
+    # The build's console summary would mix with the JSON this process prints.
+    with (work_dir / "build.log").open("w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        summary = build(args, find_geojson(raw / "stations"), find_geojson(raw / "tracks"), stages)
+    counts = summary["counts"]
+
+    return {
+        "stages": stages.stages,
+        "total_seconds": stages.total_seconds(),
+        "peak_rss_mb": peak_rss_mb(),
+        "children_peak_rss_mb": peak_rss_mb(children=True),
+        "graph": {
+            "vertices": counts["vertices"],
+            "vertex_pairs": counts["vertex_pairs"],
+            "nodes": counts["nodes"],
+            "links": counts["links"],
+            "shards": counts["shards"],
+            "stations_snapped": summary["snap"]["count"],
+            "pop_points": pop_point_count,
+        },
+        "throughput": summary["throughput"],
+        "output_bytes": sum(path.stat().st_size for path in out_dir.iterdir()),
+    }
+
+
+def run_scale(vertices, seed, work_dir, trace, workers, shard_zoom):
+    raw = work_dir / "data" / "raw" / "es"
+    started = time.perf_counter()
+    inputs = generate(raw, vertices, seed)
+    inputs["seconds"] = round(time.perf_counter() - started, 3)
+    command = [
+        sys.executable, __file__, "--measure", str(work_dir), "--workers", str(workers), "--shard-zoom", str(shard_zoom)
+    ]
+    if trace:
+        command.append("--tracemalloc")
+    child = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True)
+    return dict(json.loads(child.stdout), inputs=inputs)
+
+
+def compare(results, baseline, tolerance):
+    """Print stage timings against ``baseline`` and return the regressions found."""
+    regressions = []
+    if baseline.get("version") != results["version"]:
+        print("Warning: the baseline was written by another bench version; its stages may differ.")
+    if baseline.get("tracemalloc") != results["tracemalloc"]:
+        print("Warning: only one of the runs traced allocations; timings are not comparable.")
+    if baseline.get("workers", 0) != results["workers"]:
+        print("Warning: the runs used different --workers; the track stages are not comparable.")
+    for scale, current in results["scales"].items():
+        previous = baseline.get("scales", {}).get(scale)
+        if not previous:
+            print(f"{scale}: not in baseline")
+            continue
+        print(f"{scale}:")
+        for stage, entry in current["stages"].items():
+            before = previous["stages"].get(stage)
+            if not before:
+                print(f"  {stage:<16} {entry['seconds']:>9.3f}s  (new stage)")
+                continue
+            ratio = entry["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+            flag = ""
+            if before["seconds"] >= NOISE_FLOOR_SECONDS and ratio > 1 + tolerance:
+                flag = "  REGRESSION"
+                regressions.append((scale, stage, ratio))
+            print(f"  {stage:<16} {entry['seconds']:>9.3f}s  vs {before['seconds']:>9.3f}s  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Spanish infra build stages on synthetic inputs.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="Comma-separated track vertex counts (10k,1m,...)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic extract")
+    parser.add_argument("--output", default="bench_es.json", help="Where to write the results")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown per stage before it counts as a regression (0.25 = 25%%)",
+    )
+    parser.add_argument("--tracemalloc", action="store_true", help="Also record traced allocation peaks (slower)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Passed to the build: shard tracks and build them in this many processes (0 = single pass)",
+    )
+    parser.add_argument("--shard-zoom", type=int, default=8, help="Passed to the build with --workers")
+    parser.add_argument("--keep", help="Keep the synthetic inputs and outputs under this directory")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.measure:
+        json.dump(measure(Path(args.measure), args.tracemalloc, args.workers, args.shard_zoom), sys.stdout)
+        return
+
+    results = {
+        "schema": SCHEMA,
+        "version": VERSION,
+        "seed": args.seed,
+        "tracemalloc": args.tracemalloc,
+        "workers": args.workers,
+        "shard_zoom": args.shard_zoom,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "scales": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="rail_bench_") as tmp:
+        root = Path(args.keep or tmp)
+        for scale in [s.strip() for s in args.scales.split(",") if s.strip()]:
+            vertices = parse_count(scale)
+            result = run_scale(vertices, args.seed, root / scale, args.tracemalloc, args.workers, args.shard_zoom)
+            results["scales"][scale] = result
+            graph = result["graph"]
+            print(
+                f"{scale}: {result['inputs']['track_vertices']} vertices -> {graph['nodes']} nodes / "
+                f"{graph['links']} links in {result['total_seconds']:.2f}s, peak RSS {result['peak_rss_mb']} MB"
+            )
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Seeded synthetic stand-in for the Spanish OSM rail extract.
+
+Writes ``tracks``, ``stations`` and ``places`` in the same shape as
+``osmium export --add-unique-id=type_id`` (``w…``/``n…`` ids, LineString and
+MultiLineString ways), so the build tools can be benchmarked at any scale
+without downloading the PBF. The network is a nearest-neighbour graph of
+cities joined by gently curving lines; every line is cut into OSM-sized
+ways that share their end vertices, and lines meet exactly at the city
+vertex, so the graph has real junctions, degree-2 chains and a few
+isolated islands. The same seed and vertex target always give the same
+files.
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+
+LAT_RANGE = (36.0, 43.5)
+LON_RANGE = (-9.0, 3.0)
+KM_PER_DEG = 111.195
+CITY_NEIGHBOURS = 2
+WAY_VERTICES = (20, 400)
+STATION_SPACING_KM = (6.0, 15.0)
+STRAY_STATION_SHARE = 0.02
+PLACES_PER_VERTEX = 1 / 40
+PLACE_KINDS = ("town", "village", "village", "hamlet", "suburb", "neighbourhood", "locality")
+
+
+def parse_count(text):
+    """``"100k"`` -> 100000, ``"1.5m"`` -> 1500000."""
+    text = str(text).strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+    return int(float(text) * scale)
+
+
+def _km_xy(lat, lon):
+    return lon * KM_PER_DEG * math.cos(math.radians(sum(LAT_RANGE) / 2)), lat * KM_PER_DEG
+
+
+def _city_pairs(x, y):
+    """Each city joined to its nearest neighbours, as sorted unique ``(i, j)`` pairs."""
+    pairs = set()
+    xy = np.column_stack((x, y))
+    for start in range(0, len(xy), 512):
+        block = xy[start:start + 512]
+        d2 = ((block[:, None, :] - xy[None, :, :]) ** 2).sum(axis=2)
+        d2[np.arange(len(block)), np.arange(start, start + len(block))] = np.inf
+        nearest = np.argsort(d2, axis=1)[:, :CITY_NEIGHBOURS]
+        for offset, row in enumerate(nearest.tolist()):
+            i = start + offset
+            for j in row:
+                pairs.add((min(i, j), max(i, j)))
+    return sorted(pairs)
+
+
+def _line_coords(rng, a, b, count):
+    """``count`` vertices from city ``a`` to city ``b`` along a smooth wiggle plus survey noise."""
+    t = np.linspace(0.0, 1.0, count)
+    dlat = b[0] - a[0]
+    dlon = b[1] - a[1]
+    length = math.hypot(dlat, dlon) or 1.0
+    waves = rng.integers(1, 4)
+    bend = rng.uniform(0.02, 0.08) * length * np.sin(math.pi * t) * np.sin(math.pi * waves * t + rng.uniform(0, math.pi))
+    lat = a[0] + dlat * t - dlon / length * bend
+    lon = a[1] + dlon * t + dlat / length * bend
+    noise = rng.normal(0.0, 2e-5, size=(2, count))
+    noise[:, [0, -1]] = 0.0
+    return np.round(lat + noise[0], 7), np.round(lon + noise[1], 7)
+
+
+class _Writer:
+    """Write features as a FeatureCollection or as GeoJSONSeq, one at a time."""
+
+    def __init__(self, path, seq):
+        self.fh = path.open("w", encoding="utf-8")
+        self.seq = seq
+        self.count = 0
+        if not seq:
+            self.fh.write('{"type":"FeatureCollection","features":[\n')
+
+    def add(self, feature):
+        text = json.dumps(feature, separators=(",", ":"))
+        if self.seq:
+            self.fh.write(text + "\n")
+        else:
+            self.fh.write((",\n" if self.count else "") + text)
+        self.count += 1
+
+    def close(self):
+        if not self.seq:
+            self.fh.write("\n]}\n")
+        self.fh.close()
+        return self.count
+
+
+def generate(out_dir, vertices=100_000, seed=1, seq=False):
+    """Write the three inputs into ``out_dir`` and return counts of what was written."""
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    suffix = ".geojsonseq" if seq else ".geojson"
+
+    city_count = int(np.clip(vertices // 1000, 12, 20000))
+    city_lat = rng.uniform(*LAT_RANGE, size=city_count)
+    city_lon = rng.uniform(*LON_RANGE, size=city_count)
+    city_pop = (2_000_000 / np.arange(1, city_count + 1) ** 1.1).astype(np.int64) + 500
+    major = city_pop >= np.quantile(city_pop, 0.9)
+    x, y = _km_xy(city_lat, city_lon)
+    pairs = _city_pairs(x, y)
+    lengths = np.array([math.hypot(x[i] - x[j], y[i] - y[j]) for i, j in pairs])
+    spacing_km = lengths.sum() / max(vertices, 2 * len(pairs))
+
+    tracks = _Writer(out_dir / f"tracks{suffix}", seq)
+    stations = _Writer(out_dir / f"stations{suffix}", seq)
+    next_way = 1
+    next_node = 1
+    track_vertices = 0
+
+    def add_station(lat, lon, name):
+        nonlocal next_node
+        stations.add(
+            {
+                "type": "Feature",
+                "id": f"n{next_node}",
+                "properties": {"railway": "station", "name": name},
+                "geometry": {"type": "Point", "coordinates": [round(lon, 7), round(lat, 7)]},
+            }
+        )
+        next_node += 1
+
+    for city in range(city_count):
+        jitter = rng.normal(0.0, 0.001, size=2)
+        add_station(city_lat[city] + jitter[0], city_lon[city] + jitter[1], f"City {city} Central")
+
+    for line, ((i, j), length) in enumerate(zip(pairs, lengths)):
+        count = max(2, int(round(length / spacing_km)) + 1)
+        lat, lon = _line_coords(rng, (city_lat[i], city_lon[i]), (city_lat[j], city_lon[j]), count)
+        if major[i] and major[j]:
+            railway = "highspeed"
+        elif length < 40 and rng.random() < 0.3:
+            railway = "light_rail"
+        else:
+            railway = "rail"
+        coords = np.column_stack((lon, lat)).tolist()
+        start = 0
+        while start < count - 1:
+            end = min(count - 1, start + int(rng.integers(*WAY_VERTICES)))
+            part = coords[start:end + 1]
+            if next_way % 17 == 0 and len(part) >= 4:
+                middle = len(part) // 2
+                geometry = {"type": "MultiLineString", "coordinates": [part[:middle + 1], part[middle:]]}
+            else:
+                geometry = {"type": "LineString", "coordinates": part}
+            tracks.add(
+                {
+                    "type": "Feature",
+                    "id": f"w{next_way}",
+                    "properties": {"railway": railway, "name": f"Line {line}"},
+                    "geometry": geometry,
+                }
+            )
+            track_vertices += len(part)
+            next_way += 1
+            start = end
+
+        along = rng.uniform(*STATION_SPACING_KM)
+        while along < length - STATION_SPACING_KM[0]:
+            k = min(count - 1, int(along / length * (count - 1)))
+            if rng.random() < STRAY_STATION_SHARE:
+                spread = 0.05
+            else:
+                spread = 0.002
+            offset = rng.normal(0.0, spread, size=2)
+            add_station(lat[k] + offset[0], lon[k] + offset[1], f"Line {line} km {along:.0f}")
+            along += rng.uniform(*STATION_SPACING_KM)
+
+    places = _Writer(out_dir / f"places{suffix}", seq)
+    weights = city_pop / city_pop.sum()
+    for city in range(city_count):
+        places.add(
+            {
+                "type": "Feature",
+                "id": f"n{next_node}",
+                "properties": {"place": "city", "name": f"City {city}", "population": str(int(city_pop[city]))},
+                "geometry": {"type": "Point", "coordinates": [round(city_lon[city], 7), round(city_lat[city], 7)]},
+            }
+        )
+        next_node += 1
+    place_count = max(200, int(vertices * PLACES_PER_VERTEX))
+    owners = rng.choice(city_count, size=place_count, p=weights)
+    spread = rng.normal(0.0, 0.15, size=(place_count, 2))
+    kinds = rng.integers(0, len(PLACE_KINDS), size=place_count)
+    tagged = rng.random(place_count) < 1 / 3
+    populations = rng.lognormal(7.0, 1.3, size=place_count).astype(np.int64) + 20
+    for p in range(place_count):
+        lat = float(np.clip(city_lat[owners[p]] + spread[p, 0], *LAT_RANGE))
+        lon = float(np.clip(city_lon[owners[p]] + spread[p, 1], *LON_RANGE))
+        properties = {"place": PLACE_KINDS[kinds[p]], "name": f"Place {p}"}
+        if tagged[p]:
+            properties["population"] = str(int(populations[p]))
+        places.add(
+            {
+                "type": "Feature",
+                "id": f"n{next_node}",
+                "properties": properties,
+                "geometry": {"type": "Point", "coordinates": [round(lon, 7), round(lat, 7)]},
+            }
+        )
+        next_node += 1
+
+    return {
+        "seed": seed,
+        "vertices_target": vertices,
+        "cities": city_count,
+        "lines": len(pairs),
+        "ways": tracks.close(),
+        "track_vertices": track_vertices,
+        "stations": stations.close(),
+        "places": places.close(),
+        "bytes": sum(path.stat().st_size for path in out_dir.glob(f"*{suffix}")),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic Spanish rail extract for benchmarks.")
+    parser.add_argument("out_dir", nargs="?", default="data/raw/es", help="Directory for tracks/stations/places")
+    parser.add_argument("--vertices", default="100k", help="Approximate track vertex count (e.g. 10k, 1m, 10m)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--seq", action="store_true", help="Write GeoJSONSeq instead of FeatureCollections")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    stats = generate(args.out_dir, parse_count(args.vertices), args.seed, args.seq)
+    print(
+        f"Synthetic extract in {args.out_dir}: {stats['ways']} ways / {stats['track_vertices']} vertices "
+        f"over {stats['lines']} lines between {stats['cities']} cities, "
+        f"{stats['stations']} stations, {stats['places']} places ({stats['bytes'] / 1e6:.1f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,26 @@
+import argparse
+import filecmp
+import hashlib
 import json
 import math
+import platform
 import sys
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 
+import numpy as np
+
+from build_profile import StageProfiler, peak_rss_mb
+from geojson_stream import find_geojson, read_geojson
+from nearest import PointIndex, snap_stats
+from polyline import encode_many
+from rail_bundle import NO_INDEX, ColumnTap, encode_bundle
+from simplify import pixel_km, project_km, simplify_mask, simplify_offsets
+from tile_scheme import format_tile_id, lat_lon_to_tile
+
 
 def haversine_km(lat1, lon1, lat2, lon2):
     r = 6371.0
@@ -15,10 +33,24 @@ def haversine_km(lat1, lon1, lat2, lon2):
     return r * c
 
 
-def read_geojson(path):
-    with path.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
-    return data.get("features", [])
+def haversine_km_batch(lat1, lon1, lat2, lon2):
+    """Vectorised ``haversine_km`` over coordinate arrays.
+
+    Same formula as the scalar version; results agree with it to within one
+    ulp (NumPy's SIMD sin/square are not bit-identical to libm).
+    """
+    r = 6371.0
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lon1 = np.asarray(lon1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    lon2 = np.asarray(lon2, dtype=np.float64)
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return r * c
 
 
 def iter_line_coords(geometry):
@@ -34,56 +66,257 @@ def iter_line_coords(geometry):
                 yield segment
 
 
+# Stations are snapped within the first radius that finds a rail node.
+SNAP_RADII_KM = (0.5, 1.0, 2.0)
+
+# Synthetic links added by --bridge-km to close gaps between components.
+LINK_TRACK = 0
+LINK_GAP_BRIDGE = 1
+GAP_BRIDGE_SPEED_KMH = 60
+
+# Rounded coordinates are packed into one int: biased lat in the high 32 bits,
+# biased lon in the low 32 bits. Valid for precision <= 7.
+KEY_BIAS = 1 << 31
+
+# Bump when the build logic changes so --incremental discards its cache.
+STATE_VERSION = 1
+REPORT_VERSION = 1
+# Catchment radii of the population bands stored on every station, in km.
+POP_BANDS_KM = (2, 5, 10, 20)
+
+OUTPUT_FILES = (
+    "stations_es.json",
+    "rail_components_es.json",
+    "rail_nodes_es.json",
+    "rail_links_es.json",
+    "rail_bundle_es.bin",
+)
+
+
+class UnionFind:
+    """Disjoint sets over node indices, grown on demand as links arrive."""
+
+    def __init__(self):
+        self.parent = array("i")
+        self.size = array("i")
+
+    def __len__(self):
+        return len(self.parent)
+
+    def grow(self, count):
+        parent = self.parent
+        while len(parent) < count:
+            parent.append(len(parent))
+            self.size.append(1)
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        """Join the sets of ``a`` and ``b``; return False if already joined."""
+        ra = self.find(a)
+        rb = self.find(b)
+        if ra == rb:
+            return False
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return True
+
+    @classmethod
+    def from_parent(cls, parent):
+        forest = cls()
+        forest.parent.frombytes(np.ascontiguousarray(parent, dtype=np.int32).tobytes())
+        forest.size.frombytes(np.ones(len(parent), dtype=np.int32).tobytes())
+        return forest
+
+    def roots(self):
+        """Return the root of every element as a NumPy array (pointer jumping)."""
+        parent = np.array(self.parent, dtype=np.int64)
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                return parent
+            parent = grand
+
+
 class NodeRegistry:
+    """Deduplicated rail vertices stored as parallel ``array('d')`` columns.
+
+    Nodes are addressed by their integer index; the public ``rn_es_*`` ids
+    are only formatted when records are written out. They spell out the
+    packed coordinate key in hex, so a vertex keeps its id for as long as it
+    does not move, whatever else changes upstream.
+    """
+
     def __init__(self, precision=6):
         self.precision = precision
-        self.map = {}
-        self.nodes = []
-        self.coord_for_id = {}
-        self.counter = 0
+        self.scale = 10 ** precision
+        self.index = {}
+        self.lat = array("d")
+        self.lon = array("d")
+
+    def __len__(self):
+        return len(self.lat)
 
     def key(self, lat, lon):
-        return (round(lat, self.precision), round(lon, self.precision))
+        return ((int(round(lat * self.scale)) + KEY_BIAS) << 32) | (int(round(lon * self.scale)) + KEY_BIAS)
 
     def get_or_create(self, lat, lon):
-        k = self.key(lat, lon)
-        node_id = self.map.get(k)
-        if node_id:
-            return node_id
-        self.counter += 1
-        node_id = f"rn_es_{self.counter:06d}"
-        self.map[k] = node_id
-        lat_f = float(k[0])
-        lon_f = float(k[1])
-        self.nodes.append({"id": node_id, "lat": lat_f, "lon": lon_f})
-        self.coord_for_id[node_id] = (lat_f, lon_f)
-        return node_id
+        lat_r = round(lat, self.precision)
+        lon_r = round(lon, self.precision)
+        k = self.key(lat_r, lon_r)
+        idx = self.index.get(k)
+        if idx is not None:
+            return idx
+        idx = len(self.lat)
+        self.index[k] = idx
+        self.lat.append(lat_r)
+        self.lon.append(lon_r)
+        return idx
+
+    @classmethod
+    def from_arrays(cls, lat, lon, keys, precision=6):
+        registry = cls(precision)
+        registry.lat.frombytes(np.ascontiguousarray(lat, dtype=np.float64).tobytes())
+        registry.lon.frombytes(np.ascontiguousarray(lon, dtype=np.float64).tobytes())
+        registry.index = dict(zip(keys.tolist(), range(len(keys))))
+        return registry
+
+    def keys(self):
+        """Vectorised ``key`` for every registered node."""
+        lat, lon = self.coords()
+        lat_i = (np.rint(lat * self.scale).astype(np.int64) + KEY_BIAS).astype(np.uint64)
+        lon_i = (np.rint(lon * self.scale).astype(np.int64) + KEY_BIAS).astype(np.uint64)
+        return (lat_i << np.uint64(32)) | lon_i
+
+    def node_id(self, idx):
+        return f"rn_es_{self.key(self.lat[idx], self.lon[idx]):016x}"
+
+    def coords(self):
+        """Return ``(lat, lon)`` as NumPy copies of the coordinate columns."""
+        return np.array(self.lat, dtype=np.float64), np.array(self.lon, dtype=np.float64)
+
+    def records(self, indices=None, components=None):
+        node_id = self.node_id
+        if indices is None:
+            indices = range(len(self.lat))
+        lat = self.lat
+        lon = self.lon
+        for idx in indices:
+            record = {"id": node_id(idx), "lat": lat[idx], "lon": lon[idx]}
+            if components is not None:
+                record["component"] = components[idx]
+            yield record
+
+
+def link_ids(path_keys, offsets):
+    """Yield a stable ``rl_es_*`` id for each link from the node keys along its path.
+
+    ``offsets`` delimits each link's run in ``path_keys``. Every run is hashed
+    in a canonical direction (lower end key first; for loops, lower second
+    key first), so the id survives renumbering and walking the link either way.
+    """
+    path_keys = np.asarray(path_keys, dtype=np.uint64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+    if not len(starts):
+        return
+    first = path_keys[starts]
+    last = path_keys[ends]
+    second = path_keys[np.minimum(starts + 1, ends)]
+    penultimate = path_keys[np.maximum(ends - 1, starts)]
+    flip = (last < first) | ((last == first) & (penultimate < second))
+    position = np.arange(len(path_keys), dtype=np.int64)
+    owner = np.repeat(np.arange(len(starts)), offsets[1:] - starts)
+    flipped = flip[owner]
+    position[flipped] = (starts + ends)[owner[flipped]] - position[flipped]
+    data = path_keys[position].astype("<u8").tobytes()
+    bounds = (offsets * 8).tolist()
+    blake2b = hashlib.blake2b
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        yield "rl_es_" + blake2b(data[lo:hi], digest_size=8).hexdigest()
 
 
 class LinkCollector:
+    """Undirected, deduplicated links between node indices in packed columns.
+
+    Lengths are filled in for all links at once by ``compute_distances``.
+    Connectivity is tracked in ``components`` as links are added, so no
+    adjacency structure is needed to find the graph's components.
+    """
+
     def __init__(self):
-        self.links = []
+        self.a = array("i")
+        self.b = array("i")
+        self.max_speed = array("H")
+        self.kind = array("B")
+        self.distance = np.zeros(0, dtype=np.float64)
         self.link_keys = set()
-        self.counter = 0
+        self.components = UnionFind()
+
+    def __len__(self):
+        return len(self.a)
 
-    def add(self, a, b, distance, max_speed):
+    def add(self, a, b, max_speed, kind=LINK_TRACK):
         if a == b:
             return
-        key = tuple(sorted((a, b)))
+        key = (a << 32) | b if a < b else (b << 32) | a
         if key in self.link_keys:
             return
         self.link_keys.add(key)
-        self.counter += 1
-        link_id = f"rl_es_{self.counter:06d}"
-        self.links.append(
-            {
+        self.a.append(a)
+        self.b.append(b)
+        self.max_speed.append(max_speed)
+        self.kind.append(kind)
+        self.components.grow(max(a, b) + 1)
+        self.components.union(a, b)
+
+    def compute_distances(self, node_registry):
+        lat, lon = node_registry.coords()
+        a = np.frombuffer(self.a, dtype=np.int32)
+        b = np.frombuffer(self.b, dtype=np.int32)
+        self.distance = haversine_km_batch(lat[a], lon[a], lat[b], lon[b])
+        return self.distance
+
+    @classmethod
+    def from_arrays(cls, a, b, max_speed, kind, components):
+        collector = cls()
+        collector.a.frombytes(np.ascontiguousarray(a, dtype=np.int32).tobytes())
+        collector.b.frombytes(np.ascontiguousarray(b, dtype=np.int32).tobytes())
+        collector.max_speed.frombytes(np.ascontiguousarray(max_speed, dtype=np.uint16).tobytes())
+        collector.kind.frombytes(np.ascontiguousarray(kind, dtype=np.uint8).tobytes())
+        lo = np.minimum(a, b).astype(np.int64)
+        hi = np.maximum(a, b).astype(np.int64)
+        collector.link_keys = set(((lo << 32) | hi).tolist())
+        collector.components = components
+        return collector
+
+    def records(self, node_registry, components=None):
+        node_id = node_registry.node_id
+        path = np.column_stack((np.array(self.a, dtype=np.int64), np.array(self.b, dtype=np.int64))).ravel()
+        ids = link_ids(node_registry.keys()[path], np.arange(0, len(path) + 1, 2))
+        for link_id, a, b, distance, max_speed, kind in zip(
+            ids, self.a, self.b, self.distance.tolist(), self.max_speed, self.kind
+        ):
+            record = {
                 "id": link_id,
-                "a": a,
-                "b": b,
+                "a": node_id(a),
+                "b": node_id(b),
                 "distance_km": distance,
                 "max_speed_kmh": max_speed,
             }
-        )
+            if components is not None:
+                record["component"] = components[a]
+            if kind == LINK_GAP_BRIDGE:
+                record["gap_bridge"] = True
+            yield record
 
 
 def max_speed_for_feature(properties):
@@ -97,95 +330,273 @@ def max_speed_for_feature(properties):
     return 100
 
 
-def build_spatial_index(nodes, bucket_size=0.01):
-    grid = {}
-    for node in nodes:
-        lat = node["lat"]
-        lon = node["lon"]
-        key = (int(lat / bucket_size), int(lon / bucket_size))
-        grid.setdefault(key, []).append(node)
-    return grid, bucket_size
-
-
-def find_nearest(lat, lon, grid, bucket_size, max_km=0.5):
-    base_x = int(lat / bucket_size)
-    base_y = int(lon / bucket_size)
-    best = None
-    best_dist = None
-    for dx in (-1, 0, 1):
-        for dy in (-1, 0, 1):
-            bucket = grid.get((base_x + dx, base_y + dy))
-            if not bucket:
-                continue
-            for node in bucket:
-                dist = haversine_km(lat, lon, node["lat"], node["lon"])
-                if dist <= max_km and (best_dist is None or dist < best_dist):
-                    best = node
-                    best_dist = dist
-    return best
+def add_track_features(features, node_registry, link_collector):
+    """Register every track vertex and link; return ``(features, vertices)`` read."""
+    feature_count = 0
+    vertex_count = 0
+    for feature in features:
+        feature_count += 1
+        geometry = feature.get("geometry") or {}
+        properties = feature.get("properties", {})
+        max_speed = max_speed_for_feature(properties)
+        for segment in iter_line_coords(geometry):
+            vertex_count += len(segment)
+            prev_node = None
+            for coord in segment:
+                if not coord or len(coord) < 2:
+                    continue
+                lon, lat = coord
+                this_node = node_registry.get_or_create(float(lat), float(lon))
+                if prev_node is not None:
+                    link_collector.add(prev_node, this_node, max_speed)
+                prev_node = this_node
+    return feature_count, vertex_count
 
 
-def write_json(path, data):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as fh:
-        json.dump(data, fh, separators=(",", ":"))
+def feature_osm_id(feature):
+    """OSM id of a feature (``osmium export --add-unique-id`` or ``-a id``), or None."""
+    return feature.get("id") or (feature.get("properties") or {}).get("@id")
 
 
-def build_link_adjacency(link_collector, node_coords):
-    adjacency = {}
-    max_edge = 0.0
-    for link in link_collector.links:
-        a = link["a"]
-        b = link["b"]
-        adjacency.setdefault(a, set()).add(b)
-        adjacency.setdefault(b, set()).add(a)
-        a_coord = node_coords.get(a)
-        b_coord = node_coords.get(b)
-        if a_coord and b_coord:
-            dist = haversine_km(a_coord[0], a_coord[1], b_coord[0], b_coord[1])
-            max_edge = max(max_edge, dist)
-    return adjacency, max_edge
-
-
-def compute_components(adjacency):
-    visited = set()
-    components = 0
-    for node in adjacency:
-        if node in visited:
-            continue
-        components += 1
-        stack = [node]
-        while stack:
-            current = stack.pop()
-            if current in visited:
-                continue
-            visited.add(current)
-            for neighbor in adjacency.get(current, []):
-                if neighbor not in visited:
-                    stack.append(neighbor)
-    return components
+def feature_tile(feature, zoom):
+    """Tile of a track feature's first vertex, or None if it has no geometry."""
+    for segment in iter_line_coords(feature.get("geometry")):
+        for coord in segment:
+            if coord and len(coord) >= 2:
+                return lat_lon_to_tile(float(coord[1]), float(coord[0]), zoom)
+    return None
 
 
-def main():
-    stations_path = Path("data/raw/es/stations.geojson")
-    tracks_path = Path("data/raw/es/tracks.geojson")
-    missing = [p for p in (stations_path, tracks_path) if not p.exists()]
-    if missing:
-        print("Missing input files needed for build_es_rail_infra.py:")
-        for path in missing:
-            print(f" - {path}")
-        print("")
-        print("Run `npm run data:es:geojson` to generate them.")
-        sys.exit(1)
+def split_tracks_by_tile(features, zoom, shard_dir):
+    """Spill each track feature to a GeoJSONSeq file named after its tile.
+
+    Returns one dict per shard in tile-id order, which fixes the merge order:
+    ``tile``, ``path``, a ``digest`` of the shard's features, ``ways``,
+    a digest per way keyed by its OSM id, and ``features``/``vertices`` counts.
+    """
+    handles = {}
+    shards = {}
+    try:
+        for feature in features:
+            tile = feature_tile(feature, zoom)
+            if tile is None:
+                continue
+            shard = shards.get(tile)
+            if shard is None:
+                path = shard_dir / f"{format_tile_id(tile)}.geojsonseq"
+                handles[tile] = path.open("w", encoding="utf-8")
+                shard = shards[tile] = {
+                    "tile": format_tile_id(tile),
+                    "path": path,
+                    "hash": hashlib.blake2b(digest_size=16),
+                    "ways": {},
+                    "features": 0,
+                    "vertices": 0,
+                }
+            line = json.dumps(feature, separators=(",", ":"), sort_keys=True).encode("utf-8")
+            way_digest = hashlib.blake2b(line, digest_size=8).hexdigest()
+            shard["ways"][str(feature_osm_id(feature) or way_digest)] = way_digest
+            shard["hash"].update(line)
+            shard["hash"].update(b"\n")
+            shard["features"] += 1
+            shard["vertices"] += sum(len(segment) for segment in iter_line_coords(feature.get("geometry")))
+            handles[tile].write(line.decode("utf-8"))
+            handles[tile].write("\n")
+    finally:
+        for fh in handles.values():
+            fh.close()
+    result = []
+    for tile in sorted(shards):
+        shard = shards[tile]
+        shard["digest"] = shard.pop("hash").hexdigest()
+        result.append(shard)
+    return result
 
-    station_features = read_geojson(stations_path)
-    track_features = read_geojson(tracks_path)
 
+def build_shard(path):
+    """Process-pool worker: build nodes and links for one tile shard."""
     node_registry = NodeRegistry()
     link_collector = LinkCollector()
+    add_track_features(read_geojson(path), node_registry, link_collector)
+    link_collector.components.grow(len(node_registry))
+    return {
+        "keys": node_registry.keys(),
+        "lat": np.array(node_registry.lat, dtype=np.float64),
+        "lon": np.array(node_registry.lon, dtype=np.float64),
+        "a": np.array(link_collector.a, dtype=np.int64),
+        "b": np.array(link_collector.b, dtype=np.int64),
+        "max_speed": np.array(link_collector.max_speed, dtype=np.uint16),
+        "kind": np.array(link_collector.kind, dtype=np.uint8),
+        "roots": link_collector.components.roots(),
+    }
+
+
+def merge_shards(shards):
+    """Stitch shard results into one registry, joining vertices shared across shards.
+
+    Nodes and links are numbered by first occurrence in shard order, so the
+    result only depends on the shard layout, never on the worker count.
+    """
+    sizes = np.array([len(shard["keys"]) for shard in shards], dtype=np.int64)
+    node_base = np.concatenate(([0], np.cumsum(sizes)))
+    keys = np.concatenate([shard["keys"] for shard in shards]) if shards else np.zeros(0, dtype=np.uint64)
+    uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty(len(uniq), dtype=np.int64)
+    rank[order] = np.arange(len(uniq))
+    global_of = rank[inverse]
+    first_sorted = first[order]
+    lat = np.concatenate([shard["lat"] for shard in shards])[first_sorted] if shards else np.zeros(0)
+    lon = np.concatenate([shard["lon"] for shard in shards])[first_sorted] if shards else np.zeros(0)
+    node_registry = NodeRegistry.from_arrays(lat, lon, uniq[order])
+
+    def concat(name, dtype, remap=False):
+        parts = []
+        for base, shard in zip(node_base, shards):
+            values = shard[name]
+            parts.append(global_of[values + base] if remap else values)
+        return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+    a = concat("a", np.int64, remap=True)
+    b = concat("b", np.int64, remap=True)
+    pair = (np.minimum(a, b) << 32) | np.maximum(a, b)
+    _, first_link = np.unique(pair, return_index=True)
+    keep = np.sort(first_link)
 
+    # Each shard's union-find roots seed the global forest: a node points at
+    # its root in the first shard it appeared in. Vertices that several
+    # shards share are then unioned with their roots in the later shards.
+    root_occ = concat("roots", np.int64) + np.repeat(node_base[:-1], sizes)
+    parent = np.empty(len(uniq), dtype=np.int64)
+    parent[global_of[first]] = global_of[root_occ[first]]
+    components = UnionFind.from_parent(parent)
+    repeat = np.ones(len(keys), dtype=bool)
+    repeat[first] = False
+    for occ in np.flatnonzero(repeat).tolist():
+        components.union(int(global_of[occ]), int(global_of[root_occ[occ]]))
+
+    link_collector = LinkCollector.from_arrays(
+        a[keep], b[keep], concat("max_speed", np.uint16)[keep], concat("kind", np.uint8)[keep], components
+    )
+    return node_registry, link_collector
+
+
+def canonicalize(node_registry, link_collector):
+    """Renumber nodes in coordinate-key order and sort links by their endpoints.
+
+    Everything derived from node order afterwards (output order, cycle
+    anchors, component anchors) then depends only on the track geometry, not
+    on feature order or the shard layout, so unchanged parts of the network
+    come out byte-identical from one run to the next.
+    """
+    keys = node_registry.keys()
+    order = np.argsort(keys, kind="stable")
+    new_of = np.empty(len(order), dtype=np.int64)
+    new_of[order] = np.arange(len(order))
+    lat, lon = node_registry.coords()
+    registry = NodeRegistry.from_arrays(lat[order], lon[order], keys[order], node_registry.precision)
+
+    link_collector.components.grow(len(order))
+    components = UnionFind.from_parent(new_of[link_collector.components.roots()[order]])
+    a = new_of[np.array(link_collector.a, dtype=np.int64)]
+    b = new_of[np.array(link_collector.b, dtype=np.int64)]
+    lo = np.minimum(a, b)
+    hi = np.maximum(a, b)
+    link_order = np.lexsort((hi, lo))
+    collector = LinkCollector.from_arrays(
+        lo[link_order],
+        hi[link_order],
+        np.array(link_collector.max_speed, dtype=np.uint16)[link_order],
+        np.array(link_collector.kind, dtype=np.uint8)[link_order],
+        components,
+    )
+    return registry, collector
+
+
+class ShardCache:
+    """Built shard arrays kept between runs for ``--incremental``.
+
+    Shards are stored as ``.npz`` files named after the digest of their
+    features, so an unchanged shard is loaded instead of rebuilt. ``state.json``
+    records the input digests and options of the last successful build.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.shard_dir = self.root / "shards"
+        self.state_path = self.root / "state.json"
+
+    def load_state(self):
+        try:
+            with self.state_path.open("r", encoding="utf-8") as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        return state if state.get("version") == STATE_VERSION else {}
+
+    def save_state(self, state):
+        write_json(self.state_path, dict(state, version=STATE_VERSION))
+
+    def load(self, digest):
+        path = self.shard_dir / f"{digest}.npz"
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    def store(self, digest, shard):
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.shard_dir / f"{digest}.tmp.npz"
+        np.savez(tmp, **shard)
+        tmp.replace(self.shard_dir / f"{digest}.npz")
+
+    def prune(self, digests):
+        """Delete cached shards that are not in ``digests``; return how many went."""
+        removed = 0
+        for path in self.shard_dir.glob("*.npz"):
+            if path.name[: -len(".npz")] not in digests:
+                path.unlink()
+                removed += 1
+        return removed
+
+
+def build_shards(shards, workers, cache=None):
+    """Build every shard, reusing cached results; return ``(results, reused)``."""
+    results = [cache.load(shard["digest"]) if cache else None for shard in shards]
+    todo = [i for i, result in enumerate(results) if result is None]
+    paths = [shards[i]["path"] for i in todo]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            built = list(pool.map(build_shard, paths))
+    else:
+        built = [build_shard(path) for path in paths]
+    for i, result in zip(todo, built):
+        results[i] = result
+        if cache:
+            cache.store(shards[i]["digest"], result)
+    return results, len(shards) - len(todo)
+
+
+def diff_ways(previous, current):
+    """Count added, removed and modified ways between two ``{way id: digest}`` maps."""
+    added = sum(1 for way in current if way not in previous)
+    removed = sum(1 for way in previous if way not in current)
+    modified = sum(1 for way, digest in current.items() if way in previous and previous[way] != digest)
+    return added, removed, modified
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_stations(path):
+    """Station records from a GeoJSON export, sorted by id and not yet snapped."""
     station_records = []
-    for feature in station_features:
+    for feature in read_geojson(path):
         geometry = feature.get("geometry")
         if not geometry:
             continue
@@ -193,65 +604,762 @@ def main():
         if not coords or len(coords) < 2:
             continue
         lon, lat = coords
-        station_id = f"st_es_{feature.get('id') or len(station_records)+1}"
+        osm_id = feature_osm_id(feature)
+        if not osm_id:
+            osm_id = hashlib.blake2b(f"{float(lat):.6f},{float(lon):.6f}".encode("ascii"), digest_size=8).hexdigest()
+        station_id = f"st_es_{osm_id}"
         name = feature.get("properties", {}).get("name") or f"Station {station_id}"
-    station_records.append(
-        {
-            "id": station_id,
-            "name": name,
-            "lat": float(lat),
-            "lon": float(lon),
+        station_records.append(
+            {
+                "id": station_id,
+                "name": name,
+                "lat": float(lat),
+                "lon": float(lon),
                 "country": "ES",
                 "rail_node_id": None,
             }
         )
+    station_records.sort(key=lambda station: station["id"])
+    return station_records
 
-    for feature in track_features:
-        geometry = feature.get("geometry") or {}
-        properties = feature.get("properties", {})
-        max_speed = max_speed_for_feature(properties)
-        for segment in iter_line_coords(geometry):
-            prev_node = None
-            for coord in segment:
-                if not coord or len(coord) < 2:
-                    continue
-                lon, lat = coord
-                this_node = node_registry.get_or_create(float(lat), float(lon))
-                if prev_node:
-                    coord_a = node_registry.coord_for_id.get(prev_node)
-                    coord_b = node_registry.coord_for_id.get(this_node)
-                    if coord_a and coord_b:
-                        distance = haversine_km(coord_a[0], coord_a[1], coord_b[0], coord_b[1])
-                        link_collector.add(prev_node, this_node, distance, max_speed)
-                prev_node = this_node
 
-    station_nodes_grid, bucket_size = build_spatial_index(node_registry.nodes)
+def snap_stations(station_records, node_registry, radii_km=SNAP_RADII_KM):
+    """Snap every station to its nearest rail node in one bulk query.
+
+    Returns the assigned and skipped station lists, the node index of each
+    assigned station, and snap-distance stats.
+    """
+    lat, lon = node_registry.coords()
+    index = PointIndex(lat, lon)
+    nearest, distances, _ = index.query(
+        [s["lat"] for s in station_records],
+        [s["lon"] for s in station_records],
+        k=1,
+        radii_km=radii_km,
+    )
     assigned = []
     skipped = []
-    for station in station_records:
-        nearest = find_nearest(station["lat"], station["lon"], station_nodes_grid, bucket_size)
-        if nearest:
-            station["rail_node_id"] = nearest["id"]
-            assigned.append(station)
-        else:
+    snapped_nodes = []
+    for station, node_idx, distance in zip(station_records, nearest[:, 0].tolist(), distances[:, 0].tolist()):
+        if node_idx < 0:
             skipped.append(station)
+            continue
+        station["rail_node_id"] = node_registry.node_id(node_idx)
+        station["snap_distance_km"] = round(distance, 4)
+        assigned.append(station)
+        snapped_nodes.append(node_idx)
+    return assigned, skipped, snapped_nodes, snap_stats(distances[:, 0])
+
+
+def read_pop_points(path):
+    """``(lat, lon, population)`` arrays from a ``pop_points_es.json`` file (indexed or a plain array)."""
+    with path.open("r", encoding="utf-8") as fh:
+        points = json.load(fh)
+    if isinstance(points, dict):
+        points = points["points"]
+    lat = np.array([float(point["lat"]) for point in points], dtype=np.float64)
+    lon = np.array([float(point["lon"]) for point in points], dtype=np.float64)
+    population = np.array([float(point.get("pop_est") or 0) for point in points], dtype=np.float64)
+    return lat, lon, np.maximum(population, 0.0)
+
+
+def station_pop_bands(station_records, lat, lon, population, bands_km=POP_BANDS_KM):
+    """Store the population within each band radius on every station as ``pop_bands``.
+
+    One ``pairs_within`` query at the largest radius finds every
+    station/point pair; each band is then a weighted ``bincount`` over the
+    pairs inside its radius. Keys are the radii in km, as in the client.
+    """
+    index = PointIndex(lat, lon)
+    station_idx, point_idx, distances = index.pairs_within(
+        [s["lat"] for s in station_records],
+        [s["lon"] for s in station_records],
+        max(bands_km),
+    )
+    weights = population[point_idx]
+    totals = []
+    for radius in bands_km:
+        inside = distances <= radius
+        totals.append(
+            np.rint(np.bincount(station_idx[inside], weights[inside], minlength=len(station_records)))
+            .astype(np.int64)
+            .tolist()
+        )
+    keys = [str(radius) for radius in bands_km]
+    for i, station in enumerate(station_records):
+        station["pop_bands"] = {key: band[i] for key, band in zip(keys, totals)}
+
+
+class ContractedLinks:
+    """Links between kept nodes, each replacing a chain of degree-2 links.
+
+    ``offsets`` delimits each link's vertex run in ``path`` (node indices,
+    both endpoints included) so the full geometry survives as a polyline.
+    """
+
+    def __init__(self, a, b, distance, max_speed, gap_bridge, path, offsets):
+        self.a = a
+        self.b = b
+        self.distance = distance
+        self.max_speed = max_speed
+        self.gap_bridge = gap_bridge
+        self.path = path
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.a)
+
+    def records(self, node_registry, components=None):
+        node_id = node_registry.node_id
+        lat, lon = node_registry.coords()
+        polylines = encode_many(lat[self.path], lon[self.path], self.offsets)
+        ids = link_ids(node_registry.keys()[self.path], self.offsets)
+        for link_id, a, b, distance, max_speed, gap_bridge, polyline in zip(
+            ids,
+            self.a.tolist(),
+            self.b.tolist(),
+            self.distance.tolist(),
+            self.max_speed.tolist(),
+            self.gap_bridge.tolist(),
+            polylines,
+        ):
+            record = {
+                "id": link_id,
+                "a": node_id(a),
+                "b": node_id(b),
+                "distance_km": distance,
+                "max_speed_kmh": max_speed,
+                "polyline": polyline,
+            }
+            if components is not None:
+                record["component"] = components[a]
+            if gap_bridge:
+                record["gap_bridge"] = True
+            yield record
+
+
+def contract_degree2(link_collector, node_count, keep):
+    """Merge chains of degree-2 nodes into single links.
+
+    ``keep`` is a boolean mask of nodes that must survive (e.g. station
+    snaps); junctions and terminals (degree != 2) are always kept. A cycle
+    made only of degree-2 nodes keeps its lowest-index node as an anchor.
+    Returns the contracted links and the final keep mask.
+    """
+    a = np.frombuffer(link_collector.a, dtype=np.int32).astype(np.int64)
+    b = np.frombuffer(link_collector.b, dtype=np.int32).astype(np.int64)
+    link_count = len(a)
+    ends = np.concatenate((a, b))
+    order = np.argsort(ends, kind="stable")
+    inc_link = np.concatenate((np.arange(link_count), np.arange(link_count)))[order].tolist()
+    inc_other = np.concatenate((b, a))[order].tolist()
+    degree = np.bincount(ends, minlength=node_count)
+    offsets = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(degree, out=offsets[1:])
+    offsets = offsets.tolist()
+    keep = np.asarray(keep, dtype=bool) | (degree != 2)
+    keep_flags = bytearray(keep.tobytes())
+
+    visited = bytearray(link_count)
+    chain_links = []
+    chain_nodes = []
+    link_offsets = [0]
+    node_offsets = [0]
+    chain_a = []
+    chain_b = []
+
+    def walk(start, slot):
+        link = inc_link[slot]
+        visited[link] = 1
+        chain_nodes.append(start)
+        chain_links.append(link)
+        current = inc_other[slot]
+        while not keep_flags[current]:
+            chain_nodes.append(current)
+            slot = offsets[current]
+            if inc_link[slot] == link:
+                slot += 1
+            link = inc_link[slot]
+            visited[link] = 1
+            chain_links.append(link)
+            current = inc_other[slot]
+        chain_nodes.append(current)
+        chain_a.append(start)
+        chain_b.append(current)
+        link_offsets.append(len(chain_links))
+        node_offsets.append(len(chain_nodes))
+
+    for start in np.flatnonzero(keep).tolist():
+        for slot in range(offsets[start], offsets[start + 1]):
+            if not visited[inc_link[slot]]:
+                walk(start, slot)
+    for link in range(link_count):
+        if visited[link]:
+            continue
+        anchor = int(min(a[link], b[link]))
+        keep_flags[anchor] = 1
+        walk(anchor, offsets[anchor])
+
+    chain_links = np.asarray(chain_links, dtype=np.int64)
+    starts = np.asarray(link_offsets[:-1], dtype=np.int64)
+    max_speed = np.frombuffer(link_collector.max_speed, dtype=np.uint16)
+    kind = np.frombuffer(link_collector.kind, dtype=np.uint8)
+    contracted = ContractedLinks(
+        np.asarray(chain_a, dtype=np.int64),
+        np.asarray(chain_b, dtype=np.int64),
+        np.add.reduceat(link_collector.distance[chain_links], starts) if len(starts) else np.zeros(0),
+        np.minimum.reduceat(max_speed[chain_links], starts) if len(starts) else np.zeros(0, dtype=np.uint16),
+        np.maximum.reduceat(kind[chain_links], starts) == LINK_GAP_BRIDGE if len(starts) else np.zeros(0, dtype=bool),
+        np.asarray(chain_nodes, dtype=np.int64),
+        np.asarray(node_offsets, dtype=np.int64),
+    )
+    return contracted, np.frombuffer(bytes(keep_flags), dtype=bool)
+
+
+def replace_if_changed(tmp_path, path):
+    """Move ``tmp_path`` over ``path`` unless both hold the same bytes.
+
+    Returns True if ``path`` was (re)written. Unchanged outputs keep their
+    mtime and never show up in a diff.
+    """
+    if path.exists() and filecmp.cmp(tmp_path, path, shallow=False):
+        tmp_path.unlink()
+        return False
+    tmp_path.replace(path)
+    return True
+
+
+def lod_levels(contracted, node_registry, link_ids, zooms):
+    """Yield ``(zoom, tolerance_km, {link id: polyline}, vertices)`` for each LOD zoom.
+
+    The tolerance is one map pixel at that zoom. Only interior vertices are
+    dropped, so link endpoints (junctions, terminals, station nodes) never
+    move and the simplified network keeps the full-resolution topology.
+    """
+    lat, lon = node_registry.coords()
+    path_lat = lat[contracted.path]
+    path_lon = lon[contracted.path]
+    x, y = project_km(path_lat, path_lon)
+    for zoom in zooms:
+        tolerance = pixel_km(zoom)
+        keep = simplify_mask(x, y, contracted.offsets, tolerance)
+        polylines = encode_many(path_lat[keep], path_lon[keep], simplify_offsets(keep, contracted.offsets))
+        yield zoom, tolerance, dict(zip(link_ids, polylines)), int(keep.sum())
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as fh:
+        json.dump(data, fh, separators=(",", ":"))
+    return replace_if_changed(tmp_path, path)
 
-    output_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("public/data/es")
-    adjacency, max_edge = build_link_adjacency(link_collector, node_registry.coord_for_id)
-    components = compute_components(adjacency)
-    write_json(output_dir / "stations_es.json", assigned)
-    write_json(output_dir / "rail_nodes_es.json", node_registry.nodes)
-    write_json(output_dir / "rail_links_es.json", link_collector.links)
 
-    print(f"Rail graph components: {components}")
+def write_json_records(path, records):
+    """Write an iterable of records as a compact JSON array without materialising it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as fh:
+        fh.write("[")
+        for i, record in enumerate(records):
+            if i:
+                fh.write(",")
+            fh.write(json.dumps(record, separators=(",", ":")))
+        fh.write("]")
+    return replace_if_changed(tmp_path, path)
+
+
+def write_bytes(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    return replace_if_changed(tmp_path, path)
+
+
+def bundle_tables(names, nodes, links, stations):
+    """Columnar tables for the binary bundle, mirroring the JSON outputs.
+
+    Node, component and station references become row indices into the
+    other tables, so a client can index its typed arrays directly.
+    """
+    node_index = {node_id: i for i, node_id in enumerate(nodes.values["id"])}
+    component_index = {name: i for i, name in enumerate(names)}
+
+    def rows(values, lookup):
+        return [lookup.get(value, NO_INDEX) for value in values]
+
+    node_values = nodes.values
+    link_values = links.values
+    tables = {
+        "components": {"id": ("string", names)},
+        "nodes": {
+            "id": ("string", node_values["id"]),
+            "lat": ("float64", node_values["lat"]),
+            "lon": ("float64", node_values["lon"]),
+            "component": ("uint32", rows(node_values["component"], component_index)),
+        },
+        "links": {
+            "id": ("string", link_values["id"]),
+            "a": ("uint32", rows(link_values["a"], node_index)),
+            "b": ("uint32", rows(link_values["b"], node_index)),
+            "distance_km": ("float32", link_values["distance_km"]),
+            "max_speed_kmh": ("float32", link_values["max_speed_kmh"]),
+            "gap_bridge": ("uint8", [1 if flag else 0 for flag in link_values["gap_bridge"]]),
+            "component": ("uint32", rows(link_values["component"], component_index)),
+        },
+        "stations": {
+            "id": ("string", [station["id"] for station in stations]),
+            "name": ("string", [station["name"] for station in stations]),
+            "lat": ("float64", [station["lat"] for station in stations]),
+            "lon": ("float64", [station["lon"] for station in stations]),
+            "rail_node": ("uint32", rows([station["rail_node_id"] for station in stations], node_index)),
+            "snap_distance_km": ("float32", [station["snap_distance_km"] for station in stations]),
+        },
+    }
+    if "polyline" in link_values:
+        tables["links"]["polyline"] = ("string", link_values["polyline"])
+    return tables
+
+
+def bridge_components(link_collector, node_registry, max_km):
+    """Join components whose terminal nodes lie within ``max_km`` of another component.
+
+    Candidate gaps are taken shortest first, Kruskal-style, so each pair of
+    components is joined at most once. Returns the number of bridges added.
+    """
+    node_count = len(node_registry)
+    components = link_collector.components
+    components.grow(node_count)
+    # Copies, not frombuffer views: the link arrays still grow below.
+    a = np.array(link_collector.a, dtype=np.int64)
+    b = np.array(link_collector.b, dtype=np.int64)
+    degree = np.bincount(a, minlength=node_count) + np.bincount(b, minlength=node_count)
+    terminals = np.flatnonzero(degree <= 1)
+    if not len(terminals):
+        return 0
+    lat, lon = node_registry.coords()
+    roots = components.roots()
+    qi, pi, dist = PointIndex(lat, lon).pairs_within(lat[terminals], lon[terminals], max_km)
+    src = terminals[qi]
+    other = roots[src] != roots[pi]
+    src, dst, dist = src[other], pi[other], dist[other]
+    order = np.lexsort((dst, src, dist))
+    added = 0
+    for u, v in zip(src[order].tolist(), dst[order].tolist()):
+        if components.find(u) == components.find(v):
+            continue
+        link_collector.add(u, v, GAP_BRIDGE_SPEED_KMH, LINK_GAP_BRIDGE)
+        added += 1
+    return added
+
+
+def label_components(link_collector, node_count):
+    """Label every node with a dense component index; 0 is the largest component.
+
+    Returns ``(labels, anchors)`` where ``anchors[i]`` is the lowest node
+    index in component ``i``, which names the component in the output.
+    """
+    components = link_collector.components
+    components.grow(node_count)
+    roots = components.roots()[:node_count]
+    uniq, inverse, sizes = np.unique(roots, return_inverse=True, return_counts=True)
+    first = np.full(len(uniq), node_count, dtype=np.int64)
+    np.minimum.at(first, inverse, np.arange(node_count))
+    order = np.lexsort((first, -sizes))
+    rank = np.empty(len(uniq), dtype=np.int64)
+    rank[order] = np.arange(len(uniq))
+    return rank[inverse], first[order]
+
+
+def component_ids(anchors, node_registry):
+    """Stable ``rc_es_*`` ids: each component is named after its anchor node."""
+    keys = node_registry.keys()[anchors].tolist()
+    return [f"rc_es_{key:016x}" for key in keys]
+
+
+def component_stats(labels, names, node_registry, link_collector, snapped_nodes):
+    """Per-component node/link/station counts, track length and bounding box."""
+    count = int(labels.max()) + 1 if len(labels) else 0
+    lat, lon = node_registry.coords()
+    link_labels = labels[np.frombuffer(link_collector.a, dtype=np.int32)]
+    nodes = np.bincount(labels, minlength=count)
+    links = np.bincount(link_labels, minlength=count)
+    length = np.bincount(link_labels, weights=link_collector.distance, minlength=count)
+    stations = np.bincount(labels[np.asarray(snapped_nodes, dtype=np.int64)], minlength=count)
+    bbox = np.empty((4, count))
+    bbox[:2] = np.inf
+    bbox[2:] = -np.inf
+    np.minimum.at(bbox[0], labels, lon)
+    np.minimum.at(bbox[1], labels, lat)
+    np.maximum.at(bbox[2], labels, lon)
+    np.maximum.at(bbox[3], labels, lat)
+    return [
+        {
+            "id": names[i],
+            "nodes": int(nodes[i]),
+            "links": int(links[i]),
+            "stations": int(stations[i]),
+            "length_km": round(float(length[i]), 3),
+            "bbox": [float(v) for v in bbox[:, i]],
+        }
+        for i in range(count)
+    ]
+
+
+def finish_profile(args, profiler, summary):
+    """Print the stage table for ``--profile`` and write the ``--report`` JSON."""
+    if args.cprofile:
+        hottest = profiler.dump_hottest(args.cprofile)
+        if hottest:
+            summary["cprofile"] = {"stage": hottest, "path": args.cprofile}
+            print(f"cProfile stats for the slowest stage ({hottest}) written to {args.cprofile}")
+    if args.profile:
+        print("")
+        for line in profiler.lines():
+            print(line)
+        throughput = summary.get("throughput")
+        if throughput and throughput["track_seconds"]:
+            print(
+                f"Track throughput: {throughput['features_per_s']:.0f} features/s, "
+                f"{throughput['vertices_per_s']:.0f} vertices/s"
+            )
+        histogram = summary.get("snap", {}).get("histogram", [])
+        if histogram:
+            bins = []
+            for row in histogram:
+                label = f"<= {row['le_km']}" if row["le_km"] is not None else f"> {histogram[-2]['le_km']}"
+                bins.append(f"{label} km: {row['count']}")
+            print(f"Snap distance histogram: {', '.join(bins)}")
+    if args.report:
+        report = {
+            "schema": "rail-build-report",
+            "version": REPORT_VERSION,
+            "country": "ES",
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "options": {
+                "no_contract": args.no_contract,
+                "bridge_km": args.bridge_km,
+                "workers": args.workers,
+                "shard_zoom": args.shard_zoom,
+                "lod_zooms": args.lod_zooms,
+                "incremental": args.incremental,
+                "trace_allocations": args.trace_allocations,
+            },
+            "total_seconds": profiler.total_seconds(),
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(children=True),
+            "stages": profiler.stages,
+        }
+        report.update(summary)
+        path = Path(args.report)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+        print(f"Build report written to {path}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build ES rail nodes, links and stations from OSM GeoJSON.")
+    parser.add_argument("output_dir", nargs="?", default="public/data/es", help="Output directory")
+    parser.add_argument(
+        "--no-contract",
+        action="store_true",
+        help="Write every OSM vertex as a node instead of contracting degree-2 chains",
+    )
+    parser.add_argument(
+        "--bridge-km",
+        type=float,
+        default=None,
+        help="Join components whose end nodes lie within this distance of another component",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Split tracks into tile shards and build them in this many processes (0 = single pass)",
+    )
+    parser.add_argument(
+        "--shard-zoom",
+        type=int,
+        default=8,
+        help="Tile zoom used to shard tracks when --workers is set",
+    )
+    parser.add_argument(
+        "--lod-zooms",
+        default="5,7,9",
+        help="Comma-separated zooms to write simplified rail_lod_es_z<zoom>.json levels for ('' to skip)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse shards whose tracks are unchanged since the last build (implies a sharded build)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="data/cache/es_infra",
+        help="Where --incremental keeps built shards and input digests",
+    )
+    parser.add_argument(
+        "--pop-points",
+        default=None,
+        help="pop_points_es.json used for the station pop_bands (default: <output_dir>/pop_points_es.json)",
+    )
+    parser.add_argument("--profile", action="store_true", help="Print per-stage time and memory after the build")
+    parser.add_argument("--report", help="Write a JSON build report (stages, throughput, counts, snapping) here")
+    parser.add_argument(
+        "--trace-allocations",
+        action="store_true",
+        help="Record tracemalloc peaks per stage in the profile (slows the build down noticeably)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        help="Profile every stage with cProfile and write the slowest one's stats to this .prof file",
+    )
+    return parser.parse_args(argv)
+
+
+def build(args, stations_path, tracks_path, profiler):
+    """Build the rail outputs for ``args`` into ``args.output_dir``, timing every stage in ``profiler``.
+
+    ``main`` and ``tools/bench/run_bench.py`` both run this, so the
+    benchmark measures exactly the stages of a real build. Returns the
+    summary for ``finish_profile``; ``{"unchanged": True}`` when an
+    incremental build found nothing to rebuild.
+    """
+    output_dir = Path(args.output_dir)
+    lod_zooms = [] if args.no_contract else sorted({int(z) for z in args.lod_zooms.split(",") if z.strip()})
+    output_names = list(OUTPUT_FILES)
+    if lod_zooms:
+        output_names += ["rail_lod_es.json"] + [f"rail_lod_es_z{zoom}.json" for zoom in lod_zooms]
+    pop_points_path = Path(args.pop_points) if args.pop_points else output_dir / "pop_points_es.json"
+    if not pop_points_path.exists():
+        pop_points_path = None
+    with profiler.stage("stations"):
+        station_records = read_stations(stations_path)
+    track_features = track_vertices = 0
+
+    shard_count = 0
+    reused = 0
+    cache = None
+    workers = args.workers or (1 if args.incremental else 0)
+    if workers:
+        if args.incremental:
+            cache = ShardCache(args.cache_dir)
+        with tempfile.TemporaryDirectory(prefix="rail_shards_") as tmp:
+            with profiler.stage("split_tracks"):
+                shards = split_tracks_by_tile(read_geojson(tracks_path), args.shard_zoom, Path(tmp))
+            track_features = sum(shard["features"] for shard in shards)
+            track_vertices = sum(shard["vertices"] for shard in shards)
+            profiler.note("split_tracks", features=track_features, vertices=track_vertices)
+            if cache:
+                previous = cache.load_state()
+                ways = {}
+                for shard in shards:
+                    ways.update(shard["ways"])
+                state = {
+                    "output_dir": str(output_dir),
+                    "options": {
+                        "no_contract": args.no_contract,
+                        "bridge_km": args.bridge_km,
+                        "lod_zooms": lod_zooms,
+                    },
+                    "stations": file_digest(stations_path),
+                    "pop_points": file_digest(pop_points_path) if pop_points_path else None,
+                    "shards": {shard["tile"]: shard["digest"] for shard in shards},
+                    "ways": ways,
+                }
+                added, removed, modified = diff_ways(previous.get("ways", {}), ways)
+                print(f"Track ways since last build: {added} added, {removed} removed, {modified} modified")
+                outputs = previous.get("outputs", {})
+                with profiler.stage("check_cache"):
+                    unchanged = (
+                        all(
+                            previous.get(key) == state[key]
+                            for key in ("output_dir", "options", "stations", "pop_points", "shards")
+                        )
+                        and set(outputs) == set(output_names)
+                        and all(
+                            (output_dir / name).exists() and file_digest(output_dir / name) == digest
+                            for name, digest in outputs.items()
+                        )
+                    )
+                if unchanged:
+                    print(
+                        f"No track, station or pop-point changes since the last build; {output_dir} left untouched."
+                    )
+                    return {"unchanged": True}
+            with profiler.stage("build_shards"):
+                results, reused = build_shards(shards, workers, cache)
+        shard_count = len(shards)
+        with profiler.stage("merge_shards"):
+            node_registry, link_collector = merge_shards(results)
+        track_seconds = sum(
+            profiler.stages[name]["seconds"] for name in ("split_tracks", "build_shards", "merge_shards")
+        )
+    else:
+        node_registry = NodeRegistry()
+        link_collector = LinkCollector()
+        with profiler.stage("tracks"):
+            track_features, track_vertices = add_track_features(
+                read_geojson(tracks_path), node_registry, link_collector
+            )
+        profiler.note("tracks", features=track_features, vertices=track_vertices)
+        track_seconds = profiler.stages["tracks"]["seconds"]
+    with profiler.stage("canonicalize"):
+        node_registry, link_collector = canonicalize(node_registry, link_collector)
+    bridges = 0
+    if args.bridge_km:
+        with profiler.stage("bridge"):
+            bridges = bridge_components(link_collector, node_registry, args.bridge_km)
+    with profiler.stage("distances"):
+        link_collector.compute_distances(node_registry)
+    with profiler.stage("components"):
+        labels, anchors = label_components(link_collector, len(node_registry))
+        names = component_ids(anchors, node_registry)
+        node_components = np.array(names, dtype=object)[labels]
+
+    with profiler.stage("snap"):
+        assigned, skipped, snapped_nodes, snap = snap_stations(station_records, node_registry)
+    profiler.note("snap", stations=len(station_records))
+    if pop_points_path:
+        with profiler.stage("catchments"):
+            station_pop_bands(assigned, *read_pop_points(pop_points_path))
+
+    max_edge = float(link_collector.distance.max()) if len(link_collector) else 0.0
+    with profiler.stage("write_stations"):
+        components = component_stats(labels, names, node_registry, link_collector, snapped_nodes)
+        written = {
+            "stations_es.json": write_json(output_dir / "stations_es.json", assigned),
+            "rail_components_es.json": write_json(output_dir / "rail_components_es.json", components),
+        }
+    if args.no_contract:
+        node_records = node_registry.records(components=node_components)
+        link_records = link_collector.records(node_registry, node_components)
+        node_count, link_count = len(node_registry), len(link_collector)
+    else:
+        snapped = np.zeros(len(node_registry), dtype=bool)
+        snapped[snapped_nodes] = True
+        with profiler.stage("contract"):
+            contracted, kept = contract_degree2(link_collector, len(node_registry), snapped)
+        node_records = node_registry.records(np.flatnonzero(kept).tolist(), node_components)
+        link_records = contracted.records(node_registry, node_components)
+        node_count, link_count = int(kept.sum()), len(contracted)
+    node_columns = ColumnTap("id", "lat", "lon", "component")
+    link_fields = ["id", "a", "b", "distance_km", "max_speed_kmh", "gap_bridge", "component"]
+    if not args.no_contract:
+        link_fields.append("polyline")
+    link_columns = ColumnTap(*link_fields)
+    with profiler.stage("write_graph"):
+        written["rail_nodes_es.json"] = write_json_records(
+            output_dir / "rail_nodes_es.json", node_columns.tap(node_records)
+        )
+        written["rail_links_es.json"] = write_json_records(
+            output_dir / "rail_links_es.json", link_columns.tap(link_records)
+        )
+    profiler.note("write_graph", nodes=node_count, links=link_count)
+    with profiler.stage("write_bundle"):
+        bundle = encode_bundle(bundle_tables(names, node_columns, link_columns, assigned), meta={"country": "ES"})
+        written["rail_bundle_es.bin"] = write_bytes(output_dir / "rail_bundle_es.bin", bundle)
+    levels = []
+    if lod_zooms:
+        with profiler.stage("lod"):
+            for zoom, tolerance, polylines, vertices in lod_levels(
+                contracted, node_registry, link_columns.values["id"], lod_zooms
+            ):
+                name = f"rail_lod_es_z{zoom}.json"
+                tolerance = round(tolerance, 6)
+                written[name] = write_json(
+                    output_dir / name, {"zoom": zoom, "tolerance_km": tolerance, "links": polylines}
+                )
+                levels.append({"zoom": zoom, "tolerance_km": tolerance, "file": name, "vertices": vertices})
+            written["rail_lod_es.json"] = write_json(
+                output_dir / "rail_lod_es.json", {"full_vertices": len(contracted.path), "levels": levels}
+            )
+    if cache:
+        with profiler.stage("save_cache"):
+            state["outputs"] = {name: file_digest(output_dir / name) for name in output_names}
+            cache.save_state(state)
+            cache.prune(set(state["shards"].values()))
+
+    print(f"Rail graph components: {len(components)}")
+    if components:
+        print(f"Largest component: {components[0]['nodes']} nodes, {components[0]['stations']} stations")
+    if args.bridge_km:
+        print(f"Gap bridges added (<= {args.bridge_km} km): {bridges}")
     print(f"Maximum edge length: {max_edge:.3f} km")
 
     print(f"Stations processed: {len(station_records)}")
     print(f"Stations assigned to nodes: {len(assigned)}")
     print(f"Stations skipped: {len(skipped)}")
-    print(f"Rail nodes: {len(node_registry.nodes)}")
-    print(f"Rail links: {len(link_collector.links)}")
+    if pop_points_path:
+        print(f"Station pop_bands ({'/'.join(map(str, POP_BANDS_KM))} km) from {pop_points_path}")
+    else:
+        print("No pop_points_es.json found; stations written without pop_bands (run `npm run data:es:pop` first)")
+    if snap["count"]:
+        print(
+            "Snap distance (km): "
+            f"median {snap['median_km']:.3f}, p90 {snap['p90_km']:.3f}, max {snap['max_km']:.3f}"
+        )
+    print(f"Rail nodes: {node_count} (of {len(node_registry)} OSM vertices)")
+    print(f"Rail links: {link_count} (of {len(link_collector)} vertex pairs)")
+    if shard_count:
+        print(f"Track shards: {shard_count} at zoom {args.shard_zoom} ({workers} workers)")
+    if cache:
+        print(f"Shards reused from {args.cache_dir}: {reused} of {shard_count}")
+    if levels:
+        summary = ", ".join(f"z{level['zoom']} {level['vertices']}" for level in levels)
+        print(f"LOD polyline vertices: {summary} (full {len(contracted.path)})")
+    unchanged = [name for name in output_names if not written[name]]
+    if unchanged:
+        print(f"Unchanged outputs left in place: {', '.join(unchanged)}")
     print(f"Output written to {output_dir}")
+    return {
+        "unchanged": False,
+        "throughput": {
+            "track_features": track_features,
+            "track_vertices": track_vertices,
+            "track_seconds": round(track_seconds, 4),
+            "features_per_s": round(track_features / track_seconds, 1) if track_seconds else None,
+            "vertices_per_s": round(track_vertices / track_seconds, 1) if track_seconds else None,
+        },
+        "counts": {
+            "stations": len(station_records),
+            "stations_assigned": len(assigned),
+            "stations_skipped": len(skipped),
+            "vertices": len(node_registry),
+            "vertex_pairs": len(link_collector),
+            "nodes": node_count,
+            "links": link_count,
+            "components": len(components),
+            "gap_bridges": bridges,
+            "shards": shard_count,
+            "shards_reused": reused,
+        },
+        "snap": snap,
+        "outputs": {
+            name: {"bytes": (output_dir / name).stat().st_size, "rewritten": written[name]}
+            for name in output_names
+        },
+    }
+
+
+def main():
+    args = parse_args()
+    stations_path = find_geojson("data/raw/es/stations")
+    tracks_path = find_geojson("data/raw/es/tracks")
+    missing = [p for p in (stations_path, tracks_path) if not p.exists()]
+    if missing:
+        print("Missing input files needed for build_es_rail_infra.py:")
+        for path in missing:
+            print(f" - {path}")
+        print("")
+        print("Run `npm run data:es:geojson` to generate them.")
+        sys.exit(1)
+
+    profiler = StageProfiler(args.trace_allocations, bool(args.cprofile))
+    finish_profile(args, profiler, build(args, stations_path, tracks_path, profiler))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from build_es_rail_infra import write_bytes
+from rail_bundle import NO_INDEX, decode_bundle, encode_bundle
+from routing import (
+    UNREACHABLE_MINUTES,
+    CSRGraph,
+    build_contraction_hierarchy,
+    minutes_to_uint16,
+    travel_minutes,
+    travel_time_matrix,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Precompute station travel times and a contraction hierarchy from rail_bundle_es.bin."
+    )
+    parser.add_argument("data_dir", nargs="?", default="public/data/es", help="Directory with the infra outputs")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes for the per-station Dijkstra runs",
+    )
+    parser.add_argument("--no-ch", action="store_true", help="Skip the contraction hierarchy")
+    return parser.parse_args(argv)
+
+
+def station_matrix_tables(columns, graph, workers):
+    """Tables for ``station_times_es.bin``: one matrix row per distinct snapped rail node."""
+    station_nodes = np.asarray(columns["stations.rail_node"], dtype=np.int64)
+    snapped = station_nodes != NO_INDEX
+    matrix_nodes = np.unique(station_nodes[snapped])
+    rows = np.full(len(station_nodes), NO_INDEX, dtype=np.int64)
+    rows[snapped] = np.searchsorted(matrix_nodes, station_nodes[snapped])
+    minutes = minutes_to_uint16(travel_time_matrix(graph, matrix_nodes, workers))
+    tables = {
+        "stations": {
+            "id": ("string", columns["stations.id"]),
+            "row": ("uint32", rows),
+        },
+        "matrix_nodes": {"rail_node": ("uint32", matrix_nodes)},
+        "matrix": {"minutes": ("uint16", minutes.ravel())},
+    }
+    return tables, minutes
+
+
+def ch_tables(ch):
+    return {
+        "nodes": {
+            "rank": ("uint32", ch.rank),
+            "up_start": ("uint32", ch.up_start),
+            "up_count": ("uint32", ch.up_count),
+        },
+        "edges": {
+            "target": ("uint32", ch.target),
+            "minutes": ("float32", ch.minutes),
+            "middle": ("uint32", ch.middle),
+        },
+    }
+
+
+def main():
+    args = parse_args()
+    data_dir = Path(args.data_dir)
+    bundle_path = data_dir / "rail_bundle_es.bin"
+    if not bundle_path.exists():
+        print(f"Missing {bundle_path}.")
+        print("Run `npm run data:es:build` to generate it.")
+        sys.exit(1)
+
+    header, columns = decode_bundle(bundle_path.read_bytes())
+    node_count = header["counts"]["nodes"]
+    weight = travel_minutes(columns["links.distance_km"], columns["links.max_speed_kmh"])
+    graph = CSRGraph(node_count, columns["links.a"], columns["links.b"], weight)
+    meta = {
+        "country": "ES",
+        "weight": "distance_km / max_speed_kmh * 60",
+        "rail_bundle_sha256": header["checksum"]["value"],
+    }
+
+    started = time.perf_counter()
+    tables, minutes = station_matrix_tables(columns, graph, args.workers)
+    size = len(minutes)
+    times_path = data_dir / "station_times_es.bin"
+    write_bytes(
+        times_path,
+        encode_bundle(tables, dict(meta, size=size, unreachable=UNREACHABLE_MINUTES)),
+    )
+    reachable = int((minutes != UNREACHABLE_MINUTES).sum())
+    print(f"Station matrix: {size}x{size} rail nodes, {reachable} reachable pairs "
+          f"({time.perf_counter() - started:.1f}s, {args.workers} workers)")
+    print(f"Written {times_path} ({times_path.stat().st_size} bytes)")
+
+    if not args.no_ch:
+        started = time.perf_counter()
+        ch = build_contraction_hierarchy(graph)
+        ch_path = data_dir / "rail_ch_es.bin"
+        write_bytes(ch_path, encode_bundle(ch_tables(ch), meta))
+        shortcuts = int((ch.middle != 0xFFFFFFFF).sum())
+        print(f"Contraction hierarchy: {node_count} nodes, {len(ch.target)} upward edges, "
+              f"{shortcuts} shortcuts ({time.perf_counter() - started:.1f}s)")
+        print(f"Written {ch_path} ({ch_path.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ import math
 import sys
 from pathlib import Path
 
+from geojson_stream import find_geojson, read_geojson
+from rail_bundle import encode_bundle
+
 
 PLACE_WEIGHTS = {
     "city": 50000,
@@ -19,6 +22,12 @@ PLACE_WEIGHTS = {
     "isolated_dwelling": 150,
 }
 
+# Cell size of pop_grid_es.json, in degrees of latitude and longitude.
+POP_GRID_DEG = 0.01
+# Bucket size of the pop-point index; matches POP_POINT_GRID_SCALE in public/app/pop_points.js.
+POP_BUCKET_DEG = 0.05
+MORTON_BIAS = 1 << 15
+
 
 def human_size(path):
     try:
@@ -32,12 +41,6 @@ def human_size(path):
     return f"{size:.1f} TiB"
 
 
-def read_geojson(path):
-    with path.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
-    return data.get("features", [])
-
-
 def estimate_population(properties, kind):
     if not properties:
         return PLACE_WEIGHTS.get(kind, 500)
@@ -84,6 +87,115 @@ def build_pop_points(features):
     return points
 
 
+def build_pop_grid(points, cell_deg=POP_GRID_DEG):
+    """Sum ``pop_est`` into ``cell_deg`` cells, keeping only the cells that hold people.
+
+    Cells are addressed by ``row = floor(lat / cell_deg)`` and
+    ``col = floor(lon / cell_deg)``, sorted by row, then col. Each cell also
+    stores the population-weighted centroid of its points, so radius queries
+    against the grid are exact for cells holding a single place.
+    """
+    cells = {}
+    for point in points:
+        key = (math.floor(point["lat"] / cell_deg), math.floor(point["lon"] / cell_deg))
+        pop = max(0, point["pop_est"])
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, 0.0, 0.0, 0, 0.0, 0.0]
+        cell[0] += pop
+        cell[1] += pop * point["lat"]
+        cell[2] += pop * point["lon"]
+        cell[3] += 1
+        cell[4] += point["lat"]
+        cell[5] += point["lon"]
+    grid = {"cell_deg": cell_deg, "row": [], "col": [], "pop": [], "lat": [], "lon": []}
+    for key in sorted(cells):
+        pop, lat_sum, lon_sum, count, lat_plain, lon_plain = cells[key]
+        grid["row"].append(key[0])
+        grid["col"].append(key[1])
+        grid["pop"].append(pop)
+        grid["lat"].append(round(lat_sum / pop if pop else lat_plain / count, 5))
+        grid["lon"].append(round(lon_sum / pop if pop else lon_plain / count, 5))
+    return grid
+
+
+def _spread_bits(value):
+    """Interleave zeros between the low 16 bits of ``value``."""
+    value &= 0xFFFF
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    value = (value | (value << 1)) & 0x55555555
+    return value
+
+
+def morton_key(row, col):
+    """Z-order key of a bucket; rows and cols may be negative down to ``-MORTON_BIAS``."""
+    return _spread_bits(row + MORTON_BIAS) | (_spread_bits(col + MORTON_BIAS) << 1)
+
+
+def order_pop_points(points, bucket_deg=POP_BUCKET_DEG):
+    """Sort points along a Morton curve of their buckets and index the buckets.
+
+    Returns the reordered points and a columnar bucket index (``row``,
+    ``col``, ``start``, ``count``) in the same order. Every bucket is one
+    contiguous run of points, and nearby buckets are mostly close together in
+    the array. Points within a bucket are ordered by id.
+    """
+    keyed = []
+    for i, point in enumerate(points):
+        row = math.floor(point["lat"] / bucket_deg)
+        col = math.floor(point["lon"] / bucket_deg)
+        keyed.append((morton_key(row, col), point["id"], i, row, col))
+    keyed.sort()
+    ordered = []
+    buckets = {"row": [], "col": [], "start": [], "count": []}
+    last = None
+    for _, _, i, row, col in keyed:
+        if (row, col) != last:
+            last = (row, col)
+            buckets["row"].append(row)
+            buckets["col"].append(col)
+            buckets["start"].append(len(ordered))
+            buckets["count"].append(0)
+        buckets["count"][-1] += 1
+        ordered.append(points[i])
+    return ordered, buckets
+
+
+def pop_points_document(points, buckets, bucket_deg=POP_BUCKET_DEG):
+    """``pop_points_es.json``: the bucket index first, then the Morton-ordered points."""
+    return {"order": "morton", "bucket_deg": bucket_deg, "buckets": buckets, "points": points}
+
+
+def pop_points_bundle(points, buckets, bucket_deg=POP_BUCKET_DEG):
+    """Columnar ``pop_points_es.bin`` (rail bundle format) with no per-point key names.
+
+    Coordinates are float32 (sub-metre at these latitudes) and ``kind`` is an
+    index into ``meta.kinds``.
+    """
+    kinds = sorted({point["kind"] for point in points})
+    kind_index = {kind: i for i, kind in enumerate(kinds)}
+    tables = {
+        "points": {
+            "id": ("string", [point["id"] for point in points]),
+            "name": ("string", [point["name"] for point in points]),
+            "lat": ("float32", [point["lat"] for point in points]),
+            "lon": ("float32", [point["lon"] for point in points]),
+            "pop_est": ("uint32", [max(0, point["pop_est"]) for point in points]),
+            "kind": ("uint8", [kind_index[point["kind"]] for point in points]),
+        },
+        "buckets": {
+            "row": ("int32", buckets["row"]),
+            "col": ("int32", buckets["col"]),
+            "start": ("uint32", buckets["start"]),
+            "count": ("uint32", buckets["count"]),
+        },
+    }
+    meta = {"country": "ES", "order": "morton", "bucket_deg": bucket_deg, "kinds": kinds}
+    return encode_bundle(tables, meta)
+
+
 def write_json(path, data):
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("w", encoding="utf-8") as fh:
@@ -91,16 +203,27 @@ def write_json(path, data):
 
 
 def main():
-    places_path = Path("data/raw/es/places.geojson")
+    places_path = find_geojson("data/raw/es/places")
     if not places_path.exists():
         print("Missing source file for place points:", places_path)
         sys.exit(1)
 
-    features = read_geojson(places_path)
-    points = build_pop_points(features)
-    output_path = Path(sys.argv[1]) / "pop_points_es.json" if len(sys.argv) > 1 else Path("public/data/es/pop_points_es.json")
-    write_json(output_path, points)
-    print(f"Pop points written: {output_path} ({human_size(output_path)}) with {len(points)} entries.")
+    points = build_pop_points(read_geojson(places_path))
+    output_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("public/data/es")
+    output_path = output_dir / "pop_points_es.json"
+    points, buckets = order_pop_points(points)
+    write_json(output_path, pop_points_document(points, buckets))
+    print(
+        f"Pop points written: {output_path} ({human_size(output_path)}) with {len(points)} entries "
+        f"in {len(buckets['start'])} buckets."
+    )
+    bundle_path = output_dir / "pop_points_es.bin"
+    bundle_path.write_bytes(pop_points_bundle(points, buckets))
+    print(f"Columnar pop points written: {bundle_path} ({human_size(bundle_path)}).")
+    grid = build_pop_grid(points)
+    grid_path = output_dir / "pop_grid_es.json"
+    write_json(grid_path, grid)
+    print(f"Pop grid written: {grid_path} ({human_size(grid_path)}) with {len(grid['pop'])} cells.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""Build a quadtree pyramid of population sums, one level per map zoom.
+
+Level ``z`` holds the populated tiles of the ``tile-z-x-y`` scheme
+(``tile_scheme.py``): each cell's population, its population-weighted
+centroid and, above the finest level, the run of its four-or-fewer children
+in the next level. Cells are sorted in Morton (Z-order) order of ``(x, y)``,
+so a cell's children, and all of its descendants at any deeper level, are
+one contiguous run. A rectangle or radius query starts from the few cells
+at ``min_zoom`` and only descends into cells the shape cuts through, so it
+reads a number of cells proportional to the shape's outline at the chosen
+zoom instead of every point.
+
+Input is the WorldPop raster when one is found (aggregated with
+``build_worldpop_points.aggregate_raster`` at a quarter of the finest tile
+width), otherwise ``pop_points_es.json``. Each level is written as a rail
+bundle (``pop_pyramid_es_z<zoom>.bin``) and ``pop_pyramid_es.json`` indexes
+them.
+"""
+
+import argparse
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from build_es_rail_infra import read_pop_points
+from build_pop_points import human_size, write_json
+from build_worldpop_points import aggregate_raster, find_raster
+from rail_bundle import encode_bundle
+
+DEFAULT_MIN_ZOOM = 5
+DEFAULT_MAX_ZOOM = 14
+MAX_ZOOM = 24
+MAX_LAT = 85.0
+
+
+def tile_xy(lat, lon, zoom):
+    """Vectorised ``tile_scheme.lat_lon_to_tile``: tile ``x`` and ``y`` arrays at ``zoom``."""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -MAX_LAT, MAX_LAT))
+    x = np.floor((np.asarray(lon) + 180) / 360 * n)
+    y = np.floor((1 - np.log(np.tan(lat_rad) + 1 / np.cos(lat_rad)) / math.pi) / 2 * n)
+    return np.clip(x, 0, n - 1).astype(np.uint64), np.clip(y, 0, n - 1).astype(np.uint64)
+
+
+def _spread_bits(values):
+    """Interleave zeros between the low 32 bits of every value."""
+    values = values & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def _compact_bits(values):
+    """Inverse of ``_spread_bits``: keep every other bit."""
+    values = values & np.uint64(0x5555555555555555)
+    for shift, mask in ((1, 0x3333333333333333), (2, 0x0F0F0F0F0F0F0F0F), (4, 0x00FF00FF00FF00FF),
+                        (8, 0x0000FFFF0000FFFF), (16, 0x00000000FFFFFFFF)):
+        values = (values | (values >> np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def build_pyramid(lat, lon, pop, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM):
+    """Sum weighted points into every zoom from ``max_zoom`` up to ``min_zoom``.
+
+    Returns ``{zoom: level}``, each level a dict of columns: ``x``, ``y``,
+    ``pop``, ``lat``, ``lon`` (weighted centroid) and, except at
+    ``max_zoom``, ``child`` (first child's row in the next level) and
+    ``children`` (how many).
+    """
+    if not 0 <= min_zoom <= max_zoom <= MAX_ZOOM:
+        raise ValueError(f"zooms must satisfy 0 <= min <= max <= {MAX_ZOOM}")
+    keep = pop > 0
+    lat, lon, pop = lat[keep], lon[keep], pop[keep]
+    x, y = tile_xy(lat, lon, max_zoom)
+    keys, inverse = np.unique(_spread_bits(x) | (_spread_bits(y) << np.uint64(1)), return_inverse=True)
+    sums = np.vstack([np.bincount(inverse, weights=w, minlength=len(keys)) for w in (pop, pop * lat, pop * lon)])
+
+    levels = {}
+    child = None
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        level = {
+            "x": _compact_bits(keys),
+            "y": _compact_bits(keys >> np.uint64(1)),
+            "pop": sums[0],
+            "lat": sums[1] / sums[0],
+            "lon": sums[2] / sums[0],
+        }
+        if child is not None:
+            level["child"], level["children"] = child
+        levels[zoom] = level
+        if zoom == min_zoom:
+            break
+        # Morton order keeps siblings adjacent, so each parent is one run of its children.
+        parents = keys >> np.uint64(2)
+        starts = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+        child = (starts, np.diff(np.r_[starts, len(keys)]))
+        keys = parents[starts]
+        sums = np.add.reduceat(sums, starts, axis=1)
+    return levels
+
+
+def level_bundle(level, zoom, min_zoom, max_zoom):
+    columns = {
+        "x": ("uint32", level["x"].tolist()),
+        "y": ("uint32", level["y"].tolist()),
+        "pop": ("float32", level["pop"].tolist()),
+        "lat": ("float32", level["lat"].tolist()),
+        "lon": ("float32", level["lon"].tolist()),
+    }
+    if "child" in level:
+        columns["child"] = ("uint32", level["child"].tolist())
+        columns["children"] = ("uint8", level["children"].tolist())
+    meta = {"country": "ES", "scheme": "tile", "zoom": zoom, "min_zoom": min_zoom, "max_zoom": max_zoom}
+    return encode_bundle({"cells": columns}, meta)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the per-zoom population pyramid from pop points or WorldPop.")
+    parser.add_argument("output_dir", nargs="?", default="public/data/es", help="Directory holding pop_points_es.json")
+    parser.add_argument("--min-zoom", type=int, default=DEFAULT_MIN_ZOOM, help="Coarsest level (root cells)")
+    parser.add_argument("--max-zoom", type=int, default=DEFAULT_MAX_ZOOM, help="Finest level (leaf cells)")
+    parser.add_argument("--raster", help="WorldPop GeoTIFF (default: the newest one under data/raw, if any)")
+    parser.add_argument("--no-raster", action="store_true", help="Use pop_points_es.json even when a raster exists")
+    parser.add_argument("--workers", type=int, default=1, help="Raster decoding processes")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    output_dir = Path(args.output_dir)
+    raster = None if args.no_raster else (Path(args.raster) if args.raster else find_raster())
+    if raster is not None and raster.exists():
+        # A quarter of the finest tile's width, so centroids land in the right leaf.
+        cell_deg = 360 / 2 ** args.max_zoom / 4
+        (_, _, pop, lat, lon), _ = aggregate_raster(raster, cell_deg, workers=args.workers)
+        source = raster.name
+    else:
+        points_path = output_dir / "pop_points_es.json"
+        if not points_path.exists():
+            print("Missing pop points (run npm run data:es:pop first):", points_path)
+            sys.exit(1)
+        lat, lon, pop = read_pop_points(points_path)
+        source = points_path.name
+
+    try:
+        levels = build_pyramid(lat, lon, pop, args.min_zoom, args.max_zoom)
+    except ValueError as exc:
+        print(exc)
+        sys.exit(1)
+    index = {
+        "scheme": "tile",
+        "source": source,
+        "min_zoom": args.min_zoom,
+        "max_zoom": args.max_zoom,
+        "pop": round(float(pop.sum())),
+        "levels": [],
+    }
+    for zoom in sorted(levels):
+        name = f"pop_pyramid_es_z{zoom}.bin"
+        path = output_dir / name
+        path.write_bytes(level_bundle(levels[zoom], zoom, args.min_zoom, args.max_zoom))
+        index["levels"].append({"zoom": zoom, "file": name, "cells": len(levels[zoom]["pop"])})
+        print(f"  z{zoom}: {len(levels[zoom]['pop'])} cells, {human_size(path)}")
+    index_path = output_dir / "pop_pyramid_es.json"
+    write_json(index_path, index)
+    print(
+        f"Pop pyramid written: {index_path} from {source}, zooms {args.min_zoom}-{args.max_zoom}, "
+        f"{index['pop']:,} people."
+    )
+
+
+if __name__ == "__main__":
+    main()
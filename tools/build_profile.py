@@ -0,0 +1,141 @@
+"""Per-stage timing and memory accounting for the build tools.
+
+A ``StageProfiler`` wraps each stage of a build in ``with profiler.stage(name)``
+and records wall time, the process's peak RSS so far, the net change in
+allocated Python blocks and, when tracing is on, the ``tracemalloc`` peak
+inside the stage. With ``cprofile=True`` every stage also runs under its own
+``cProfile`` profile and only the slowest one is kept, for ``dump_hottest``.
+"""
+
+import cProfile
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def peak_rss_mb(children=False):
+    """High-water resident set size of this process (or its reaped children), or None."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+class StageProfiler:
+    def __init__(self, trace_allocations=False, cprofile=False):
+        self.trace_allocations = trace_allocations
+        self.cprofile = cprofile
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.hottest = None
+        self._hottest_profile = None
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        profile = cProfile.Profile() if self.cprofile else None
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        blocks_before = sys.getallocatedblocks()
+        started = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            seconds = time.perf_counter() - started
+            entry = {
+                "seconds": round(seconds, 4),
+                "peak_rss_mb": peak_rss_mb(),
+                "allocated_blocks": sys.getallocatedblocks() - blocks_before,
+            }
+            if self.trace_allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                entry["traced_peak_mb"] = round((peak - traced_before) / (1 << 20), 2)
+                entry["traced_net_mb"] = round((current - traced_before) / (1 << 20), 2)
+            self.stages[name] = entry
+            if profile and (self.hottest is None or seconds > self.stages[self.hottest]["seconds"]):
+                self.hottest = name
+                self._hottest_profile = profile
+
+    def run(self, name, func, *args):
+        with self.stage(name):
+            return func(*args)
+
+    def note(self, name, **counts):
+        """Attach item counts to a finished stage, with their per-second rates."""
+        entry = self.stages[name]
+        for key, count in counts.items():
+            entry[key] = count
+            entry[f"{key}_per_s"] = round(count / entry["seconds"], 1) if entry["seconds"] else None
+
+    def total_seconds(self):
+        return round(time.perf_counter() - self.started, 3)
+
+    def dump_hottest(self, path):
+        """Write the slowest stage's cProfile stats to ``path``; return the stage name."""
+        if self._hottest_profile is None:
+            return None
+        self._hottest_profile.dump_stats(str(path))
+        return self.hottest
+
+    def lines(self):
+        """Human-readable table of the stages in the order they ran."""
+        total = sum(entry["seconds"] for entry in self.stages.values()) or 1.0
+        width = max((len(name) for name in self.stages), default=5)
+        rows = [f"{'stage':<{width}}  {'seconds':>9}  {'share':>6}  {'peak RSS':>10}  {'blocks':>10}"]
+        for name, entry in self.stages.items():
+            rss = "n/a" if entry["peak_rss_mb"] is None else f"{entry['peak_rss_mb']:.1f} MB"
+            rows.append(
+                f"{name:<{width}}  {entry['seconds']:>9.3f}  {entry['seconds'] / total:>6.1%}  "
+                f"{rss:>10}  {entry['allocated_blocks']:>+10d}"
+            )
+        return rows
+
+
+def report_markdown(report):
+    """Markdown summary of a build report, for CI job summaries."""
+    lines = [f"### Rail infra build ({report.get('country', '')}, {report.get('generated_at', '')})", ""]
+    if report.get("unchanged"):
+        lines += ["No input changes; outputs left untouched.", ""]
+    lines += [
+        f"Total {report['total_seconds']:.1f}s, peak RSS {report.get('peak_rss_mb')} MB "
+        f"(workers {report.get('children_peak_rss_mb')} MB).",
+        "",
+        "| stage | seconds | peak RSS (MB) |",
+        "| --- | ---: | ---: |",
+    ]
+    for name, entry in report["stages"].items():
+        lines.append(f"| {name} | {entry['seconds']:.3f} | {entry['peak_rss_mb']} |")
+    throughput = report.get("throughput")
+    if throughput and throughput.get("track_seconds"):
+        lines += [
+            "",
+            f"Tracks: {throughput['track_features']} features / {throughput['track_vertices']} vertices, "
+            f"{throughput['features_per_s']:.0f} features/s, {throughput['vertices_per_s']:.0f} vertices/s.",
+        ]
+    counts = report.get("counts")
+    if counts:
+        lines += ["", "| count | value |", "| --- | ---: |"]
+        lines += [f"| {name} | {value} |" for name, value in counts.items()]
+    outputs = report.get("outputs")
+    if outputs:
+        lines += ["", "| output | bytes | rewritten |", "| --- | ---: | --- |"]
+        lines += [f"| {name} | {o['bytes']} | {'yes' if o['rewritten'] else 'no'} |" for name, o in outputs.items()]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    import json
+
+    with open(sys.argv[1], "r", encoding="utf-8") as fh:
+        sys.stdout.write(report_markdown(json.load(fh)))
@@ -0,0 +1,334 @@
+"""Aggregate a WorldPop population raster into pop points, comarca totals and catchments.
+
+The raster is streamed window by window through ``geotiff.GeoTiff`` and
+summed into ``--cell-deg`` cells, each carrying its population-weighted
+centroid, so memory depends on the window size and on the number of
+populated cells, not on the raster size. The cells are written in the same
+formats as ``build_pop_points.py`` (``pop_points_es.json``/``.bin`` and
+``pop_grid_es.json``), so the station catchment bands of
+``build_es_rail_infra.py`` and the app pick them up unchanged. Cells are
+also totalled per comarca and, with ``--stations``, into each station's
+2/5/10/20 km catchment.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from build_es_rail_infra import station_pop_bands
+from build_pop_points import (
+    POP_GRID_DEG,
+    build_pop_grid,
+    human_size,
+    order_pop_points,
+    pop_points_bundle,
+    pop_points_document,
+    write_json,
+)
+from build_profile import peak_rss_mb
+from geotiff import DEFAULT_WINDOW_BYTES, GeoTiff, GeoTiffError
+from nearest import PointIndex
+
+
+RASTER_GLOB = "data/raw/*/worldpop/ESP/*.tif"
+COMARCA_NODES = Path("public/comarca_nodes.json")
+# Cells are matched to the nearest comarca centroid within these radii when no polygons are given.
+COMARCA_RADII_KM = (10.0, 25.0, 50.0, 100.0)
+# Pending per-window cell sums are merged once they hold this many entries.
+CONSOLIDATE_ENTRIES = 500_000
+_KEY_BIAS = 1 << 30
+
+
+def find_raster():
+    candidates = sorted(Path(".").glob(RASTER_GLOB))
+    return candidates[-1] if candidates else None
+
+
+def _runs(values):
+    """Start offsets of the runs of equal consecutive values."""
+    return np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+
+
+def window_cells(raster, row0, col0, data, cell_deg):
+    """Sum one raster window into cells: ``(rows, cols, pop, pop * lat, pop * lon)`` of the non-empty cells.
+
+    Cell rows and columns change monotonically across a north-up window,
+    so each is a contiguous run of pixel rows or columns, and the sums are
+    two ``reduceat`` passes instead of a per-pixel scatter.
+    """
+    height, width = data.shape
+    lat, lon = raster.pixel_centres(row0, row0 + height, col0, col0 + width)
+    values = data.astype(np.float64)
+    invalid = ~np.isfinite(values) | (values <= 0)
+    if raster.nodata is not None:
+        invalid |= values == raster.nodata
+    values[invalid] = 0.0
+    cell_rows = np.floor(lat / cell_deg).astype(np.int64)
+    cell_cols = np.floor(lon / cell_deg).astype(np.int64)
+    row_starts = _runs(cell_rows)
+    col_starts = _runs(cell_cols)
+
+    pop_by_col = np.add.reduceat(values, col_starts, axis=1)
+    values *= lon
+    lon_by_col = np.add.reduceat(values, col_starts, axis=1)
+    del values
+    pop = np.add.reduceat(pop_by_col, row_starts, axis=0)
+    lat_sum = np.add.reduceat(pop_by_col * lat[:, None], row_starts, axis=0)
+    lon_sum = np.add.reduceat(lon_by_col, row_starts, axis=0)
+    keep = pop > 0
+    rows = np.broadcast_to(cell_rows[row_starts][:, None], pop.shape)[keep]
+    cols = np.broadcast_to(cell_cols[col_starts][None, :], pop.shape)[keep]
+    return rows, cols, pop[keep], lat_sum[keep], lon_sum[keep]
+
+
+class CellSums:
+    """Sparse running sums of population and weighted coordinates per cell.
+
+    Window sums are queued and merged in batches. Rows the scan has moved
+    past are frozen into their own sorted chunks, so each merge only
+    re-sorts the open frontier rather than every cell seen so far.
+    """
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((3, 0))
+        self._frozen = []
+        self._pending = []
+        self._pending_entries = 0
+
+    def add(self, rows, cols, pop, lat_sum, lon_sum, done_above=None):
+        """Queue one window's cells; rows greater than ``done_above`` will get no more data."""
+        if len(rows):
+            keys = ((rows + _KEY_BIAS) << 32) | (cols + _KEY_BIAS)
+            self._pending.append((keys, np.vstack((pop, lat_sum, lon_sum))))
+            self._pending_entries += len(keys)
+        if self._pending_entries >= CONSOLIDATE_ENTRIES:
+            self.consolidate(done_above)
+
+    def consolidate(self, done_above=None):
+        if self._pending:
+            keys = np.concatenate([self.keys] + [k for k, _ in self._pending])
+            sums = np.concatenate([self.sums] + [s for _, s in self._pending], axis=1)
+            self._pending = []
+            self._pending_entries = 0
+            self.keys, inverse = np.unique(keys, return_inverse=True)
+            self.sums = np.vstack([np.bincount(inverse, weights=row, minlength=len(self.keys)) for row in sums])
+        if done_above is not None:
+            split = int(np.searchsorted(self.keys, (done_above + 1 + _KEY_BIAS) << 32))
+            if split < len(self.keys):
+                self._frozen.append((self.keys[split:].copy(), self.sums[:, split:].copy()))
+                self.keys = self.keys[:split].copy()
+                self.sums = self.sums[:, :split].copy()
+
+    def cells(self):
+        """``(rows, cols, pop, lat, lon)`` sorted by row, then col, with weighted centroids."""
+        self.consolidate()
+        # Later chunks were frozen further south, so they hold lower rows.
+        chunks = [(self.keys, self.sums)] + self._frozen[::-1]
+        self.keys, self.sums, self._frozen = None, None, []
+        keys = np.concatenate([k for k, _ in chunks])
+        sums = np.concatenate([s for _, s in chunks], axis=1)
+        del chunks
+        rows = (keys >> 32) - _KEY_BIAS
+        keys &= 0xFFFFFFFF
+        keys -= _KEY_BIAS
+        pop, lat, lon = sums
+        lat /= pop
+        lon /= pop
+        return rows, keys, pop, lat, lon
+
+
+def aggregate_raster(path, cell_deg, window_bytes=DEFAULT_WINDOW_BYTES, workers=1):
+    """Stream ``path`` into cells; return the cells and a summary of the scan."""
+    sums = CellSums()
+    total = 0.0
+    windows = 0
+    with GeoTiff(path) as raster:
+        summary = {
+            "width": raster.width,
+            "height": raster.height,
+            "block": [raster.block_width, raster.block_height],
+            "compression": raster.compression,
+            "bounds": raster.bounds(),
+        }
+        north_up = raster.pixel_lat < 0
+        for row0, col0, data in raster.windows(window_bytes, workers):
+            cells = window_cells(raster, row0, col0, data, cell_deg)
+            total += float(cells[2].sum())
+            # Windows arrive top to bottom, so on a north-up raster no later window reaches above this one.
+            top = raster.pixel_centres(row0, row0 + 1, 0, 0)[0][0]
+            sums.add(*cells, done_above=math.floor(top / cell_deg) if north_up else None)
+            windows += 1
+    summary.update(windows=windows, population=total)
+    return sums.cells(), summary
+
+
+def cell_points(rows, cols, pop, lat, lon, min_pop):
+    """Pop-point records for the cells holding at least ``min_pop`` people."""
+    points = []
+    for i in np.flatnonzero(pop >= min_pop).tolist():
+        points.append(
+            {
+                "id": f"wp_{int(rows[i])}_{int(cols[i])}",
+                "name": f"WorldPop {lat[i]:.3f}, {lon[i]:.3f}",
+                "lat": round(float(lat[i]), 5),
+                "lon": round(float(lon[i]), 5),
+                "pop_est": int(round(float(pop[i]))),
+                "kind": "worldpop",
+            }
+        )
+    return points
+
+
+def _ring_contains(ring, lat, lon):
+    """Even-odd test of every point against one polygon ring (GeoJSON ``[lon, lat]`` pairs)."""
+    inside = np.zeros(len(lat), dtype=bool)
+    xs = np.asarray([p[0] for p in ring], dtype=np.float64)
+    ys = np.asarray([p[1] for p in ring], dtype=np.float64)
+    for x1, y1, x2, y2 in zip(xs, ys, np.roll(xs, 1), np.roll(ys, 1)):
+        crosses = (y1 > lat) != (y2 > lat)
+        if crosses.any():
+            at = x1 + (lat[crosses] - y1) * (x2 - x1) / (y2 - y1)
+            hit = np.flatnonzero(crosses)[lon[crosses] < at]
+            inside[hit] = ~inside[hit]
+    return inside
+
+
+def assign_by_polygons(features, lat, lon):
+    """Index of the first feature whose (Multi)Polygon holds each point, or -1."""
+    owner = np.full(len(lat), -1, dtype=np.int64)
+    for index, feature in enumerate(features):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            continue
+        for rings in polygons:
+            if not rings or not rings[0]:
+                continue
+            outer = np.asarray(rings[0], dtype=np.float64)
+            candidates = np.flatnonzero(
+                (owner < 0)
+                & (lon >= outer[:, 0].min()) & (lon <= outer[:, 0].max())
+                & (lat >= outer[:, 1].min()) & (lat <= outer[:, 1].max())
+            )
+            if not len(candidates):
+                continue
+            inside = np.zeros(len(candidates), dtype=bool)
+            for ring in rings:
+                inside ^= _ring_contains(ring, lat[candidates], lon[candidates])
+            owner[candidates[inside]] = index
+    return owner
+
+
+def comarca_totals(lat, lon, pop, comarcas_path):
+    """Total population per comarca, by polygon when ``comarcas_path`` is given, else by nearest centroid."""
+    if comarcas_path:
+        with open(comarcas_path, "r", encoding="utf-8") as fh:
+            features = json.load(fh).get("features") or []
+        records = []
+        for feature in features:
+            props = feature.get("properties") or {}
+            name = props.get("comarca_name") or props.get("name") or props.get("comarca") or props.get("id")
+            records.append({"id": str(props.get("comarca_id") or props.get("id") or name).upper(), "name": name})
+        owner = assign_by_polygons(features, lat, lon)
+        method = "polygon"
+    else:
+        with COMARCA_NODES.open("r", encoding="utf-8") as fh:
+            nodes = json.load(fh)
+        records = [{"id": str(node["id"]), "name": node["name"]} for node in nodes]
+        index = PointIndex([node["lat"] for node in nodes], [node["lon"] for node in nodes])
+        owner = index.query(lat, lon, radii_km=COMARCA_RADII_KM)[0][:, 0]
+        method = "nearest_centroid"
+    assigned = owner >= 0
+    totals = np.bincount(owner[assigned], weights=pop[assigned], minlength=len(records))
+    for record, total in zip(records, totals.tolist()):
+        record["pop"] = int(round(total))
+    return {
+        "method": method,
+        "unassigned_pop": int(round(float(pop[~assigned].sum()))),
+        "comarcas": records,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate a WorldPop GeoTIFF into pop points and comarca totals.")
+    parser.add_argument("output_dir", nargs="?", default="public/data/es", help="Where to write the outputs")
+    parser.add_argument("--raster", help=f"Population GeoTIFF (default: newest {RASTER_GLOB})")
+    parser.add_argument("--cell-deg", type=float, default=POP_GRID_DEG, help="Aggregation cell size in degrees")
+    parser.add_argument("--min-pop", type=float, default=1.0, help="Drop cells with fewer people from the pop points")
+    parser.add_argument("--comarcas", help="Comarca polygons (GeoJSON); default: nearest public/comarca_nodes.json")
+    parser.add_argument("--stations", help="stations_es.json to total into 2/5/10/20 km catchments")
+    parser.add_argument(
+        "--window-mb", type=int, default=DEFAULT_WINDOW_BYTES >> 20, help="Decoded raster window size in MiB"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Decode raster windows in this many processes")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    raster_path = Path(args.raster) if args.raster else find_raster()
+    if raster_path is None or not raster_path.exists():
+        print("Missing WorldPop raster:", raster_path or RASTER_GLOB)
+        sys.exit(1)
+    output_dir = Path(args.output_dir)
+
+    started = time.perf_counter()
+    try:
+        (rows, cols, pop, lat, lon), summary = aggregate_raster(
+            raster_path, args.cell_deg, args.window_mb << 20, args.workers
+        )
+    except GeoTiffError as exc:
+        print(f"Cannot read {raster_path}: {exc}")
+        sys.exit(1)
+    print(
+        f"Read {raster_path} ({summary['width']}x{summary['height']} px, {summary['windows']} windows) in "
+        f"{time.perf_counter() - started:.1f}s: {summary['population']:,.0f} people in {len(pop)} cells of "
+        f"{args.cell_deg}°, peak RSS {peak_rss_mb()} MB."
+    )
+
+    points = cell_points(rows, cols, pop, lat, lon, args.min_pop)
+    kept = sum(point["pop_est"] for point in points)
+    points, buckets = order_pop_points(points)
+    output_path = output_dir / "pop_points_es.json"
+    write_json(output_path, pop_points_document(points, buckets))
+    print(
+        f"Pop points written: {output_path} ({human_size(output_path)}) with {len(points)} cells holding "
+        f"{kept / max(summary['population'], 1):.1%} of the population."
+    )
+    bundle_path = output_dir / "pop_points_es.bin"
+    bundle_path.write_bytes(pop_points_bundle(points, buckets))
+    print(f"Columnar pop points written: {bundle_path} ({human_size(bundle_path)}).")
+    grid_path = output_dir / "pop_grid_es.json"
+    write_json(grid_path, build_pop_grid(points, args.cell_deg))
+    print(f"Pop grid written: {grid_path} ({human_size(grid_path)}).")
+
+    comarcas = comarca_totals(lat, lon, pop, args.comarcas)
+    comarcas.update(source=raster_path.name, cell_deg=args.cell_deg)
+    comarca_path = output_dir / "comarca_pop_es.json"
+    write_json(comarca_path, comarcas)
+    print(
+        f"Comarca totals written: {comarca_path} ({len(comarcas['comarcas'])} comarcas by {comarcas['method']}, "
+        f"{comarcas['unassigned_pop']:,} people unassigned)."
+    )
+
+    if args.stations:
+        with open(args.stations, "r", encoding="utf-8") as fh:
+            stations = [{"id": s["id"], "lat": s["lat"], "lon": s["lon"]} for s in json.load(fh)]
+        station_pop_bands(stations, lat, lon, pop)
+        catchments = {station["id"]: station["pop_bands"] for station in stations}
+        catchment_path = output_dir / "station_catchments_worldpop_es.json"
+        write_json(catchment_path, {"source": raster_path.name, "cell_deg": args.cell_deg, "stations": catchments})
+        print(f"Station catchments written: {catchment_path} for {len(catchments)} stations.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
-import os
+import hashlib
+import json
 import shutil
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 
@@ -43,13 +46,101 @@ def human_size(path):
     return f"{size:.1f} TiB"
 
 
+# One output per category: the filter expressions are applied to the small
+# combined extract, after a single pass over the full PBF with all of them.
+CATEGORIES = [
+    ("stations", ["n/railway=station,halt"]),
+    ("tracks", ["w/railway=rail,light_rail,highspeed"]),
+    ("places", [f"n/place={','.join(PLACE_TYPES)}"]),
+]
+
+STAMP_VERSION = 1
+_SHA256_CACHE = {}
+_PRINT_LOCK = threading.Lock()
+
+
+def log(message):
+    """Print a whole line at once; the category extracts run in threads."""
+    with _PRINT_LOCK:
+        print(message, flush=True)
+
+
 def run_osmium(parts):
-    print("Running:", " ".join(parts))
-    try:
-        subprocess.run(parts, check=True)
-    except subprocess.CalledProcessError as exc:
-        print(f"Command failed: {' '.join(parts)}")
-        sys.exit(exc.returncode)
+    log("Running: " + " ".join(parts))
+    subprocess.run(parts, check=True)
+
+
+def file_sha256(path):
+    """SHA-256 of a file, memoised per run on (path, size, mtime)."""
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    digest = _SHA256_CACHE.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with path.open("rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+        digest = _SHA256_CACHE[key] = h.hexdigest()
+    return digest
+
+
+def stamp_path(output):
+    return output.with_name(output.name + ".stamp.json")
+
+
+def make_stamp(inputs, command):
+    return {
+        "version": STAMP_VERSION,
+        "command": [str(part) for part in command[1:]],
+        "inputs": {str(path): file_sha256(path) for path in inputs},
+    }
+
+
+def run_step(output, inputs, command):
+    """Run one osmium step unless ``output`` is already stamped with these inputs and arguments.
+
+    Returns True if the step ran.
+    """
+    stamp = make_stamp(inputs, command)
+    path = stamp_path(output)
+    if output.exists() and path.exists():
+        try:
+            if json.loads(path.read_text(encoding="utf-8")) == stamp:
+                log(f"Up to date: {output}")
+                return False
+        except ValueError:
+            pass
+    path.unlink(missing_ok=True)
+    run_osmium(command)
+    path.write_text(json.dumps(stamp, indent=2), encoding="utf-8")
+    return True
+
+
+def extract_category(osmium_bin, combined_osm, raw_dir, name, expressions):
+    """Filter one category out of the combined extract and export it as GeoJSONSeq."""
+    category_osm = raw_dir / f"{name}.osm.pbf"
+    category_geojson = raw_dir / f"{name}.geojsonseq"
+    run_step(
+        category_osm,
+        [combined_osm],
+        [osmium_bin, "tags-filter", str(combined_osm), *expressions, "-O", "-o", str(category_osm)],
+    )
+    run_step(
+        category_geojson,
+        [category_osm],
+        [
+            osmium_bin,
+            "export",
+            str(category_osm),
+            "--add-unique-id=type_id",
+            "-f",
+            "geojsonseq",
+            "-O",
+            "-o",
+            str(category_geojson),
+        ],
+    )
+    return category_geojson
 
 
 def main():
@@ -76,22 +167,27 @@ def main():
         sys.exit(1)
 
     raw_dir.mkdir(parents=True, exist_ok=True)
-    stations_osm = raw_dir / "stations.osm.pbf"
-    tracks_osm = raw_dir / "tracks.osm.pbf"
-    stations_geojson = raw_dir / "stations.geojson"
-    tracks_geojson = raw_dir / "tracks.geojson"
-    places_osm = raw_dir / "places.osm.pbf"
-    places_geojson = raw_dir / "places.geojson"
-
-    run_osmium([osmium_bin, "tags-filter", str(input_pbf), "n/railway=station,n/railway=halt", "-o", str(stations_osm)])
-    run_osmium([osmium_bin, "tags-filter", str(input_pbf), "w/railway=rail,w/railway=light_rail,w/railway=highspeed", "-o", str(tracks_osm)])
-    run_osmium([osmium_bin, "tags-filter", str(input_pbf), f"n/place={','.join(PLACE_TYPES)}", "-o", str(places_osm)])
-    run_osmium([osmium_bin, "export", str(stations_osm), "-o", str(stations_geojson)])
-    run_osmium([osmium_bin, "export", str(tracks_osm), "-o", str(tracks_geojson)])
-    run_osmium([osmium_bin, "export", str(places_osm), "-o", str(places_geojson)])
+    combined_osm = raw_dir / "rail_places.osm.pbf"
+    expressions = [expression for _, category in CATEGORIES for expression in category]
+
+    try:
+        run_step(
+            combined_osm,
+            [input_pbf],
+            [osmium_bin, "tags-filter", str(input_pbf), *expressions, "-O", "-o", str(combined_osm)],
+        )
+        with ThreadPoolExecutor(max_workers=len(CATEGORIES)) as pool:
+            futures = [
+                pool.submit(extract_category, osmium_bin, combined_osm, raw_dir, name, category)
+                for name, category in CATEGORIES
+            ]
+            outputs = [future.result() for future in futures]
+    except subprocess.CalledProcessError as exc:
+        print(f"Command failed: {' '.join(exc.cmd)}")
+        sys.exit(exc.returncode)
 
     print("\nGeoJSON generation complete:")
-    for path in [stations_geojson, tracks_geojson, places_geojson]:
+    for path in outputs:
         print(f" - {path}: {human_size(path)}")
 
 
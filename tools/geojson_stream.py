@@ -0,0 +1,154 @@
+import json
+from pathlib import Path
+
+
+RECORD_SEPARATOR = "\x1e"
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = " \t\n\r" + RECORD_SEPARATOR
+# Characters that can continue a JSON number; raw_decode stops before them when a chunk ends mid-number.
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class _Reader:
+    """Incremental JSON value reader over a text file handle.
+
+    Only the unparsed tail of the input is kept in memory, so a
+    FeatureCollection of any size is consumed one feature at a time.
+    """
+
+    def __init__(self, fh, chunk_size=CHUNK_SIZE):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.fh.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """Return the next significant character without consuming it, or ''."""
+        while True:
+            buf = self.buf
+            pos = self.pos
+            end = len(buf)
+            while pos < end and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < end:
+                return buf[pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed GeoJSON: expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Incomplete value at the end of the buffer: read more and retry.
+                if not self.fill():
+                    raise
+                continue
+            # A number may be cut off at a chunk boundary and still decode: the buffer ends
+            # right after it, or raw_decode stopped at the "." / "e" of "12.5" / "1e5".
+            number = isinstance(obj, (int, float)) and not isinstance(obj, bool)
+            cut = end == len(self.buf) or (number and self.buf[end] in _NUMBER_CHARS)
+            if cut and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def _iter_array(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        sep = reader.peek()
+        reader.pos += 1
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError(f"Malformed GeoJSON: expected ',' or ']', found {sep!r}")
+
+
+def _iter_object(reader):
+    """Walk one top-level object, streaming the elements of its ``features`` member.
+
+    Yields ``("feature", feature)`` for each element of a ``features`` array
+    and finally ``("object", members)`` with every other member.
+    """
+    reader.expect("{")
+    members = {}
+    if reader.peek() == "}":
+        reader.pos += 1
+        yield "object", members
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "features" and reader.peek() == "[":
+            for feature in _iter_array(reader):
+                yield "feature", feature
+            members["features"] = None
+        else:
+            members[key] = reader.value()
+        sep = reader.peek()
+        reader.pos += 1
+        if sep == "}":
+            break
+        if sep != ",":
+            raise ValueError(f"Malformed GeoJSON: expected ',' or '}}', found {sep!r}")
+    yield "object", members
+
+
+def iter_features(fh, chunk_size=CHUNK_SIZE):
+    """Yield GeoJSON features from an open text stream one at a time.
+
+    Accepts a FeatureCollection (the ``osmium export`` default) as well as
+    GeoJSONSeq / newline-delimited input, with or without RFC 8142 record
+    separators.
+    """
+    reader = _Reader(fh, chunk_size)
+    while reader.peek():
+        if reader.peek() != "{":
+            raise ValueError(f"Malformed GeoJSON: unexpected {reader.peek()!r} at top level")
+        for kind, obj in _iter_object(reader):
+            if kind == "feature":
+                if isinstance(obj, dict):
+                    yield obj
+            elif obj.get("type") == "Feature":
+                yield obj
+
+
+def read_geojson(path):
+    """Stream the features of a GeoJSON or GeoJSONSeq file at ``path``."""
+    with path.open("r", encoding="utf-8") as fh:
+        yield from iter_features(fh)
+
+
+def find_geojson(stem):
+    """Return ``<stem>.geojsonseq`` if it exists, else ``<stem>.geojson``."""
+    stem = Path(stem)
+    seq = stem.with_name(stem.name + ".geojsonseq")
+    return seq if seq.exists() else stem.with_name(stem.name + ".geojson")
@@ -0,0 +1,360 @@
+"""Windowed reads of single-band GeoTIFF rasters through a memory map.
+
+Enough of TIFF/BigTIFF to stream population rasters such as WorldPop's
+100 m grids without GDAL: strip or tile layouts, no compression, Deflate or
+LZW, horizontal and floating-point predictors, and north-up geographic
+georeferencing (``ModelTiepoint`` + ``ModelPixelScale``, or an unrotated
+``ModelTransformation``). The file is mapped, never read whole, and
+``windows`` decodes a band of blocks at a time (optionally in a process
+pool), so memory stays bounded by the window size however large the raster
+is. Pages of blocks already consumed are dropped from the mapping as the
+scan moves on.
+"""
+
+import mmap
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+DEFAULT_WINDOW_BYTES = 16 << 20
+
+_TYPES = {
+    1: "u1", 2: "u1", 3: "u2", 4: "u4", 5: "u4", 6: "i1", 7: "u1", 8: "i2", 9: "i4", 10: "i4",
+    11: "f4", 12: "f8", 16: "u8", 17: "i8", 18: "u8",
+}
+_RATIONALS = (5, 10)
+
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTE_COUNTS = 325
+TAG_SAMPLE_FORMAT = 339
+TAG_MODEL_PIXEL_SCALE = 33550
+TAG_MODEL_TIEPOINT = 33922
+TAG_MODEL_TRANSFORMATION = 34264
+TAG_GEO_KEYS = 34735
+TAG_GDAL_NODATA = 42113
+
+KEY_MODEL_TYPE = 1024
+KEY_RASTER_TYPE = 1025
+KEY_GEOGRAPHIC_TYPE = 2048
+MODEL_TYPE_GEOGRAPHIC = 2
+RASTER_PIXEL_IS_POINT = 2
+
+COMPRESSION_NONE = 1
+COMPRESSION_LZW = 5
+COMPRESSION_DEFLATE = (8, 32946)
+
+
+class GeoTiffError(ValueError):
+    pass
+
+
+def lzw_decode(data):
+    """Decode TIFF-flavoured LZW (MSB-first codes, early code-width change)."""
+    out = bytearray()
+    table = [bytes((i,)) for i in range(256)] + [b"", b""]
+    padded = bytes(data) + b"\0\0\0"
+    total_bits = len(data) * 8
+    bitpos = 0
+    width = 9
+    previous = None
+    while bitpos + width <= total_bits:
+        byte = bitpos >> 3
+        chunk = (padded[byte] << 16) | (padded[byte + 1] << 8) | padded[byte + 2]
+        code = (chunk >> (24 - (bitpos & 7) - width)) & ((1 << width) - 1)
+        bitpos += width
+        if code == 256:
+            del table[258:]
+            width = 9
+            previous = None
+            continue
+        if code == 257:
+            break
+        if previous is None:
+            entry = table[code]
+        else:
+            entry = table[code] if code < len(table) else previous + previous[:1]
+            table.append(previous + entry[:1])
+            if len(table) in (511, 1023, 2047):
+                width += 1
+        out += entry
+        previous = entry
+    return bytes(out)
+
+
+class GeoTiff:
+    """A single-band GeoTIFF opened through ``mmap``; use as a context manager."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fh.close()
+            raise GeoTiffError(f"{path} is empty")
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._fh.close()
+
+    def _read_header(self):
+        order = bytes(self._map[:2])
+        if order not in (b"II", b"MM"):
+            raise GeoTiffError(f"{self.path} is not a TIFF file")
+        self.endian = "<" if order == b"II" else ">"
+        magic = struct.unpack_from(self.endian + "H", self._map, 2)[0]
+        if magic == 42:
+            self.bigtiff = False
+            first_ifd = struct.unpack_from(self.endian + "I", self._map, 4)[0]
+        elif magic == 43:
+            self.bigtiff = True
+            first_ifd = struct.unpack_from(self.endian + "Q", self._map, 8)[0]
+        else:
+            raise GeoTiffError(f"{self.path}: unknown TIFF version {magic}")
+        tags = self._read_ifd(first_ifd)
+        self.tags = tags
+
+        self.width = int(tags[TAG_WIDTH][0])
+        self.height = int(tags[TAG_HEIGHT][0])
+        if int(tags.get(TAG_SAMPLES_PER_PIXEL, [1])[0]) != 1:
+            raise GeoTiffError(f"{self.path}: only single-band rasters are supported")
+        bits = int(tags.get(TAG_BITS_PER_SAMPLE, [1])[0])
+        sample_format = int(tags.get(TAG_SAMPLE_FORMAT, [1])[0])
+        kind = {1: "u", 2: "i", 3: "f"}.get(sample_format)
+        if kind is None or bits not in (8, 16, 32, 64) or (kind == "f" and bits < 32):
+            raise GeoTiffError(f"{self.path}: unsupported sample format {sample_format}/{bits} bits")
+        self.dtype = np.dtype(f"{self.endian}{kind}{bits // 8}")
+        self.compression = int(tags.get(TAG_COMPRESSION, [COMPRESSION_NONE])[0])
+        if self.compression not in (COMPRESSION_NONE, COMPRESSION_LZW) + COMPRESSION_DEFLATE:
+            raise GeoTiffError(
+                f"{self.path}: compression {self.compression} is not supported; "
+                "re-encode with gdal_translate -co COMPRESS=DEFLATE"
+            )
+        self.predictor = int(tags.get(TAG_PREDICTOR, [1])[0])
+        if self.predictor not in (1, 2, 3) or (self.predictor == 3 and kind != "f"):
+            raise GeoTiffError(f"{self.path}: unsupported predictor {self.predictor}")
+
+        if TAG_TILE_WIDTH in tags:
+            self.block_width = int(tags[TAG_TILE_WIDTH][0])
+            self.block_height = int(tags[TAG_TILE_LENGTH][0])
+            offsets, counts = tags[TAG_TILE_OFFSETS], tags[TAG_TILE_BYTE_COUNTS]
+        else:
+            self.block_width = self.width
+            self.block_height = min(int(tags.get(TAG_ROWS_PER_STRIP, [self.height])[0]), self.height)
+            offsets, counts = tags[TAG_STRIP_OFFSETS], tags[TAG_STRIP_BYTE_COUNTS]
+        self.blocks_across = -(-self.width // self.block_width)
+        self.blocks_down = -(-self.height // self.block_height)
+        self.block_offsets = np.asarray(offsets, dtype=np.int64)
+        self.block_counts = np.asarray(counts, dtype=np.int64)
+        if len(self.block_offsets) < self.blocks_across * self.blocks_down:
+            raise GeoTiffError(f"{self.path}: fewer blocks than the raster size needs")
+
+        nodata = tags.get(TAG_GDAL_NODATA)
+        self.nodata = float(nodata.strip("\0 ")) if nodata else None
+        self._read_georeference(tags)
+
+    def _read_ifd(self, offset):
+        endian = self.endian
+        if self.bigtiff:
+            count = struct.unpack_from(endian + "Q", self._map, offset)[0]
+            entry_size, head, inline = 20, endian + "HHQ", 8
+            offset += 8
+        else:
+            count = struct.unpack_from(endian + "H", self._map, offset)[0]
+            entry_size, head, inline = 12, endian + "HHI", 4
+            offset += 2
+        tags = {}
+        for i in range(count):
+            entry = offset + i * entry_size
+            tag, kind, n = struct.unpack_from(head, self._map, entry)
+            if kind not in _TYPES:
+                continue
+            dtype = np.dtype(endian + _TYPES[kind])
+            values = n * (2 if kind in _RATIONALS else 1)
+            size = values * dtype.itemsize
+            where = entry + entry_size - inline
+            if size > inline:
+                where = struct.unpack_from(endian + ("Q" if self.bigtiff else "I"), self._map, where)[0]
+            if kind == 2:
+                tags[tag] = bytes(self._map[where:where + n]).decode("latin-1")
+                continue
+            array = np.frombuffer(self._map, dtype=dtype, count=values, offset=where)
+            if kind in _RATIONALS:
+                array = array[0::2] / np.where(array[1::2] == 0, 1, array[1::2])
+            tags[tag] = array.tolist()
+        return tags
+
+    def _read_georeference(self, tags):
+        keys = {}
+        directory = tags.get(TAG_GEO_KEYS)
+        if directory:
+            for i in range(4, 4 + 4 * int(directory[3]), 4):
+                key, location, _, value = directory[i:i + 4]
+                if location == 0:
+                    keys[int(key)] = int(value)
+        self.geo_keys = keys
+        model_type = keys.get(KEY_MODEL_TYPE, MODEL_TYPE_GEOGRAPHIC)
+        if model_type != MODEL_TYPE_GEOGRAPHIC:
+            raise GeoTiffError(f"{self.path}: projected rasters are not supported; warp to EPSG:4326 first")
+        self.epsg = keys.get(KEY_GEOGRAPHIC_TYPE)
+
+        if TAG_MODEL_TRANSFORMATION in tags:
+            matrix = tags[TAG_MODEL_TRANSFORMATION]
+            if matrix[1] or matrix[4]:
+                raise GeoTiffError(f"{self.path}: rotated rasters are not supported")
+            self.pixel_lon, self.origin_lon = matrix[0], matrix[3]
+            self.pixel_lat, self.origin_lat = matrix[5], matrix[7]
+        elif TAG_MODEL_TIEPOINT in tags and TAG_MODEL_PIXEL_SCALE in tags:
+            i, j, _, lon, lat, _ = tags[TAG_MODEL_TIEPOINT][:6]
+            scale_lon, scale_lat = tags[TAG_MODEL_PIXEL_SCALE][:2]
+            self.pixel_lon, self.pixel_lat = scale_lon, -scale_lat
+            self.origin_lon = lon - i * scale_lon
+            self.origin_lat = lat + j * scale_lat
+        else:
+            raise GeoTiffError(f"{self.path} has no georeferencing")
+        if keys.get(KEY_RASTER_TYPE) == RASTER_PIXEL_IS_POINT:
+            # Tie points name pixel centres; shift the origin to the corner.
+            self.origin_lon -= self.pixel_lon / 2
+            self.origin_lat -= self.pixel_lat / 2
+
+    def pixel_centres(self, row0, row1, col0, col1):
+        """Latitudes of rows ``row0:row1`` and longitudes of columns ``col0:col1``, at pixel centres."""
+        lat = self.origin_lat + (np.arange(row0, row1) + 0.5) * self.pixel_lat
+        lon = self.origin_lon + (np.arange(col0, col1) + 0.5) * self.pixel_lon
+        return lat, lon
+
+    def bounds(self):
+        """``(south, west, north, east)`` of the raster's outer edges."""
+        lats = (self.origin_lat, self.origin_lat + self.height * self.pixel_lat)
+        lons = (self.origin_lon, self.origin_lon + self.width * self.pixel_lon)
+        return min(lats), min(lons), max(lats), max(lons)
+
+    def _decode_block(self, index):
+        offset = int(self.block_offsets[index])
+        count = int(self.block_counts[index])
+        rows, cols = self.block_height, self.block_width
+        size = rows * cols * self.dtype.itemsize
+        if count == 0:
+            return np.zeros((rows, cols), dtype=self.dtype.newbyteorder("="))
+        raw = memoryview(self._map)[offset:offset + count]
+        if self.compression == COMPRESSION_NONE:
+            data = bytes(raw)
+        elif self.compression == COMPRESSION_LZW:
+            data = lzw_decode(raw)
+        else:
+            data = zlib.decompress(raw)
+        # Short final strips are allowed; pad them to a full block.
+        if len(data) < size:
+            data = bytes(data) + bytes(size - len(data))
+        if self.predictor == 3:
+            return self._undo_float_predictor(data, rows, cols)
+        block = np.frombuffer(data, dtype=self.dtype, count=rows * cols).reshape(rows, cols)
+        if self.predictor == 2:
+            block = np.cumsum(block, axis=1, dtype=self.dtype)
+        return block.astype(self.dtype.newbyteorder("="), copy=False)
+
+    def _undo_float_predictor(self, data, rows, cols):
+        itemsize = self.dtype.itemsize
+        shuffled = np.frombuffer(data, dtype=np.uint8, count=rows * cols * itemsize).reshape(rows, cols * itemsize)
+        shuffled = np.cumsum(shuffled, axis=1, dtype=np.uint8)
+        # Each row holds every sample's most significant byte first, then the next byte, and so on.
+        ordered = np.ascontiguousarray(shuffled.reshape(rows, itemsize, cols).transpose(0, 2, 1))
+        return ordered.view(f">f{itemsize}").reshape(rows, cols).astype(self.dtype.newbyteorder("="))
+
+    def _release(self, indices):
+        """Tell the kernel the pages of these blocks will not be read again."""
+        if not hasattr(self._map, "madvise") or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        start = int(self.block_offsets[indices].min())
+        end = int((self.block_offsets[indices] + self.block_counts[indices]).max())
+        start -= start % mmap.PAGESIZE
+        if end > start:
+            self._map.madvise(mmap.MADV_DONTNEED, start, min(end, len(self._map)) - start)
+
+    def window_spans(self, max_bytes=DEFAULT_WINDOW_BYTES):
+        """``(block_rows, block_cols)`` ranges of the windows ``windows`` decodes, top to bottom.
+
+        A window is a run of whole block rows, split into runs of block
+        columns when a full-width band would exceed ``max_bytes`` of decoded
+        samples.
+        """
+        block_bytes = self.block_width * self.block_height * self.dtype.itemsize
+        across = max(1, min(self.blocks_across, max_bytes // block_bytes))
+        down = max(1, max_bytes // (block_bytes * self.blocks_across)) if across == self.blocks_across else 1
+        for band in range(0, self.blocks_down, down):
+            for first in range(0, self.blocks_across, across):
+                yield (
+                    range(band, min(band + down, self.blocks_down)),
+                    range(first, min(first + across, self.blocks_across)),
+                )
+
+    def read_window(self, block_rows, block_cols):
+        """Decode one window; return ``(row0, col0, array)`` in native byte order, clipped to the raster."""
+        window = np.block(
+            [[self._decode_block(r * self.blocks_across + c) for c in block_cols] for r in block_rows]
+        )
+        self._release(np.array([r * self.blocks_across + c for r in block_rows for c in block_cols]))
+        row0 = block_rows.start * self.block_height
+        col0 = block_cols.start * self.block_width
+        return row0, col0, window[:self.height - row0, :self.width - col0]
+
+    def windows(self, max_bytes=DEFAULT_WINDOW_BYTES, workers=1):
+        """Yield ``(row0, col0, array)`` windows covering the raster, top to bottom.
+
+        With ``workers > 1`` windows are decoded in a process pool, each
+        worker mapping the file itself; at most two windows per worker are
+        in flight, so memory stays bounded while the caller consumes them.
+        """
+        spans = self.window_spans(max_bytes)
+        if workers <= 1:
+            for block_rows, block_cols in spans:
+                yield self.read_window(block_rows, block_cols)
+            return
+        with ProcessPoolExecutor(workers, initializer=_open_worker, initargs=(str(self.path),)) as pool:
+            pending = deque()
+            for span in spans:
+                pending.append(pool.submit(_read_worker_window, *span))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+_worker_raster = None
+
+
+def _open_worker(path):
+    global _worker_raster
+    _worker_raster = GeoTiff(path)
+
+
+def _read_worker_window(block_rows, block_cols):
+    return _worker_raster.read_window(block_rows, block_cols)
@@ -0,0 +1,190 @@
+"""Bulk nearest-neighbour queries over lat/lon points.
+
+Points are projected onto the unit sphere (x, y, z), where straight-line
+chord length grows monotonically with great-circle distance, and bucketed
+into a uniform cubic grid. Unlike a lat/lon bucket grid the cells are the
+same size at every latitude. One grid is built per search radius (cell edge
+= radius) and reused, so every query only inspects the 27 cells around it.
+All queries are answered in vectorised batches.
+"""
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_RADII_KM = (0.5, 1.0, 2.0)
+QUERY_BATCH = 4096
+
+_CELL_BITS = 21
+_CELL_BIAS = 1 << (_CELL_BITS - 1)
+_NEIGHBOUR_OFFSETS = np.array(
+    [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)],
+    dtype=np.int64,
+)
+
+
+def to_unit_xyz(lat, lon):
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_phi = np.cos(phi)
+    return np.column_stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)))
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2.0, 1.0))
+
+
+def _pack_cells(cells):
+    cells = cells + _CELL_BIAS
+    return (cells[:, 0] << (2 * _CELL_BITS)) | (cells[:, 1] << _CELL_BITS) | cells[:, 2]
+
+
+def _expand_ranges(starts, counts):
+    """Concatenate ``arange(s, s + c)`` for every (start, count) pair."""
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    group_start = np.cumsum(counts) - counts
+    return np.repeat(starts - group_start, counts) + np.arange(total, dtype=np.int64)
+
+
+class _Grid:
+    def __init__(self, xyz, cell):
+        if 2.0 / cell >= _CELL_BIAS:
+            raise ValueError(f"Search radius too small for the spatial grid: {cell * EARTH_RADIUS_KM} km")
+        self.cell = cell
+        keys = _pack_cells(np.floor(xyz / cell).astype(np.int64))
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.keys, self.starts, self.counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    def candidates(self, q_xyz):
+        """Return (query index, point index) pairs for points in the 27 cells around each query."""
+        q_cells = np.floor(q_xyz / self.cell).astype(np.int64)
+        q_out = []
+        p_out = []
+        last = len(self.keys) - 1
+        for offset in _NEIGHBOUR_OFFSETS:
+            want = _pack_cells(q_cells + offset)
+            pos = np.minimum(np.searchsorted(self.keys, want), last)
+            hit = np.nonzero(self.keys[pos] == want)[0]
+            if not hit.size:
+                continue
+            cell = pos[hit]
+            counts = self.counts[cell]
+            q_out.append(np.repeat(hit, counts))
+            p_out.append(self.order[_expand_ranges(self.starts[cell], counts)])
+        if not q_out:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(q_out), np.concatenate(p_out)
+
+
+class PointIndex:
+    """Static spatial index over a set of lat/lon points.
+
+    Build it once (e.g. over rail nodes or stations) and answer whole arrays
+    of queries with ``query`` (k nearest, adaptive radius) or ``pairs_within``
+    (every point inside a radius).
+    """
+
+    def __init__(self, lat, lon):
+        self.xyz = to_unit_xyz(lat, lon)
+        self._grids = {}
+
+    def __len__(self):
+        return len(self.xyz)
+
+    def _grid(self, radius_km):
+        grid = self._grids.get(radius_km)
+        if grid is None:
+            grid = _Grid(self.xyz, radius_km / EARTH_RADIUS_KM)
+            self._grids[radius_km] = grid
+        return grid
+
+    def _pairs(self, q_xyz, radius_km):
+        qi, pi = self._grid(radius_km).candidates(q_xyz)
+        diff = q_xyz[qi] - self.xyz[pi]
+        dist = chord_to_km(np.sqrt(np.einsum("ij,ij->i", diff, diff)))
+        keep = dist <= radius_km
+        return qi[keep], pi[keep], dist[keep]
+
+    def pairs_within(self, lat, lon, radius_km):
+        """Return ``(query_idx, point_idx, distance_km)`` for every point within ``radius_km``."""
+        q_xyz = to_unit_xyz(lat, lon)
+        out_q, out_p, out_d = [], [], []
+        if len(self.xyz):
+            for start in range(0, len(q_xyz), QUERY_BATCH):
+                qi, pi, dist = self._pairs(q_xyz[start:start + QUERY_BATCH], radius_km)
+                out_q.append(qi + start)
+                out_p.append(pi)
+                out_d.append(dist)
+        if not out_q:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(out_q), np.concatenate(out_p), np.concatenate(out_d)
+
+    def query(self, lat, lon, k=1, radii_km=DEFAULT_RADII_KM):
+        """Find the ``k`` nearest points to every query location.
+
+        Each query starts at the first radius in ``radii_km`` and is widened to
+        the next one while it has fewer than ``k`` candidates. Returns
+        ``(indices, distances_km, radius_km)``: ``indices`` and ``distances_km``
+        have shape ``(n, k)`` sorted by distance, padded with -1 / inf, and
+        ``radius_km`` holds the radius that settled each query (NaN when
+        nothing was found within the largest radius).
+        """
+        q_xyz = to_unit_xyz(lat, lon)
+        n = len(q_xyz)
+        indices = np.full((n, k), -1, dtype=np.int64)
+        distances = np.full((n, k), np.inf)
+        settled = np.full(n, np.nan)
+        pending = np.arange(n)
+        if not len(self.xyz):
+            return indices, distances, settled
+        for step, radius in enumerate(radii_km):
+            last_step = step == len(radii_km) - 1
+            still_pending = []
+            for start in range(0, len(pending), QUERY_BATCH):
+                batch = pending[start:start + QUERY_BATCH]
+                qi, pi, dist = self._pairs(q_xyz[batch], radius)
+                order = np.lexsort((pi, dist, qi))
+                qi, pi, dist = qi[order], pi[order], dist[order]
+                found = np.bincount(qi, minlength=len(batch))
+                rank = np.arange(len(qi)) - np.repeat(np.cumsum(found) - found, found)
+                top = rank < k
+                rows = batch[qi[top]]
+                indices[rows, rank[top]] = pi[top]
+                distances[rows, rank[top]] = dist[top]
+                done = found >= k
+                if last_step:
+                    done = found > 0
+                settled[batch[done]] = radius
+                still_pending.append(batch[~done])
+            pending = np.concatenate(still_pending) if still_pending else pending[:0]
+            if not len(pending):
+                break
+        return indices, distances, settled
+
+
+def snap_stats(distances_km, bins_km=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)):
+    """Summarise snap distances: quantiles plus a histogram keyed by each bin's upper edge."""
+    d = np.asarray(distances_km, dtype=np.float64)
+    d = d[np.isfinite(d)]
+    stats = {"count": int(d.size)}
+    if d.size:
+        stats.update(
+            {
+                "min_km": float(d.min()),
+                "mean_km": float(d.mean()),
+                "median_km": float(np.median(d)),
+                "p90_km": float(np.percentile(d, 90)),
+                "p99_km": float(np.percentile(d, 99)),
+                "max_km": float(d.max()),
+            }
+        )
+    edges = np.asarray(bins_km, dtype=np.float64)
+    counts = np.bincount(np.searchsorted(edges, d, side="left"), minlength=len(edges) + 1)
+    stats["histogram"] = [
+        {"le_km": float(edge), "count": int(count)} for edge, count in zip(edges, counts[:-1])
+    ] + [{"le_km": None, "count": int(counts[-1])}]
+    return stats
@@ -0,0 +1,90 @@
+"""Encoded polyline helpers (Google polyline algorithm, precision 1e-6).
+
+Coordinates are written lat/lon, the order the map layer expects.
+"""
+
+import numpy as np
+
+
+PRECISION = 6
+
+
+def encode_many(lat, lon, offsets, precision=PRECISION):
+    """Encode consecutive runs of points as polylines in one vectorised pass.
+
+    ``lat``/``lon`` hold the points of every line back to back and
+    ``offsets`` (length ``n_lines + 1``) marks where each line starts.
+    Returns a list of ``n_lines`` ASCII strings.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_lines = len(offsets) - 1
+    if n_lines <= 0:
+        return []
+    if not len(lat):
+        return [""] * n_lines
+    scale = 10 ** precision
+    ints = np.empty((len(lat), 2), dtype=np.int64)
+    ints[:, 0] = np.round(np.asarray(lat, dtype=np.float64) * scale)
+    ints[:, 1] = np.round(np.asarray(lon, dtype=np.float64) * scale)
+    deltas = np.empty_like(ints)
+    deltas[0] = ints[0]
+    deltas[1:] = ints[1:] - ints[:-1]
+    starts = offsets[:-1][offsets[:-1] < offsets[1:]]
+    deltas[starts] = ints[starts]
+    values = deltas.ravel()
+    values = np.where(values < 0, ~(values << 1), values << 1)
+
+    chunks = np.ones(len(values), dtype=np.int64)
+    rest = values >> 5
+    while rest.any():
+        chunks += rest > 0
+        rest >>= 5
+    char_end = np.cumsum(chunks)
+    char_start = char_end - chunks
+    out = np.empty(int(char_end[-1]), dtype=np.uint8)
+    for k in range(int(chunks.max())):
+        has = chunks > k
+        part = (values[has] >> (5 * k)) & 0x1F
+        more = chunks[has] > k + 1
+        out[char_start[has] + k] = (part | (more * 0x20)) + 63
+
+    text = out.tobytes().decode("ascii")
+    line_chars = np.zeros(n_lines + 1, dtype=np.int64)
+    line_chars[1:] = char_end[offsets[1:] * 2 - 1]
+    empty = offsets[1:] == offsets[:-1]
+    line_chars[1:][empty] = 0
+    line_chars = np.maximum.accumulate(line_chars)
+    bounds = line_chars.tolist()
+    return [text[bounds[i]:bounds[i + 1]] for i in range(n_lines)]
+
+
+def encode(points, precision=PRECISION):
+    """Encode a single sequence of ``(lat, lon)`` pairs."""
+    if not points:
+        return ""
+    lat, lon = zip(*points)
+    return encode_many(lat, lon, [0, len(points)], precision)[0]
+
+
+def decode(text, precision=PRECISION):
+    """Decode an encoded polyline back into a list of ``(lat, lon)`` pairs."""
+    scale = 10 ** precision
+    coords = []
+    values = []
+    shift = 0
+    result = 0
+    for char in text:
+        byte = ord(char) - 63
+        result |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            shift = 0
+            result = 0
+    lat = 0
+    lon = 0
+    for i in range(0, len(values) - 1, 2):
+        lat += values[i]
+        lon += values[i + 1]
+        coords.append((lat / scale, lon / scale))
+    return coords
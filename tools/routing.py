@@ -0,0 +1,278 @@
+"""Shortest travel times over the rail graph: CSR adjacency, Dijkstra and a contraction hierarchy.
+
+Edge weights are minutes, ``distance_km / max_speed_kmh * 60``. The graph is
+undirected, so a single upward graph serves both directions of a CH query.
+"""
+
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+UNREACHABLE_MINUTES = 0xFFFF
+NO_MIDDLE = 0xFFFFFFFF
+
+# Witness searches stop after settling this many nodes; a missed witness
+# only costs an unnecessary shortcut, never a wrong distance.
+WITNESS_SETTLE_LIMIT = 200
+
+
+def travel_minutes(distance_km, max_speed_kmh):
+    speed = np.maximum(np.asarray(max_speed_kmh, dtype=np.float64), 1.0)
+    return np.asarray(distance_km, dtype=np.float64) / speed * 60.0
+
+
+class CSRGraph:
+    """Undirected weighted graph in compressed sparse row form.
+
+    Parallel links keep their fastest weight; self-loops are dropped.
+    """
+
+    def __init__(self, node_count, a, b, weight):
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        weight = np.asarray(weight, dtype=np.float64)
+        keep = a != b
+        src = np.concatenate((a[keep], b[keep]))
+        dst = np.concatenate((b[keep], a[keep]))
+        w = np.concatenate((weight[keep], weight[keep]))
+        order = np.lexsort((w, dst, src))
+        src, dst, w = src[order], dst[order], w[order]
+        first = np.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst, w = src[first], dst[first], w[first]
+        self.node_count = node_count
+        self.offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=node_count), out=self.offsets[1:])
+        self.targets = dst
+        self.weights = w
+
+    def __len__(self):
+        return self.node_count
+
+    def adjacency(self):
+        """Per-node ``[(neighbour, minutes), ...]`` lists for the pure-Python searches."""
+        offsets = self.offsets.tolist()
+        pairs = list(zip(self.targets.tolist(), self.weights.tolist()))
+        return [pairs[offsets[i]:offsets[i + 1]] for i in range(self.node_count)]
+
+
+def dijkstra(adjacency, source, targets=None):
+    """Single-source shortest times; stops early once every node in ``targets`` is settled."""
+    dist = {source: 0.0}
+    done = set()
+    remaining = set(targets) if targets is not None else None
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        if remaining is not None:
+            remaining.discard(node)
+            if not remaining:
+                break
+        for other, w in adjacency[node]:
+            alt = d + w
+            if alt < dist.get(other, float("inf")):
+                dist[other] = alt
+                heapq.heappush(heap, (alt, other))
+    return dist
+
+
+_worker_adjacency = None
+
+
+def _init_worker(adjacency):
+    global _worker_adjacency
+    _worker_adjacency = adjacency
+
+
+def _rows(sources, targets):
+    rows = np.full((len(sources), len(targets)), np.inf)
+    for i, source in enumerate(sources):
+        dist = dijkstra(_worker_adjacency, source, targets)
+        rows[i] = [dist.get(target, np.inf) for target in targets]
+    return rows
+
+
+def travel_time_matrix(graph, nodes, workers=1, chunk=16):
+    """Shortest times (minutes) between every pair of ``nodes``, one Dijkstra per source.
+
+    Sources are split into chunks and spread over a process pool; each worker
+    receives the adjacency once through its initializer.
+    """
+    nodes = [int(node) for node in nodes]
+    adjacency = graph.adjacency()
+    chunks = [nodes[i:i + chunk] for i in range(0, len(nodes), chunk)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(adjacency,)) as pool:
+            parts = list(pool.map(_rows, chunks, [nodes] * len(chunks)))
+    else:
+        _init_worker(adjacency)
+        parts = [_rows(sources, nodes) for sources in chunks]
+    return np.vstack(parts) if parts else np.zeros((0, 0))
+
+
+def minutes_to_uint16(minutes):
+    """Round to whole minutes; unreachable pairs become ``UNREACHABLE_MINUTES``."""
+    minutes = np.asarray(minutes, dtype=np.float64)
+    out = np.full(minutes.shape, UNREACHABLE_MINUTES, dtype=np.uint16)
+    finite = np.isfinite(minutes)
+    out[finite] = np.minimum(np.rint(minutes[finite]), UNREACHABLE_MINUTES - 1)
+    return out
+
+
+class ContractionHierarchy:
+    """Node ranks plus the upward graph: every edge and shortcut stored at its lower-ranked end.
+
+    ``middle`` is the contracted node a shortcut bypasses (``NO_MIDDLE`` for
+    original links), enough to unpack a query result into a node path.
+    """
+
+    def __init__(self, rank, up_start, up_count, target, minutes, middle):
+        self.rank = rank
+        self.up_start = up_start
+        self.up_count = up_count
+        self.target = target
+        self.minutes = minutes
+        self.middle = middle
+
+    def __len__(self):
+        return len(self.rank)
+
+    def _upward(self, source):
+        start = int(self.up_start[source])
+        end = start + int(self.up_count[source])
+        return zip(self.target[start:end].tolist(), self.minutes[start:end].tolist())
+
+    def query(self, source, target):
+        """Bidirectional upward Dijkstra; returns minutes or ``inf``."""
+        if source == target:
+            return 0.0
+        dist = ({source: 0.0}, {target: 0.0})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best = float("inf")
+        while heaps[0] or heaps[1]:
+            for side in (0, 1):
+                heap = heaps[side]
+                if not heap:
+                    continue
+                d, node = heapq.heappop(heap)
+                if d > dist[side].get(node, float("inf")):
+                    continue
+                if d >= best:
+                    heap.clear()
+                    continue
+                other = dist[1 - side].get(node)
+                if other is not None:
+                    best = min(best, d + other)
+                for nxt, w in self._upward(node):
+                    alt = d + w
+                    if alt < dist[side].get(nxt, float("inf")):
+                        dist[side][nxt] = alt
+                        heapq.heappush(heap, (alt, nxt))
+        return best
+
+
+def _witness_search(adj, source, skip, limit, targets):
+    """Bounded Dijkstra from ``source`` that avoids ``skip``.
+
+    Returns every distance it reached; unsettled ones are still lengths of
+    real paths, so they are safe upper bounds for witness checks.
+    """
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    remaining = set(targets)
+    while heap and settled < WITNESS_SETTLE_LIMIT and remaining:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        if d > limit:
+            break
+        settled += 1
+        remaining.discard(node)
+        for other, w in adj[node].items():
+            if other == skip:
+                continue
+            alt = d + w
+            if alt < dist.get(other, float("inf")):
+                dist[other] = alt
+                heapq.heappush(heap, (alt, other))
+    return dist
+
+
+def _shortcuts(adj, node):
+    """Shortcuts needed to contract ``node``, as ``[(u, v, minutes), ...]``."""
+    neighbours = list(adj[node].items())
+    needed = []
+    for i, (u, wu) in enumerate(neighbours):
+        later = neighbours[i + 1:]
+        if not later:
+            continue
+        limit = wu + max(w for _, w in later)
+        dist = _witness_search(adj, u, node, limit, [v for v, _ in later])
+        for v, wv in later:
+            via = wu + wv
+            if dist.get(v, float("inf")) > via:
+                needed.append((u, v, via))
+    return needed
+
+
+def build_contraction_hierarchy(graph):
+    """Contract nodes in lazy edge-difference order and return the hierarchy."""
+    n = graph.node_count
+    adj = [dict(edges) for edges in graph.adjacency()]
+    middle_of = {}
+    rank = np.zeros(n, dtype=np.int64)
+    deleted_neighbours = [0] * n
+    starts = []
+    counts = []
+    targets = []
+    minutes_out = []
+    middles = []
+
+    def priority(node):
+        return len(_shortcuts(adj, node)) - len(adj[node]) + deleted_neighbours[node]
+
+    heap = [(priority(node), node) for node in range(n)]
+    heapq.heapify(heap)
+    order = []
+    upward = [None] * n
+    while heap:
+        _, node = heapq.heappop(heap)
+        current = priority(node)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, node))
+            continue
+        for u, v, minutes in _shortcuts(adj, node):
+            if minutes < adj[u].get(v, float("inf")):
+                adj[u][v] = minutes
+                adj[v][u] = minutes
+                middle_of[(u, v) if u < v else (v, u)] = node
+        # Every neighbour still in the graph ranks above ``node``.
+        upward[node] = sorted(adj[node].items())
+        for other in adj[node]:
+            del adj[other][node]
+            deleted_neighbours[other] += 1
+        adj[node] = {}
+        rank[node] = len(order)
+        order.append(node)
+
+    for node in range(n):
+        starts.append(len(targets))
+        counts.append(len(upward[node]))
+        for other, minutes in upward[node]:
+            targets.append(other)
+            minutes_out.append(minutes)
+            middles.append(middle_of.get((node, other) if node < other else (other, node), NO_MIDDLE))
+    return ContractionHierarchy(
+        rank,
+        np.asarray(starts, dtype=np.int64),
+        np.asarray(counts, dtype=np.int64),
+        np.asarray(targets, dtype=np.int64),
+        np.asarray(minutes_out, dtype=np.float64),
+        np.asarray(middles, dtype=np.int64),
+    )
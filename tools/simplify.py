@@ -0,0 +1,99 @@
+"""Vectorised Douglas–Peucker simplification over many polylines at once.
+
+Each pass handles every open segment of every line together: it measures
+all interior points against their segment, finds each segment's farthest
+point with ``reduceat`` and splits the segments that exceed the tolerance.
+The number of passes is the recursion depth, not the number of lines.
+The first and last vertex of every line are always kept.
+"""
+
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Map pixel size is computed at Spain's mid-latitude.
+REFERENCE_LAT = 40.0
+
+
+def pixel_km(zoom, lat=REFERENCE_LAT):
+    """Ground size of one 256-px web-mercator tile pixel at ``zoom``."""
+    return 2 * math.pi * EARTH_RADIUS_KM * math.cos(math.radians(lat)) / (256 * 2 ** zoom)
+
+
+def project_km(lat, lon):
+    """Local equirectangular projection (each point scaled by its own latitude), in km."""
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+    return lam * np.cos(phi) * EARTH_RADIUS_KM, phi * EARTH_RADIUS_KM
+
+
+def _interior(seg_start, seg_end):
+    """Indices strictly inside every ``(start, end)`` segment, and their segment number."""
+    counts = seg_end - seg_start - 1
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(len(seg_start)), counts)
+    first = np.cumsum(counts) - counts
+    idx = np.arange(total, dtype=np.int64) - np.repeat(first, counts) + seg_start[owner] + 1
+    return idx, owner, first
+
+
+def simplify_mask(x, y, offsets, tolerance):
+    """Boolean mask of the vertices Douglas–Peucker keeps for each line.
+
+    ``x``/``y`` hold the points of every line back to back in a planar
+    projection, and ``offsets`` (length ``n_lines + 1``) delimits the lines.
+    Distances are measured to the segment, not the infinite line, so closed
+    loops simplify correctly.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    keep = np.zeros(len(x), dtype=bool)
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+    lines = ends >= starts
+    keep[starts[lines]] = True
+    keep[ends[lines]] = True
+    open_ = ends - starts >= 2
+    seg_start = starts[open_]
+    seg_end = ends[open_]
+    while len(seg_start):
+        idx, owner, first = _interior(seg_start, seg_end)
+        ax = x[seg_start][owner]
+        ay = y[seg_start][owner]
+        dx = x[seg_end][owner] - ax
+        dy = y[seg_end][owner] - ay
+        px = x[idx] - ax
+        py = y[idx] - ay
+        length2 = dx * dx + dy * dy
+        t = np.divide(px * dx + py * dy, length2, out=np.zeros_like(length2), where=length2 > 0)
+        np.clip(t, 0.0, 1.0, out=t)
+        dist = np.hypot(px - t * dx, py - t * dy)
+
+        farthest = np.maximum.reduceat(dist, first)
+        # First interior point reaching its segment's maximum becomes the pivot.
+        hits = np.flatnonzero(dist == farthest[owner])
+        hit_owner, first_hit = np.unique(owner[hits], return_index=True)
+        pivot = np.empty(len(seg_start), dtype=np.int64)
+        pivot[hit_owner] = idx[hits[first_hit]]
+        split = farthest > tolerance
+        pivot = pivot[split]
+        keep[pivot] = True
+
+        left_start, left_end = seg_start[split], pivot
+        right_start, right_end = pivot, seg_end[split]
+        seg_start = np.concatenate((left_start, right_start))
+        seg_end = np.concatenate((left_end, right_end))
+        still_open = seg_end - seg_start >= 2
+        seg_start = seg_start[still_open]
+        seg_end = seg_end[still_open]
+    return keep
+
+
+def simplify_offsets(keep, offsets):
+    """Offsets of the simplified lines once ``keep`` has been applied to the points."""
+    kept_before = np.concatenate(([0], np.cumsum(keep, dtype=np.int64)))
+    return kept_before[np.asarray(offsets, dtype=np.int64)]
@@ -0,0 +1,62 @@
+"""Regression tests for the streaming GeoJSON reader every build tool loads its inputs with.
+
+Run with ``python -m unittest discover -s tools/tests`` (``npm run test:tools``).
+"""
+
+import io
+import json
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from geojson_stream import iter_features  # noqa: E402
+
+CHUNK_SIZES = (1, 2, 3, 7)
+
+FEATURES = [
+    {"type": "Feature", "properties": {"name": "a", "area": 12.5, "n": -3}, "geometry": {
+        "type": "LineString", "coordinates": [[-3.70379, 40.41678], [2.5e-3, -1.25E+2]]}},
+    {"type": "Feature", "properties": {"name": "b", "ok": True, "none": None}, "geometry": {
+        "type": "Point", "coordinates": [0.5, 41]}},
+]
+
+
+def collection():
+    # Top-level numeric members before and after "features" are the ones a chunk boundary used to break.
+    return (
+        '{"type":"FeatureCollection","totalArea":12.5,"scale":1e5,"offset":-0.25,"count":10,'
+        f'"features":{json.dumps(FEATURES)},"ratio":3.75E-2,"version":2}}'
+    )
+
+
+def sequence():
+    records = [dict(feature, weight=1.5 + i, exp=-2e-3) for i, feature in enumerate(FEATURES)]
+    return "".join(f"\x1e{json.dumps(record)}\n" for record in records), records
+
+
+class IterFeaturesTest(unittest.TestCase):
+    def assertEveryCut(self, doc, expected):
+        # Shifting the input by 0..size-1 characters puts a chunk boundary at every offset.
+        for size in CHUNK_SIZES:
+            for shift in range(size):
+                with self.subTest(chunk_size=size, shift=shift):
+                    features = list(iter_features(io.StringIO(" " * shift + doc), size))
+                    self.assertEqual(features, expected)
+
+    def test_feature_collection_at_every_cut(self):
+        self.assertEveryCut(collection(), FEATURES)
+
+    def test_geojsonseq_at_every_cut(self):
+        doc, records = sequence()
+        self.assertEveryCut(doc, records)
+
+    def test_chunk_ending_after_decimal_point(self):
+        doc = collection()
+        cut = doc.index("12.") + 3
+        self.assertEqual(list(iter_features(io.StringIO(doc), cut)), FEATURES)
+
+
+if __name__ == "__main__":
+    unittest.main()
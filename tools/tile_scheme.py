@@ -0,0 +1,22 @@
+"""Python mirror of the `tile-{zoom}-{x}-{y}` scheme in tools/tile_scheme.js."""
+
+import math
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def lat_lon_to_tile(lat, lon, zoom):
+    zoom = _clamp(int(round(zoom)), 0, 24)
+    lat_rad = math.radians(_clamp(lat, -85, 85))
+    n = 2 ** zoom
+    x = math.floor((lon + 180) / 360 * n)
+    y = math.floor((1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2 * n)
+    return zoom, _clamp(x, 0, n - 1), _clamp(y, 0, n - 1)
+
+
+def format_tile_id(tile):
+    z, x, y = tile
+    return f"tile-{z}-{x}-{y}"
+
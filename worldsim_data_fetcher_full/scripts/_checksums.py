@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+CHECKSUM_CACHE_NAME = ".sha256_cache.json"
+
+
+def hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ChecksumCache:
+    """sha256 digests keyed by path and the file's (size, mtime_ns, inode), so an unchanged file is hashed once.
+
+    With a ``path`` the cache is loaded from and saved to that JSON file,
+    which lets it outlive a run; otherwise it only lives in memory.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self.entries: Dict[str, list] = {}
+        self.lock = threading.Lock()
+        if path is not None and path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                self.entries = {}
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        return str(path.resolve())
+
+    @staticmethod
+    def _stamp(path: Path) -> list:
+        st = path.stat()
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def get(self, path: Path) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(self._key(path))
+        if entry is None or entry[:3] != self._stamp(path):
+            return None
+        return entry[3]
+
+    def put(self, path: Path, digest: str) -> None:
+        entry = self._stamp(path) + [digest]
+        with self.lock:
+            self.entries[self._key(path)] = entry
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self.lock:
+            entries = {k: v for k, v in sorted(self.entries.items()) if os.path.exists(k)}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(entries, indent=1) + "\n", encoding="utf-8")
+        tmp.replace(self.path)
+
+
+_active = ChecksumCache()
+
+
+def active_checksums() -> ChecksumCache:
+    """The cache installed by ``run_all`` (an in-memory one otherwise)."""
+    return _active
+
+
+def set_checksums(cache: ChecksumCache) -> None:
+    global _active
+    _active = cache
+
+
+def read_checksums(path: Path) -> Dict[str, str]:
+    """Parse a ``sha256sum``-style file into ``{relative path: digest}``; a later line for a path wins."""
+    entries: Dict[str, str] = {}
+    if not path.exists():
+        return entries
+    for line in path.read_text(encoding="utf-8").splitlines():
+        digest, sep, name = line.partition("  ")
+        if sep and name:
+            entries[name] = digest
+    return entries
+
+
+def write_checksums(path: Path, entries: Dict[str, str]) -> None:
+    """Rewrite ``path`` atomically with one line per file, sorted by path."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text("".join(f"{entries[name]}  {name}\n" for name in sorted(entries)), encoding="utf-8")
+    tmp.replace(path)
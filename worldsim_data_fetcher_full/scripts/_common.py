@@ -4,51 +4,453 @@ import hashlib
 import json
 import platform
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
 
 import requests
+import requests.adapters
 from tqdm import tqdm
 
+from ._checksums import active_checksums, hash_file
+from ._http_cache import CacheMiss, ResponseCache
+from ._scheduler import active_scheduler
+from ._store import active_store
+
 USER_AGENT = "worldsim-data-fetcher/0.2 (+https://example.invalid)"
 
+T = TypeVar("T")
+R = TypeVar("R")
+
+_append_lock = threading.Lock()
+
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 def sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+    """The file's sha256, read from the checksum cache while the file is unchanged."""
+    cache = active_checksums()
+    digest = cache.get(path)
+    if digest is None:
+        digest = hash_file(path)
+        cache.put(path, digest)
+    return digest
+
+def write_hashed(path: Path, data: str | bytes) -> str:
+    """Write ``data`` (str as UTF-8) to ``path`` and record its sha256 without reading the file back."""
+    raw = data.encode("utf-8") if isinstance(data, str) else data
+    digest = hashlib.sha256(raw).hexdigest()
+    ensure_dir(path.parent)
+    # Replace rather than overwrite: the old file may be a hardlink into the object store.
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(raw)
+    tmp.replace(path)
+    active_checksums().put(path, digest)
+    return digest
+
+def store_file(path: Path) -> str:
+    """Move ``path`` into the active object store (if any) and return its sha256."""
+    digest = sha256_file(path)
+    store = active_store()
+    if store is not None:
+        store.ingest(path, digest)
+        active_checksums().put(path, digest)
+    return digest
 
 def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
-def http_get_stream(url: str, out_path: Path, *, timeout: int = 120) -> None:
-    headers = {"User-Agent": USER_AGENT}
-    with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often and how patiently a request is retried after a connection error or a retryable status."""
+    attempts: int = 3
+    backoff_seconds: float = 1.0
+    max_backoff_seconds: float = 30.0
+    statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.strip().isdigit():
+            return min(float(retry_after), self.max_backoff_seconds)
+        return min(self.backoff_seconds * 2 ** (attempt - 1), self.max_backoff_seconds)
+
+_http_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_pool_size = 16
+_retry = RetryPolicy()
+_cache: Optional[ResponseCache] = None
+_range_parts = 1
+_range_min_bytes = 256 * 1024 * 1024
+
+def configure_http(cfg: Dict[str, Any], *, replay: bool = False) -> None:
+    """Apply the ``http`` config section: pool size, retry policy and the optional response cache.
+
+    ``replay`` serves every request from the cache and fails on a miss
+    instead of going to the network.
+    """
+    global _session, _pool_size, _retry, _cache, _range_parts, _range_min_bytes
+    retry = cfg.get("retry") or {}
+    cache = cfg.get("cache") or {}
+    with _http_lock:
+        _pool_size = int(cfg.get("pool_size", 16))
+        _range_parts = max(1, int(cfg.get("range_parts", 1)))
+        _range_min_bytes = int(float(cfg.get("range_min_mb", 256)) * 1024 * 1024)
+        _retry = RetryPolicy(
+            attempts=int(retry.get("attempts", 3)),
+            backoff_seconds=float(retry.get("backoff_seconds", 1.0)),
+            max_backoff_seconds=float(retry.get("max_backoff_seconds", 30.0)),
+            statuses=tuple(retry.get("statuses", RetryPolicy.statuses)),
+        )
+        _cache = None
+        if cache.get("dir") or replay:
+            if not cache.get("dir"):
+                raise ValueError("http.cache.dir must be set for replay mode")
+            _cache = ResponseCache(
+                Path(cache["dir"]),
+                ttl_seconds=float(cache.get("ttl_hours", 24)) * 3600,
+                max_body_bytes=int(float(cache.get("max_body_mb", 64)) * 1024 * 1024),
+                replay=replay,
+            )
+        if _session is not None:
+            _session.close()
+        _session = None
+
+def http_session() -> requests.Session:
+    """The process-wide keep-alive session, created on first use and shared by every thread."""
+    global _session
+    with _http_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["User-Agent"] = USER_AGENT
+            adapter = requests.adapters.HTTPAdapter(pool_connections=_pool_size, pool_maxsize=_pool_size)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def _send(
+    method: str,
+    url: str,
+    *,
+    stream: bool = False,
+    timeout: int = 120,
+    attempts: Optional[int] = None,
+    use_cache: bool = True,
+    **kwargs: Any,
+) -> requests.Response:
+    """Send through the shared session and cache, retrying by the configured policy.
+
+    The last response is returned even when its status is an error, as
+    ``requests`` would; only connection errors and timeouts raise.
+    """
+    session = http_session()
+    prepared = session.prepare_request(requests.Request(method, url, **kwargs))
+    cache = _cache if use_cache or (_cache is not None and _cache.replay) else None
+    entry = cache.lookup(prepared) if cache is not None else None
+    if entry is not None and cache.fresh(entry):
+        return cache.response(prepared, entry)
+    if cache is not None and cache.replay:
+        raise CacheMiss(f"Not in the HTTP cache (replay mode): {method} {prepared.url}", request=prepared)
+    if entry is not None:
+        prepared.headers.update(cache.validators(entry))
+
+    policy = _retry
+    attempts = max(1, policy.attempts if attempts is None else attempts)
+    for attempt in range(1, attempts + 1):
+        try:
+            r = session.send(prepared, stream=stream, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == attempts:
+                raise
+            wait = policy.delay(attempt)
+        else:
+            if r.status_code not in policy.statuses or attempt == attempts:
+                break
+            wait = policy.delay(attempt, r.headers.get("Retry-After"))
+            r.close()
+        time.sleep(wait)
+
+    if entry is not None and r.status_code == 304:
+        r.close()
+        cache.renew(entry)
+        return cache.response(prepared, entry)
+    if cache is not None and not stream:
+        cache.store(prepared, r)
+    return r
+
+class _Interrupted(requests.ConnectionError):
+    """A streamed transfer broke off after its response began; retrying resumes from the ``.part`` file."""
+
+def _stream_state_path(out_path: Path) -> Path:
+    return out_path.with_name(out_path.name + ".http.json")
+
+def _read_stream_state(path: Path, url: str) -> Dict[str, Any]:
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) and state.get("url") == url else {}
+
+def _write_stream_state(path: Path, state: Dict[str, Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2) + "\n", encoding="utf-8")
+    tmp.replace(path)
+
+def _if_range(state: Dict[str, Any]) -> Optional[str]:
+    """A validator usable in If-Range: a strong ETag, else Last-Modified."""
+    etag = state.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return state.get("last_modified")
+
+def _response_state(url: str, r: requests.Response, **extra: Any) -> Dict[str, Any]:
+    return {"url": url, "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"), **extra}
+
+def _stream_once(
+    url: str,
+    out_path: Path,
+    tmp: Path,
+    state_path: Path,
+    headers: Dict[str, str],
+    timeout: int,
+    attempts: Optional[int] = None,
+) -> bool:
+    scheduler = active_scheduler()
+    state = _read_stream_state(state_path, url)
+    offset = 0
+    if tmp.exists() and state.get("partial") and not state.get("ranges") and _if_range(state):
+        offset = tmp.stat().st_size
+    if offset:
+        headers = dict(headers, Range=f"bytes={offset}-")
+        headers["If-Range"] = _if_range(state)  # type: ignore[assignment]
+    with scheduler.limiter.slot(url), _send(
+        "GET", url, stream=True, timeout=timeout, attempts=attempts, headers=headers, use_cache=not headers
+    ) as r:
+        if r.status_code == 304:
+            return False
+        if r.status_code == 416:
+            # The partial file is not a prefix of the current remote file; start over.
+            tmp.unlink()
+            raise _Interrupted(f"Range not satisfiable, restarting: {url}", response=r)
         r.raise_for_status()
-        total = int(r.headers.get("Content-Length", "0") or 0)
+        if r.status_code == 206:
+            if not r.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                tmp.unlink()
+                raise _Interrupted(f"Unexpected Content-Range from {url}", response=r)
+        else:
+            offset = 0
         ensure_dir(out_path.parent)
-        tmp = out_path.with_suffix(out_path.suffix + ".part")
-        with tmp.open("wb") as f, tqdm(total=total, unit="B", unit_scale=True, desc=out_path.name) as bar:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if not chunk:
-                    continue
-                f.write(chunk)
-                bar.update(len(chunk))
+        _write_stream_state(state_path, _response_state(url, r, partial=True))
+        total = offset + int(r.headers.get("Content-Length", "0") or 0)
+        # Hash while writing; a resumed file's existing prefix is hashed first.
+        h = hashlib.sha256()
+        if offset:
+            with tmp.open("rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+        with tmp.open("ab" if offset else "wb") as f, tqdm(
+            total=total, initial=offset, unit="B", unit_scale=True, desc=out_path.name
+        ) as bar:
+            try:
+                for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    h.update(chunk)
+                    bar.update(len(chunk))
+                    scheduler.budget.consume(len(chunk))
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as exc:
+                raise _Interrupted(f"Transfer of {url} interrupted: {exc}") from exc
+        if _cache is not None and r.status_code == 200 and not getattr(r, "from_cache", False):
+            _cache.store(r.request, r, tmp)
         tmp.replace(out_path)
+        active_checksums().put(out_path, h.hexdigest())
+        _write_stream_state(state_path, _response_state(url, r))
+    return True
+
+def _stream_ranges(
+    url: str,
+    out_path: Path,
+    tmp: Path,
+    state_path: Path,
+    head: requests.Response,
+    timeout: int,
+    attempts: Optional[int] = None,
+) -> None:
+    """Fetch one file as ``_range_parts`` concurrent byte ranges, keeping finished ranges across restarts."""
+    scheduler = active_scheduler()
+    size = int(head.headers["Content-Length"])
+    fresh = _response_state(url, head, size=size)
+    state = _read_stream_state(state_path, url)
+    same_file = all(state.get(k) == fresh[k] for k in ("etag", "last_modified", "size"))
+    if tmp.exists() and state.get("ranges") and same_file:
+        ranges, done = state["ranges"], set(state.get("done", []))
+    else:
+        # Several ranges per worker, so an interruption loses little finished work.
+        step = max(1024 * 1024, -(-size // (_range_parts * 4)))
+        ranges, done = [[start, min(start + step, size) - 1] for start in range(0, size, step)], set()
+        ensure_dir(out_path.parent)
+        with tmp.open("wb") as f:
+            f.truncate(size)
+    validator = _if_range(fresh)
+    lock = threading.Lock()
+
+    def save() -> None:
+        _write_stream_state(state_path, dict(fresh, partial=True, ranges=ranges, done=sorted(done)))
+
+    def fetch(i: int) -> None:
+        start, end = ranges[i]
+        headers = {"Range": f"bytes={start}-{end}", "If-Range": validator}
+        with scheduler.limiter.slot(url), _send(
+            "GET", url, stream=True, timeout=timeout, attempts=attempts, headers=headers, use_cache=False
+        ) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise _Interrupted(f"{url} changed or ignored the byte range", response=r)
+            with tmp.open("r+b") as f:
+                f.seek(start)
+                try:
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+                        with lock:
+                            bar.update(len(chunk))
+                        scheduler.budget.consume(len(chunk))
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as exc:
+                    raise _Interrupted(f"Transfer of {url} interrupted: {exc}") from exc
+        with lock:
+            done.add(i)
+            save()
+
+    save()
+    todo = [i for i in range(len(ranges)) if i not in done]
+    finished = sum(ranges[i][1] - ranges[i][0] + 1 for i in done)
+    with tqdm(total=size, initial=finished, unit="B", unit_scale=True, desc=out_path.name) as bar, ThreadPoolExecutor(
+        _range_parts, thread_name_prefix="fetch-range"
+    ) as pool:
+        list(pool.map(fetch, todo))
+    tmp.replace(out_path)
+    _write_stream_state(state_path, fresh)
+
+def _download(
+    url: str,
+    out_path: Path,
+    tmp: Path,
+    state_path: Path,
+    headers: Dict[str, str],
+    timeout: int,
+    *,
+    ranges: bool,
+    attempts: Optional[int] = None,
+) -> bool:
+    if ranges:
+        with active_scheduler().limiter.slot(url):
+            head = _send("HEAD", url, timeout=timeout, attempts=attempts, headers=headers, use_cache=False)
+        if head.status_code == 304:
+            return False
+        if (
+            head.status_code == 200
+            and head.headers.get("Accept-Ranges", "").lower() == "bytes"
+            and int(head.headers.get("Content-Length", "0") or 0) >= _range_min_bytes
+            and _if_range(_response_state(url, head))
+        ):
+            _stream_ranges(url, out_path, tmp, state_path, head, timeout, attempts)
+            return True
+    return _stream_once(url, out_path, tmp, state_path, headers, timeout, attempts)
+
+def http_get_stream(
+    url: str,
+    out_path: Path,
+    *,
+    timeout: int = 120,
+    conditional: bool = True,
+    attempts: Optional[int] = None,
+) -> bool:
+    """Download ``url`` to ``out_path`` via a ``.part`` file; returns False if the file was left unchanged.
+
+    The response's ETag / Last-Modified go to a ``<name>.http.json``
+    sidecar. With ``conditional``, an existing file is only fetched again
+    when the server reports a change. A transfer that breaks off mid-body
+    resumes from the ``.part`` file with a Range request, up to the retry
+    count; failures before a response arrives are only retried inside
+    ``_send``. Files of at least ``http.range_min_mb`` are fetched as
+    ``http.range_parts`` parallel byte ranges when the server allows it.
+    In replay mode an existing file is kept as is. ``attempts`` overrides
+    the configured retry count.
+    """
+    tmp = out_path.with_suffix(out_path.suffix + ".part")
+    state_path = _stream_state_path(out_path)
+    store = active_store()
+    if store is not None and not out_path.exists() and not tmp.exists():
+        # Start from the blob an earlier dataset version got from this URL; the
+        # conditional request below then only downloads it again if it changed.
+        ref = store.lookup_url(url)
+        if ref is not None and store.checkout(ref["sha256"], out_path):
+            active_checksums().put(out_path, ref["sha256"])
+            _write_stream_state(state_path, {"url": url, "etag": ref["etag"], "last_modified": ref["last_modified"]})
+    if _cache is not None and _cache.replay and out_path.exists():
+        return False
+    headers: Dict[str, str] = {}
+    state = _read_stream_state(state_path, url)
+    if conditional and out_path.exists() and not state.get("partial"):
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    replay = _cache is not None and _cache.replay
+    ranges = _range_parts > 1 and not replay
+    attempt = 1
+    while True:
+        try:
+            changed = _download(url, out_path, tmp, state_path, headers, timeout, ranges=ranges, attempts=attempts)
+            break
+        except _Interrupted:
+            # Only transfers that broke off mid-body: connection failures were already retried by _send.
+            if attempt >= (_retry.attempts if attempts is None else attempts) or replay:
+                raise
+            time.sleep(_retry.delay(attempt))
+            attempt += 1
+    if store is not None:
+        digest = store_file(out_path)
+        state = _read_stream_state(state_path, url)
+        store.record_url(url, state.get("etag"), state.get("last_modified"), digest)
+    return changed
+
+def http_request(method: str, url: str, *, timeout: int = 120, **kwargs: Any) -> requests.Response:
+    """A whole (non-streamed) request through the shared session, retry policy and cache.
+
+    Holds a per-host slot and is charged to the bandwidth budget;
+    ``attempts`` overrides the configured retry count.
+    """
+    scheduler = active_scheduler()
+    with scheduler.limiter.slot(url):
+        r = _send(method, url, timeout=timeout, **kwargs)
+        content = r.content
+        r.close()
+    scheduler.budget.consume(len(content))
+    return r
+
+def http_get(url: str, **kwargs: Any) -> requests.Response:
+    return http_request("GET", url, **kwargs)
+
+def http_post(url: str, **kwargs: Any) -> requests.Response:
+    return http_request("POST", url, **kwargs)
+
+def map_items(fn: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+    """Fetch ``items`` through the active scheduler; results come back in input order."""
+    return active_scheduler().map_items(fn, items)
 
 def write_json(path: Path, obj: Any) -> None:
     ensure_dir(path.parent)
-    path.write_text(json.dumps(obj, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(obj, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    tmp.replace(path)
 
 def append_text(path: Path, text: str) -> None:
     ensure_dir(path.parent)
-    with path.open("a", encoding="utf-8") as f:
+    with _append_lock, path.open("a", encoding="utf-8") as f:
         f.write(text)
 
 def tool_env() -> Dict[str, Any]:
@@ -62,14 +464,17 @@ def tool_env() -> Dict[str, Any]:
 class DatasetContext:
     dataset_version: str
     out_root: Path
+    # When set, sources.json and checksums.sha256 are written here instead of out_root;
+    # run_all gives every concurrently running module its own and merges them in order.
+    log_root: Optional[Path] = None
 
     @property
     def sources_path(self) -> Path:
-        return self.out_root / "sources.json"
+        return (self.log_root or self.out_root) / "sources.json"
 
     @property
     def checksums_path(self) -> Path:
-        return self.out_root / "checksums.sha256"
+        return (self.log_root or self.out_root) / "checksums.sha256"
 
     @property
     def manifest_path(self) -> Path:
@@ -79,11 +484,15 @@ def load_yaml(path: Path) -> Dict[str, Any]:
     import yaml
     return yaml.safe_load(path.read_text(encoding="utf-8"))
 
-def save_manifest(ctx: DatasetContext, files: Iterable[Path]) -> None:
+def save_manifest(ctx: DatasetContext, files: Iterable[Path], objects: Optional[Dict[str, str]] = None) -> None:
+    """Write manifest.json; ``objects`` maps stored files to their blob digests (kept alive by ``store gc``)."""
     rel_files = [str(p.relative_to(ctx.out_root)) for p in files if p.exists()]
-    write_json(ctx.manifest_path, {
+    manifest = {
         "datasetVersion": ctx.dataset_version,
         "createdAtUtc": utc_now_iso(),
         "toolEnv": tool_env(),
         "files": sorted(set(rel_files)),
-    })
+    }
+    if objects:
+        manifest["objects"] = dict(sorted(objects.items()))
+    write_json(ctx.manifest_path, manifest)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class CacheMiss(requests.ConnectionError):
+    """Replay mode was asked for a response the cache does not hold."""
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    meta_path: Path
+    body_path: Path
+    meta: Dict[str, Any]
+
+
+class ResponseCache:
+    """On-disk store of successful responses, keyed by method, URL and request body.
+
+    An entry younger than ``ttl_seconds`` is served without touching the
+    network; an older one is revalidated with ``If-None-Match`` /
+    ``If-Modified-Since`` when the server sent an ETag or Last-Modified, and
+    a 304 answer renews it. In ``replay`` mode every entry is served
+    regardless of age and a miss raises ``CacheMiss``, so a whole run can be
+    repeated offline. Bodies above ``max_body_bytes`` are not stored.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        ttl_seconds: float = 0,
+        max_body_bytes: int = 64 * 1024 * 1024,
+        replay: bool = False,
+    ) -> None:
+        self.root = root
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_body_bytes = int(max_body_bytes)
+        self.replay = replay
+        self.lock = threading.Lock()
+
+    def _paths(self, prepared: requests.PreparedRequest) -> CacheEntry:
+        h = hashlib.sha256(f"{prepared.method} {prepared.url}\n".encode("utf-8"))
+        body = prepared.body or b""
+        h.update(body.encode("utf-8") if isinstance(body, str) else body)
+        key = h.hexdigest()
+        base = self.root / key[:2] / key
+        return CacheEntry(base.with_suffix(".json"), base.with_suffix(".body"), {})
+
+    def lookup(self, prepared: requests.PreparedRequest) -> Optional[CacheEntry]:
+        paths = self._paths(prepared)
+        try:
+            meta = json.loads(paths.meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not paths.body_path.exists():
+            return None
+        return CacheEntry(paths.meta_path, paths.body_path, meta)
+
+    def fresh(self, entry: CacheEntry) -> bool:
+        return self.replay or time.time() - float(entry.meta.get("storedAt", 0)) < self.ttl_seconds
+
+    def validators(self, entry: CacheEntry) -> Dict[str, str]:
+        headers = entry.meta.get("headers", {})
+        out: Dict[str, str] = {}
+        if headers.get("ETag"):
+            out["If-None-Match"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            out["If-Modified-Since"] = headers["Last-Modified"]
+        return out
+
+    def renew(self, entry: CacheEntry) -> None:
+        self._write_meta(entry.meta_path, dict(entry.meta, storedAt=time.time()))
+
+    def response(self, prepared: requests.PreparedRequest, entry: CacheEntry) -> requests.Response:
+        """Rebuild a ``requests.Response`` whose body streams from the cached file."""
+        r = requests.Response()
+        r.status_code = int(entry.meta.get("status", 200))
+        r.headers = CaseInsensitiveDict(entry.meta.get("headers", {}))
+        r.headers["Content-Length"] = str(entry.body_path.stat().st_size)
+        r.url = entry.meta.get("url", prepared.url)
+        r.encoding = entry.meta.get("encoding")
+        r.request = prepared
+        r.reason = "OK"
+        r.raw = entry.body_path.open("rb")
+        r.from_cache = True  # type: ignore[attr-defined]
+        return r
+
+    def store(self, prepared: requests.PreparedRequest, r: requests.Response, body: Optional[Path] = None) -> None:
+        """Record a 200 response; its body is ``r.content``, or the file at ``body`` for streamed downloads."""
+        if self.replay or r.status_code != 200:
+            return
+        size = body.stat().st_size if body is not None else len(r.content)
+        if size > self.max_body_bytes:
+            return
+        paths = self._paths(prepared)
+        paths.body_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = paths.body_path.with_name(f"{paths.body_path.name}.{threading.get_ident()}.tmp")
+        if body is not None:
+            shutil.copyfile(body, tmp)
+        else:
+            tmp.write_bytes(r.content)
+        with self.lock:
+            os.replace(tmp, paths.body_path)
+            self._write_meta(paths.meta_path, {
+                "url": r.url,
+                "status": r.status_code,
+                "encoding": r.encoding,
+                "headers": {k: r.headers[k] for k in ("Content-Type", "ETag", "Last-Modified") if k in r.headers},
+                "storedAt": time.time(),
+            })
+
+    def _write_meta(self, path: Path, meta: Dict[str, Any]) -> None:
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+import re
+import shutil
+from pathlib import Path
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Sequence
+
+from ._common import ensure_dir, write_hashed
+
+INDEX_NAME = "index.json"
+UNKNOWN = "_unknown"
+
+_WHITESPACE = " \t\n\r"
+# Characters that can continue a JSON number; raw_decode stops before them when a chunk ends mid-number.
+_NUMBER_CHARS = "0123456789.eE+-"
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Just enough of a pull parser to walk a large JSON document one value at a time."""
+
+    def __init__(self, f: IO[str], chunk_chars: int) -> None:
+        self.f = f
+        self.chunk_chars = chunk_chars
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk_chars)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character ("" at the end of the file), without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def take(self, expected: str) -> None:
+        if self.peek() != expected:
+            raise ValueError(f"Expected {expected!r} at offset {self.pos} of the current chunk")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number that ends the buffer, or stops at ``1.`` / ``2e``, may continue in the next chunk.
+                number = isinstance(obj, (int, float)) and not isinstance(obj, bool)
+                if self.eof or (end < len(self.buf) and not (number and self.buf[end] in _NUMBER_CHARS)):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_json_records(path: Path, key: str = "data", chunk_chars: int = 1024 * 1024) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array, or of the array under ``key`` in a top-level object.
+
+    The file is read ``chunk_chars`` at a time and only one element is
+    decoded at once, so multi-gigabyte bulk responses parse in constant
+    memory. Other members of the top-level object are decoded and dropped.
+    """
+    with path.open("r", encoding="utf-8") as f:
+        reader = _Reader(f, chunk_chars)
+        first = reader.peek()
+        if first == "{":
+            reader.take("{")
+            while True:
+                if reader.peek() == "}":
+                    return
+                name = reader.value()
+                reader.take(":")
+                if name == key and reader.peek() == "[":
+                    break
+                reader.value()
+                if reader.peek() == ",":
+                    reader.take(",")
+        elif first != "[":
+            raise ValueError(f"{path}: expected a JSON array or object")
+        reader.take("[")
+        if reader.peek() == "]":
+            return
+        while True:
+            yield reader.value()
+            if reader.peek() == "]":
+                return
+            reader.take(",")
+
+
+def partition_key(record: Dict[str, Any], fields: Sequence[str]) -> str:
+    """The first non-empty value of ``fields`` in ``record``, or ``UNKNOWN``."""
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return UNKNOWN
+
+
+def _file_stem(partition: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", partition) or UNKNOWN
+
+
+class PartitionWriter:
+    """Split a stream of records into one columnar JSON file per partition, in bounded memory.
+
+    Rows are buffered and spilled to ``<out_dir>/.spill/<partition>.jsonl``
+    every ``flush_rows`` rows; ``finish`` then rewrites each spill file as
+    ``<out_dir>/<partition>.json`` of the form
+    ``{"partition", "rows", "columns": {name: [values]}}``, holding one
+    partition in memory at a time. ``out_dir`` is emptied first so a
+    rebuild never keeps partitions of an earlier run.
+    """
+
+    def __init__(self, out_dir: Path, flush_rows: int = 100_000) -> None:
+        self.out_dir = out_dir
+        self.spill_dir = out_dir / ".spill"
+        self.flush_rows = flush_rows
+        self.rows: Dict[str, int] = {}
+        self._buffers: Dict[str, List[str]] = {}
+        self._buffered = 0
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        ensure_dir(self.spill_dir)
+
+    def add(self, partition: str, record: Dict[str, Any]) -> None:
+        self._buffers.setdefault(partition, []).append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        self.rows[partition] = self.rows.get(partition, 0) + 1
+        self._buffered += 1
+        if self._buffered >= self.flush_rows:
+            self._spill()
+
+    def _spill(self) -> None:
+        for partition, lines in self._buffers.items():
+            with (self.spill_dir / f"{_file_stem(partition)}.jsonl").open("a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        self._buffers.clear()
+        self._buffered = 0
+
+    def finish(self) -> Dict[str, Path]:
+        """Write every partition file; returns ``{partition: path}`` in partition order."""
+        self._spill()
+        written: Dict[str, Path] = {}
+        for partition in sorted(self.rows):
+            columns: Dict[str, List[Any]] = {}
+            n = 0
+            with (self.spill_dir / f"{_file_stem(partition)}.jsonl").open("r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    for name in record:
+                        if name not in columns:
+                            columns[name] = [None] * n
+                    for name, column in columns.items():
+                        column.append(record.get(name))
+                    n += 1
+            path = self.out_dir / f"{_file_stem(partition)}.json"
+            doc = {"partition": partition, "rows": n, "columns": columns}
+            write_hashed(path, json.dumps(doc, ensure_ascii=False, separators=(",", ":")) + "\n")
+            written[partition] = path
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        return written
+
+
+def partition_pages(
+    pages: Iterable[Path], out_dir: Path, fields: Sequence[str], *, key: str = "data", flush_rows: int = 100_000
+) -> List[Path]:
+    """Stream the records of every page into ``out_dir`` partitioned by ``fields``, plus ``index.json``.
+
+    The index lists each partition's file and row count, so a loader can
+    pick the countries it needs without opening the others. Returns the
+    partition files followed by the index.
+    """
+    writer = PartitionWriter(out_dir, flush_rows=flush_rows)
+    names = []
+    for page in pages:
+        names.append(page.name)
+        for record in iter_json_records(page, key=key):
+            if isinstance(record, dict):
+                writer.add(partition_key(record, fields), record)
+    written = writer.finish()
+    index_path = out_dir / INDEX_NAME
+    write_hashed(index_path, json.dumps({
+        "partition_by": list(fields),
+        "pages": names,
+        "rows": sum(writer.rows.values()),
+        "partitions": {
+            partition: {"file": path.name, "rows": writer.rows[partition]} for partition, path in written.items()
+        },
+    }, ensure_ascii=False, indent=2) + "\n")
+    return list(written.values()) + [index_path]
+
+
+def load_partition(out_dir: Path, partition: str, columns: Optional[Iterable[str]] = None) -> Dict[str, List[Any]]:
+    """Columns of one partition written by ``partition_pages`` (all columns by default); empty if absent."""
+    index = json.loads((out_dir / INDEX_NAME).read_text(encoding="utf-8"))
+    entry = index["partitions"].get(partition)
+    if entry is None:
+        return {}
+    data = json.loads((out_dir / entry["file"]).read_text(encoding="utf-8"))["columns"]
+    return data if columns is None else {name: data[name] for name in columns if name in data}
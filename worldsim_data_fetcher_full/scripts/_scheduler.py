@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class BandwidthBudget:
+    """Token bucket shared by every download: ``bytes_per_sec`` on average, at most one second of burst.
+
+    Callers report bytes as they arrive; a caller that overdraws the bucket
+    sleeps off its share of the debt outside the lock, so concurrent
+    downloads split the budget between them.
+    """
+
+    def __init__(self, bytes_per_sec: float = 0) -> None:
+        self.rate = float(bytes_per_sec or 0)
+        self.tokens = self.rate
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n: int) -> None:
+        if self.rate <= 0 or n <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """At most ``per_host`` requests in flight to any one host (``hosts`` overrides per host name)."""
+
+    def __init__(self, per_host: int = 0, hosts: Optional[Dict[str, int]] = None) -> None:
+        self.per_host = int(per_host or 0)
+        self.hosts = {name.lower(): int(limit) for name, limit in (hosts or {}).items()}
+        self.semaphores: Dict[str, threading.Semaphore] = {}
+        self.lock = threading.Lock()
+
+    def _semaphore(self, host: str) -> Optional[threading.Semaphore]:
+        limit = self.hosts.get(host, self.per_host)
+        if limit <= 0:
+            return None
+        with self.lock:
+            sem = self.semaphores.get(host)
+            if sem is None:
+                sem = self.semaphores[host] = threading.Semaphore(limit)
+            return sem
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        sem = self._semaphore((urlsplit(url).hostname or "").lower())
+        if sem is None:
+            yield
+            return
+        with sem:
+            yield
+
+
+class Scheduler:
+    """Thread pools for whole modules and for the items inside them, plus the shared network limits.
+
+    Modules and items get separate pools so a module waiting on its items
+    never holds a worker its items need. Item functions must not call
+    ``map_items`` themselves.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        per_host: int = 0,
+        hosts: Optional[Dict[str, int]] = None,
+        max_bytes_per_sec: float = 0,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.limiter = HostLimiter(per_host, hosts)
+        self.budget = BandwidthBudget(max_bytes_per_sec)
+        self._items = ThreadPoolExecutor(self.workers, thread_name_prefix="fetch-item") if self.workers > 1 else None
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "Scheduler":
+        """Build from the ``scheduler`` config section (``workers``, ``per_host``, ``hosts``, ``max_mb_per_sec``)."""
+        return cls(
+            workers=int(cfg.get("workers", 8)),
+            per_host=int(cfg.get("per_host", 2)),
+            hosts=cfg.get("hosts") or {},
+            max_bytes_per_sec=float(cfg.get("max_mb_per_sec", 0) or 0) * 1_000_000,
+        )
+
+    def map_items(self, fn: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+        """Run ``fn`` over ``items`` concurrently and yield the results in input order.
+
+        An exception is raised when its item's turn comes, after every
+        earlier result has been yielded, and the items not yet started are
+        cancelled, as a plain loop would have stopped there.
+        """
+        if self._items is None:
+            return (fn(item) for item in items)
+        return self._items.map(fn, list(items))
+
+    def run_modules(self, jobs: List[Callable[[], R]]) -> List[R]:
+        """Run whole-module jobs side by side and return their results in job order."""
+        if self.workers <= 1 or len(jobs) <= 1:
+            return [job() for job in jobs]
+        with ThreadPoolExecutor(min(len(jobs), self.workers), thread_name_prefix="fetch-module") as pool:
+            futures = [pool.submit(job) for job in jobs]
+            return [future.result() for future in futures]
+
+    def close(self) -> None:
+        if self._items is not None:
+            self._items.shutdown(wait=True)
+
+
+_active = Scheduler()
+
+
+def active_scheduler() -> Scheduler:
+    """The scheduler installed by ``run_all`` (a sequential, unlimited one otherwise)."""
+    return _active
+
+
+def set_scheduler(scheduler: Scheduler) -> None:
+    global _active
+    _active = scheduler
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# ioctl(dest_fd, FICLONE, src_fd): share the source's extents (btrfs, XFS, ...).
+FICLONE = 0x40049409
+
+LINK_MODES = ("hardlink", "reflink", "copy")
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    with src.open("rb") as s, dst.open("wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+class ObjectStore:
+    """Content-addressed blobs (``sha256/<ab>/<digest>``) shared by every dataset version.
+
+    A version's files are hardlinks (or reflinks / copies, per ``link``)
+    of their blobs, so identical downloads take disk space once. ``urls``
+    remembers which blob a URL last produced, with its ETag and
+    Last-Modified, so a new version can start from an older version's
+    file and only download it again when the server reports a change.
+    Blobs must never be modified in place: every writer in this package
+    replaces files atomically.
+    """
+
+    def __init__(self, root: Path, link: str = "hardlink") -> None:
+        if link not in LINK_MODES:
+            raise ValueError(f"object_store.link must be one of {', '.join(LINK_MODES)}")
+        self.root = root
+        self.link = link
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / "sha256" / digest[:2] / digest
+
+    def _url_path(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.root / "urls" / key[:2] / f"{key}.json"
+
+    def _place(self, src: Path, dst: Path) -> None:
+        """Create ``dst`` (which must not exist) as a link or copy of ``src``."""
+        if self.link == "hardlink":
+            try:
+                os.link(src, dst)
+                return
+            except OSError as exc:
+                if exc.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+        if self.link in ("hardlink", "reflink"):
+            try:
+                _reflink(src, dst)
+                return
+            except OSError:
+                dst.unlink(missing_ok=True)
+        shutil.copyfile(src, dst)
+
+    def ingest(self, path: Path, digest: str) -> bool:
+        """Make ``path`` share its blob; returns True if the blob already existed (the file was deduplicated)."""
+        blob = self.blob_path(digest)
+        with self.lock:
+            if blob.exists():
+                if self.link == "copy" or (self.link == "hardlink" and os.path.samefile(blob, path)):
+                    return True
+                tmp = path.with_name(path.name + ".link")
+                tmp.unlink(missing_ok=True)
+                self._place(blob, tmp)
+                tmp.replace(path)
+                return True
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp = blob.with_name(blob.name + ".tmp")
+            tmp.unlink(missing_ok=True)
+            self._place(path, tmp)
+            tmp.replace(blob)
+            return False
+
+    def checkout(self, digest: str, dest: Path) -> bool:
+        """Place blob ``digest`` at ``dest``; False if the store does not hold it."""
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + ".link")
+        tmp.unlink(missing_ok=True)
+        self._place(blob, tmp)
+        tmp.replace(dest)
+        return True
+
+    def lookup_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """The last recorded ``{url, etag, last_modified, sha256}`` for ``url`` whose blob still exists."""
+        try:
+            ref = json.loads(self._url_path(url).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if ref.get("url") != url or not self.blob_path(ref.get("sha256", "")).exists():
+            return None
+        return ref
+
+    def record_url(self, url: str, etag: Optional[str], last_modified: Optional[str], digest: str) -> None:
+        path = self._url_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        ref = {"url": url, "etag": etag, "last_modified": last_modified, "sha256": digest}
+        tmp.write_text(json.dumps(ref, indent=2) + "\n", encoding="utf-8")
+        tmp.replace(path)
+
+    def gc(self, keep: Iterable[str], dry_run: bool = False) -> Tuple[int, int]:
+        """Delete blobs whose digest is not in ``keep`` (and URL records pointing at them); returns (blobs, bytes)."""
+        keep = set(keep)
+        removed = freed = 0
+        for blob in sorted((self.root / "sha256").glob("*/*")):
+            if blob.name in keep or blob.name.endswith(".tmp"):
+                continue
+            removed += 1
+            freed += blob.stat().st_size
+            if not dry_run:
+                blob.unlink()
+        if not dry_run:
+            for ref_path in (self.root / "urls").glob("*/*.json"):
+                try:
+                    digest = json.loads(ref_path.read_text(encoding="utf-8")).get("sha256", "")
+                except (OSError, ValueError):
+                    digest = ""
+                if digest not in keep:
+                    ref_path.unlink()
+        return removed, freed
+
+
+_active: Optional[ObjectStore] = None
+
+
+def active_store() -> Optional[ObjectStore]:
+    """The store installed by ``run_all``, or None when ``object_store`` is not configured."""
+    return _active
+
+
+def set_store(store: Optional[ObjectStore]) -> None:
+    global _active
+    _active = store
+
+
+def store_from_config(cfg: Dict[str, Any], output_root: Path) -> Optional[ObjectStore]:
+    """Build from the ``object_store`` config section (``enabled``, ``dir``, ``link``)."""
+    if not cfg.get("enabled", False):
+        return None
+    return ObjectStore(Path(cfg.get("dir") or output_root / ".objects"), link=cfg.get("link", "hardlink"))
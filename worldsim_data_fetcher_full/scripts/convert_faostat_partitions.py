@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from ._common import DatasetContext, append_text, sha256_file, utc_now_iso, write_json
+from ._partitions import INDEX_NAME, partition_pages
+from .download_faostat import page_plan
+
+
+def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
+    """Split the downloaded FAOSTAT pages into per-country columnar partitions.
+
+    Writes ``faostat/partitions/<domain>/<area>.json`` and an ``index.json``
+    per domain, keyed by the first field of ``partition_by`` a record has.
+    """
+    fao_dir = ctx.out_root / "faostat"
+    fields = cfg.get("partition_by") or ["Area Code (ISO3)", "Area Code", "Area"]
+
+    sources = {
+        "dataset": "FAOSTAT (per-country partitions)",
+        "retrievedAtUtc": utc_now_iso(),
+        "license": "FAO Open Data policy (often CC BY 4.0); verify per dataset.",
+        "inputs": [],
+        "items": [],
+    }
+
+    written: List[Path] = []
+    plan = page_plan(cfg)
+    for domain in dict.fromkeys(d for d, _, _ in plan):
+        # The pages this config requests, not every file in the directory: pages
+        # left by an earlier ``years`` or ``year_batch`` would duplicate rows.
+        pages = [fao_dir / rel for d, _, rel in plan if d == domain and (fao_dir / rel).exists()]
+        if not pages:
+            continue
+        sources["inputs"].extend(str(p.relative_to(ctx.out_root)) for p in pages)
+        files = partition_pages(pages, fao_dir / "partitions" / domain, fields)
+        for path in files:
+            digest = sha256_file(path)
+            append_text(ctx.checksums_path, f"{digest}  {path.relative_to(ctx.out_root)}\n")
+            if path.name == INDEX_NAME:
+                sources["items"].append({
+                    "domain": domain,
+                    "path": str(path.relative_to(ctx.out_root)),
+                    "sha256": digest,
+                    "partitions": len(files) - 1,
+                })
+        written.extend(files)
+    if not written:
+        return []
+
+    existing = []
+    if ctx.sources_path.exists():
+        existing = json.loads(ctx.sources_path.read_text(encoding="utf-8"))
+        if not isinstance(existing, list):
+            existing = [existing]
+    else:
+        existing = []
+    existing.append(sources)
+    write_json(ctx.sources_path, existing)
+    return written
@@ -6,7 +6,7 @@ import zipfile
 from pathlib import Path
 from typing import Any, Dict, List
 
-from ._common import DatasetContext, ensure_dir, append_text, sha256_file, utc_now_iso, write_json
+from ._common import DatasetContext, ensure_dir, append_text, sha256_file, utc_now_iso, write_json, write_hashed
 
 
 def _load_pyshp():
@@ -45,10 +45,7 @@ def _shp_to_geojson(shp_path: Path, out_path: Path) -> None:
             "properties": props,
             "geometry": geom
         })
-    out_path.write_text(
-        json.dumps({"type": "FeatureCollection", "features": features}, ensure_ascii=False) + "\n",
-        encoding="utf-8"
-    )
+    write_hashed(out_path, json.dumps({"type": "FeatureCollection", "features": features}, ensure_ascii=False) + "\n")
 
 
 def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from ._common import DatasetContext, append_text, sha256_file, utc_now_iso, write_json
+from ._partitions import INDEX_NAME, partition_pages
+from .download_un_comtrade import page_plan
+
+
+def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
+    """Split the downloaded Comtrade pages into per-reporter columnar partitions.
+
+    Writes ``un_comtrade/partitions/<year>/<reporter>.json`` and an
+    ``index.json`` per year, keyed by the first field of ``partition_by``
+    a record has.
+    """
+    comtrade_dir = ctx.out_root / "un_comtrade"
+    fields = cfg.get("partition_by") or ["reporterISO", "reporterCode"]
+
+    sources = {
+        "dataset": "UN Comtrade (per-reporter partitions)",
+        "retrievedAtUtc": utc_now_iso(),
+        "license": "UN Comtrade Terms of Use apply; treat as calibration data.",
+        "inputs": [],
+        "items": [],
+    }
+
+    written: List[Path] = []
+    plan = page_plan(cfg)
+    for year in dict.fromkeys(y for y, _, _ in plan):
+        # The pages this config requests, not every file in the directory: pages
+        # left by an earlier ``reporters`` list would duplicate rows.
+        pages = [comtrade_dir / rel for y, _, rel in plan if y == year and (comtrade_dir / rel).exists()]
+        if not pages:
+            continue
+        sources["inputs"].extend(str(p.relative_to(ctx.out_root)) for p in pages)
+        files = partition_pages(pages, comtrade_dir / "partitions" / str(year), fields)
+        for path in files:
+            digest = sha256_file(path)
+            append_text(ctx.checksums_path, f"{digest}  {path.relative_to(ctx.out_root)}\n")
+            if path.name == INDEX_NAME:
+                sources["items"].append({
+                    "year": year,
+                    "path": str(path.relative_to(ctx.out_root)),
+                    "sha256": digest,
+                    "partitions": len(files) - 1,
+                })
+        written.extend(files)
+    if not written:
+        return []
+
+    existing = []
+    if ctx.sources_path.exists():
+        existing = json.loads(ctx.sources_path.read_text(encoding="utf-8"))
+        if not isinstance(existing, list):
+            existing = [existing]
+    else:
+        existing = []
+    existing.append(sources)
+    write_json(ctx.sources_path, existing)
+    return written
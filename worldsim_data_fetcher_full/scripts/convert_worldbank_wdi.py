@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from ._common import DatasetContext, append_text, ensure_dir, sha256_file, utc_now_iso, write_hashed, write_json
+from .wdi_store import INDEX_NAME, VALUES_NAME, WdiStore, build_columns, country_slice
+
+
+def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
+    """Turn the downloaded WDI indicators into the columnar store plus per-country JSON slices.
+
+    Writes ``world_bank_wdi/columnar/`` (``wdi_index.json`` and the float64
+    values) and ``world_bank_wdi/slices/<ISO3>.json`` for the browser, for
+    the countries in ``slice_countries`` (all by default), with
+    ``slices/index.json`` listing them.
+    """
+    wdi_dir = ctx.out_root / "world_bank_wdi"
+    countries = cfg.get("countries", "all")
+    start_year = int(cfg.get("start_year", 1990))
+    end_year = int(cfg.get("end_year", 2024))
+
+    indicators: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+    inputs: List[str] = []
+    for ind in cfg.get("indicators", []):
+        path = wdi_dir / f"{ind}_{countries}_{start_year}-{end_year}.json"
+        if not path.exists():
+            continue
+        rows = json.loads(path.read_text(encoding="utf-8")) or []
+        name = next(((row.get("indicator") or {}).get("value", "") for row in rows), "")
+        indicators[ind] = (name, rows)
+        inputs.append(str(path.relative_to(ctx.out_root)))
+    if not indicators:
+        return []
+
+    index, values = build_columns(indicators)
+    columnar_dir = wdi_dir / "columnar"
+    ensure_dir(columnar_dir)
+    values_path = columnar_dir / VALUES_NAME
+    index_path = columnar_dir / INDEX_NAME
+    write_hashed(values_path, values)
+    write_hashed(index_path, json.dumps(index, ensure_ascii=False) + "\n")
+    written = [values_path, index_path]
+
+    slices_dir = wdi_dir / "slices"
+    wanted = cfg.get("slice_countries") or "all"
+    with WdiStore(columnar_dir) as store:
+        iso3s = [c["iso3"] for c in store.countries] if wanted == "all" else [iso3 for iso3 in wanted if iso3 in store]
+        for iso3 in iso3s:
+            path = slices_dir / f"{iso3}.json"
+            write_hashed(path, json.dumps(country_slice(store, iso3), ensure_ascii=False, separators=(",", ":")) + "\n")
+            written.append(path)
+    slices_index = slices_dir / "index.json"
+    write_hashed(slices_index, json.dumps({
+        "years": index["years"],
+        "indicators": [{"code": ind["code"], "name": ind["name"]} for ind in index["indicators"]],
+        "countries": [c for c in index["countries"] if c["iso3"] in set(iso3s)],
+    }, ensure_ascii=False, indent=2) + "\n")
+    written.append(slices_index)
+
+    sources = {
+        "dataset": "World Bank - World Development Indicators (columnar conversion)",
+        "retrievedAtUtc": utc_now_iso(),
+        "license": "See World Bank data terms; verify per indicator.",
+        "inputs": inputs,
+        "items": [],
+    }
+    for path in written:
+        digest = sha256_file(path)
+        append_text(ctx.checksums_path, f"{digest}  {path.relative_to(ctx.out_root)}\n")
+        if path.parent == columnar_dir or path == slices_index:
+            sources["items"].append({"path": str(path.relative_to(ctx.out_root)), "sha256": digest})
+    sources["items"].append({"path": str(slices_dir.relative_to(ctx.out_root)), "slices": len(iso3s)})
+
+    existing = []
+    if ctx.sources_path.exists():
+        existing = json.loads(ctx.sources_path.read_text(encoding="utf-8"))
+        if not isinstance(existing, list):
+            existing = [existing]
+    else:
+        existing = []
+    existing.append(sources)
+    write_json(ctx.sources_path, existing)
+    return written
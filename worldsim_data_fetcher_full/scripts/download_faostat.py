@@ -1,22 +1,37 @@
 from __future__ import annotations
 
 import json
-import time
 import requests
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
-from ._common import DatasetContext, append_text, write_json, sha256_file, utc_now_iso, USER_AGENT, ensure_dir
+from ._common import DatasetContext, append_text, http_get_stream, map_items, write_json, sha256_file, utc_now_iso, ensure_dir
 
 FAO_API = "https://fenixservices.fao.org/faostat/api/v1/en/FAOSTAT"
 
+def page_plan(cfg: Dict[str, Any]) -> List[Tuple[str, List[Any], str]]:
+    """``(domain, years, path under faostat/)`` of every page ``run`` requests for ``cfg``, in order.
+
+    One request per domain and batch of ``year_batch`` years, so pages stay
+    small and download concurrently.
+    """
+    domains = cfg.get("domains", ["QCL"])
+    years = cfg.get("years", [2020])
+    year_batch = max(1, int(cfg.get("year_batch", 1)))
+    batches = [years[i:i + year_batch] for i in range(0, len(years), year_batch)]
+    plan = []
+    for domain in domains:
+        for batch in batches:
+            span = f"{batch[0]}" if len(batch) == 1 else f"{batch[0]}-{batch[-1]}"
+            plan.append((domain, batch, f"{domain}/{domain}_{span}.json"))
+    return plan
+
 def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
     out_dir = ctx.out_root / "faostat"
     ensure_dir(out_dir)
     downloaded: List[Path] = []
 
-    domains = cfg.get("domains", ["QCL"])
-    years = cfg.get("years", [2020])
+    pages = page_plan(cfg)
 
     sources = {
         "dataset": "FAOSTAT",
@@ -27,59 +42,51 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
 
     max_retries = int(cfg.get("max_retries", 3))
 
-    for domain in domains:
-        params = {"area": "all", "year": ",".join(map(str, years))}
+    def fetch(page: Tuple[str, List[Any], str]) -> Tuple[Optional[Path], Dict[str, Any]]:
+        domain, batch, rel_path = page
+        params = {"area": "all", "year": ",".join(map(str, batch))}
         url = f"{FAO_API}/{domain}"
         prepared_url = requests.Request("GET", url, params=params).prepare().url
-        out = out_dir / f"{domain}.json"
+        out = out_dir / rel_path
         if out.exists():
-            digest = sha256_file(out)
-            append_text(ctx.checksums_path, f"{digest}  {out.relative_to(ctx.out_root)}\n")
-            downloaded.append(out)
-            sources["items"].append({
+            return out, {
                 "domain": domain,
+                "years": batch,
                 "url": prepared_url,
-                "sha256": digest,
+                "sha256": sha256_file(out),
                 "status": "cached"
-            })
-            continue
+            }
         last_error: Exception | None = None
         success = False
-        for attempt in range(1, max_retries + 1):
-            try:
-                r = requests.get(url, params=params, headers={"User-Agent": USER_AGENT}, timeout=300)
-                r.raise_for_status()
-                out.write_text(r.text, encoding="utf-8")
-                success = True
-                break
-            except requests.RequestException as exc:
-                last_error = exc
-                if attempt < max_retries:
-                    time.sleep(min(5 * attempt, 20))
+        try:
+            http_get_stream(prepared_url, out, timeout=300, attempts=max_retries)
+            success = True
+        except requests.RequestException as exc:
+            last_error = exc
         if not success:
             if out.exists():
-                digest = sha256_file(out)
-                append_text(ctx.checksums_path, f"{digest}  {out.relative_to(ctx.out_root)}\n")
-                downloaded.append(out)
-                sources["items"].append({
+                return out, {
                     "domain": domain,
+                    "years": batch,
                     "url": prepared_url,
-                    "sha256": digest,
+                    "sha256": sha256_file(out),
                     "status": "cached",
                     "error": str(last_error),
-                })
-            else:
-                sources["items"].append({
-                    "domain": domain,
-                    "url": prepared_url,
-                    "status": "failed",
-                    "error": str(last_error),
-                })
-            continue
-        digest = sha256_file(out)
-        append_text(ctx.checksums_path, f"{digest}  {out.relative_to(ctx.out_root)}\n")
-        downloaded.append(out)
-        sources["items"].append({"domain": domain, "url": str(prepared_url), "sha256": digest})
+                }
+            return None, {
+                "domain": domain,
+                "years": batch,
+                "url": prepared_url,
+                "status": "failed",
+                "error": str(last_error),
+            }
+        return out, {"domain": domain, "years": batch, "url": str(prepared_url), "sha256": sha256_file(out)}
+
+    for out, item_source in map_items(fetch, pages):
+        if out is not None:
+            append_text(ctx.checksums_path, f"{item_source['sha256']}  {out.relative_to(ctx.out_root)}\n")
+            downloaded.append(out)
+        sources["items"].append(item_source)
 
     existing = []
     if ctx.sources_path.exists():
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
-from ._common import DatasetContext, http_get_stream, write_json, append_text, sha256_file, utc_now_iso
+from ._common import DatasetContext, http_get_stream, map_items, write_json, append_text, sha256_file, utc_now_iso
 
 def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
     out_dir = ctx.out_root / "geofabrik_osm"
@@ -17,20 +17,24 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
         "items": [],
     }
 
-    for reg in cfg.get("regions", []):
+    def fetch(reg: Dict[str, Any]) -> Tuple[Path, Dict[str, Any]]:
         reg_id = reg["id"]
         url = reg["url"]
         out_path = out_dir / reg_id / "latest.osm.pbf"
-        http_get_stream(url, out_path, timeout=300)
-        digest = sha256_file(out_path)
-        append_text(ctx.checksums_path, f"{digest}  {out_path.relative_to(ctx.out_root)}\n")
-        downloaded.append(out_path)
-
-        sources["items"].append({
+        changed = http_get_stream(url, out_path, timeout=300)
+        item = {
             "id": reg_id,
             "url": url,
-            "sha256": digest,
-        })
+            "sha256": sha256_file(out_path),
+        }
+        if not changed:
+            item["status"] = "cached"
+        return out_path, item
+
+    for out_path, item_source in map_items(fetch, cfg.get("regions", [])):
+        append_text(ctx.checksums_path, f"{item_source['sha256']}  {out_path.relative_to(ctx.out_root)}\n")
+        downloaded.append(out_path)
+        sources["items"].append(item_source)
 
     existing = []
     if ctx.sources_path.exists():
@@ -3,14 +3,12 @@ from __future__ import annotations
 import json
 import re
 from pathlib import Path
-from typing import Any, Dict, List
-import requests
+from typing import Any, Dict, List, Tuple
 
-from ._common import DatasetContext, http_get_stream, write_json, append_text, sha256_file, utc_now_iso, USER_AGENT, ensure_dir
+from ._common import DatasetContext, http_get, http_get_stream, map_items, write_json, append_text, sha256_file, utc_now_iso, ensure_dir
 
 def _resolve_zip_from_page(page_url: str) -> str:
-    headers = {"User-Agent": USER_AGENT}
-    html = requests.get(page_url, headers=headers, timeout=60).text
+    html = http_get(page_url, timeout=60).text
     zips = re.findall(r'href="([^"]+\.zip)"', html, flags=re.IGNORECASE)
     if not zips:
         raise RuntimeError(f"Could not find a .zip link on page: {page_url}")
@@ -56,23 +54,19 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
         "items": [],
     }
 
-    for item in cfg.get("items", []):
+    def fetch(item: Dict[str, Any]) -> Tuple[Path, Dict[str, Any]]:
         name = item["name"]
         page_url = item["page_url"]
         zip_url = _resolve_zip_from_page(page_url)
         out_path = out_dir / f"{name}.zip"
         if out_path.exists():
-            digest = sha256_file(out_path)
-            append_text(ctx.checksums_path, f"{digest}  {out_path.relative_to(ctx.out_root)}\n")
-            downloaded.append(out_path)
-            sources["items"].append({
+            return out_path, {
                 "name": name,
                 "page_url": page_url,
                 "zip_url": zip_url,
-                "sha256": digest,
+                "sha256": sha256_file(out_path),
                 "status": "cached"
-            })
-            continue
+            }
         try:
             http_get_stream(zip_url, out_path)
         except Exception:
@@ -81,15 +75,17 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
                 raise
             http_get_stream(fallback, out_path)
             zip_url = fallback
-        digest = sha256_file(out_path)
-        append_text(ctx.checksums_path, f"{digest}  {out_path.relative_to(ctx.out_root)}\n")
-        downloaded.append(out_path)
-        sources["items"].append({
+        return out_path, {
             "name": name,
             "page_url": page_url,
             "zip_url": zip_url,
-            "sha256": digest,
-        })
+            "sha256": sha256_file(out_path),
+        }
+
+    for out_path, item_source in map_items(fetch, cfg.get("items", [])):
+        append_text(ctx.checksums_path, f"{item_source['sha256']}  {out_path.relative_to(ctx.out_root)}\n")
+        downloaded.append(out_path)
+        sources["items"].append(item_source)
 
     existing = []
     if ctx.sources_path.exists():
@@ -3,10 +3,9 @@ from __future__ import annotations
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-import requests
+from typing import Any, Dict, List, Optional, Tuple
 
-from ._common import DatasetContext, http_get_stream, write_json, append_text, sha256_file, utc_now_iso, USER_AGENT, ensure_dir
+from ._common import DatasetContext, http_get_stream, http_post, map_items, write_json, append_text, sha256_file, utc_now_iso, ensure_dir
 
 TRANSITLAND_BASE = "https://transit.land"
 
@@ -15,7 +14,7 @@ def _get_api_key() -> Optional[str]:
 
 def _search_feeds_by_bbox(bbox: List[float], max_feeds: int) -> List[Dict[str, Any]]:
     api_key = _get_api_key()
-    headers = {"User-Agent": USER_AGENT}
+    headers = {}
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
 
@@ -31,7 +30,7 @@ def _search_feeds_by_bbox(bbox: List[float], max_feeds: int) -> List[Dict[str, A
     }
     '''
     payload = {"query": query, "variables": {"bbox": bbox, "limit": max_feeds}}
-    r = requests.post(f"{TRANSITLAND_BASE}/api/v2/graphql", json=payload, headers=headers, timeout=60)
+    r = http_post(f"{TRANSITLAND_BASE}/api/v2/graphql", json=payload, headers=headers, timeout=60)
     r.raise_for_status()
     j = r.json()
     feeds = (j.get("data") or {}).get("feeds") or []
@@ -60,26 +59,30 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
     except Exception as e:
         sources["errors"].append({"stage": "search", "error": str(e)})
 
-    for feed in feeds:
-        url = feed.get("url")
+    def fetch(feed: Dict[str, Any]) -> Tuple[Optional[Path], Dict[str, Any]]:
+        url = feed["url"]
         onestop = feed.get("onestop_id") or feed.get("id") or "unknown"
-        if not url or not isinstance(url, str):
-            continue
         out_path = out_dir / f"{onestop}.zip"
         try:
             http_get_stream(url, out_path, timeout=300)
-            digest = sha256_file(out_path)
-            append_text(ctx.checksums_path, f"{digest}  {out_path.relative_to(ctx.out_root)}\n")
-            downloaded.append(out_path)
-            sources["items"].append({
+            return out_path, {
                 "onestop_id": onestop,
                 "name": feed.get("name"),
                 "spec": feed.get("spec"),
                 "url": url,
-                "sha256": digest,
-            })
+                "sha256": sha256_file(out_path),
+            }
         except Exception as e:
-            sources["errors"].append({"stage": "download", "onestop_id": onestop, "url": url, "error": str(e)})
+            return None, {"stage": "download", "onestop_id": onestop, "url": url, "error": str(e)}
+
+    feeds = [feed for feed in feeds if feed.get("url") and isinstance(feed.get("url"), str)]
+    for out_path, item_source in map_items(fetch, feeds):
+        if out_path is None:
+            sources["errors"].append(item_source)
+            continue
+        append_text(ctx.checksums_path, f"{item_source['sha256']}  {out_path.relative_to(ctx.out_root)}\n")
+        downloaded.append(out_path)
+        sources["items"].append(item_source)
 
     existing = []
     if ctx.sources_path.exists():
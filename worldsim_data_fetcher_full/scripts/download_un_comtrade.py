@@ -1,29 +1,40 @@
 from __future__ import annotations
 
+import hashlib
 import json
-import time
 import requests
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
-from ._common import DatasetContext, append_text, write_json, sha256_file, utc_now_iso, USER_AGENT, ensure_dir
+from ._common import DatasetContext, append_text, write_json, sha256_file, utc_now_iso, http_get_stream, map_items, ensure_dir
 
 API = "https://comtradeapi.worldbank.org/v1/get/HS"
 
+def page_plan(cfg: Dict[str, Any]) -> List[Tuple[int, List[str], str]]:
+    """``(year, reporters, path under un_comtrade/)`` of every page ``run`` requests for ``cfg``, in order.
+
+    Without a reporter list each year is a single "all" request; with one,
+    requests cover ``reporter_batch`` reporters each and download
+    concurrently. Pages are named after the reporters they hold, so a
+    changed ``reporters`` list never reuses a stale page.
+    """
+    years = [int(y) for y in cfg.get("years") or [cfg.get("year", 2022)]]
+    reporters = [str(r) for r in cfg.get("reporters") or []]
+    reporter_batch = max(1, int(cfg.get("reporter_batch", 25)))
+    batches = [reporters[i:i + reporter_batch] for i in range(0, len(reporters), reporter_batch)] or [["all"]]
+    plan = []
+    for year in years:
+        for batch in batches:
+            key = "all" if batch == ["all"] else hashlib.sha256(",".join(batch).encode("utf-8")).hexdigest()[:12]
+            plan.append((year, batch, f"trade_total_{year}/reporters_{key}.json"))
+    return plan
+
 def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
     out_dir = ctx.out_root / "un_comtrade"
     ensure_dir(out_dir)
     downloaded: List[Path] = []
 
-    year = int(cfg.get("year", 2022))
-
-    params = {
-        "reporterCode": "all",
-        "year": year,
-        "cmdCode": "TOTAL",
-        "flowCode": "X,M",
-        "format": "JSON",
-    }
+    pages = page_plan(cfg)
 
     sources = {
         "dataset": "UN Comtrade (World Bank Comtrade API mirror)",
@@ -33,62 +44,62 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
     }
 
     max_retries = int(cfg.get("max_retries", 3))
-    prepared_url = requests.Request("GET", API, params=params).prepare().url
-    out = out_dir / f"trade_total_{year}.json"
-    if out.exists():
-        digest = sha256_file(out)
-        append_text(ctx.checksums_path, f"{digest}  {out.relative_to(ctx.out_root)}\n")
-        downloaded.append(out)
-        sources["items"].append({
-            "url": prepared_url,
-            "sha256": digest,
-            "status": "cached"
-        })
-        existing = []
-        if ctx.sources_path.exists():
-            existing = json.loads(ctx.sources_path.read_text(encoding="utf-8"))
-            if not isinstance(existing, list):
-                existing = [existing]
-        else:
-            existing = []
-        existing.append(sources)
-        write_json(ctx.sources_path, existing)
-        return downloaded
-    last_error: Exception | None = None
-    success = False
-    for attempt in range(1, max_retries + 1):
+
+    def fetch(page: Tuple[int, List[str], str]) -> Tuple[Optional[Path], Dict[str, Any]]:
+        year, batch, rel_path = page
+        params = {
+            "reporterCode": ",".join(batch),
+            "year": year,
+            "cmdCode": "TOTAL",
+            "flowCode": "X,M",
+            "format": "JSON",
+        }
+        prepared_url = requests.Request("GET", API, params=params).prepare().url
+        out = out_dir / rel_path
+        if out.exists():
+            return out, {
+                "year": year,
+                "reporters": params["reporterCode"],
+                "url": prepared_url,
+                "sha256": sha256_file(out),
+                "status": "cached"
+            }
+        last_error: Exception | None = None
+        success = False
         try:
-            r = requests.get(API, params=params, headers={"User-Agent": USER_AGENT}, timeout=300)
-            r.raise_for_status()
-            out.write_text(r.text, encoding="utf-8")
+            http_get_stream(prepared_url, out, timeout=300, attempts=max_retries)
             success = True
-            break
         except requests.RequestException as exc:
             last_error = exc
-            if attempt < max_retries:
-                time.sleep(min(5 * attempt, 20))
-    if not success:
-        if out.exists():
-            digest = sha256_file(out)
-            append_text(ctx.checksums_path, f"{digest}  {out.relative_to(ctx.out_root)}\n")
-            downloaded.append(out)
-            sources["items"].append({
-                "url": prepared_url,
-                "sha256": digest,
-                "status": "cached",
-                "error": str(last_error),
-            })
-        else:
-            sources["items"].append({
+        if not success:
+            if out.exists():
+                return out, {
+                    "year": year,
+                    "reporters": params["reporterCode"],
+                    "url": prepared_url,
+                    "sha256": sha256_file(out),
+                    "status": "cached",
+                    "error": str(last_error),
+                }
+            return None, {
+                "year": year,
+                "reporters": params["reporterCode"],
                 "url": prepared_url,
                 "status": "failed",
                 "error": str(last_error),
-            })
-    else:
-        digest = sha256_file(out)
-        append_text(ctx.checksums_path, f"{digest}  {out.relative_to(ctx.out_root)}\n")
-        downloaded.append(out)
-        sources["items"].append({"url": str(prepared_url), "sha256": digest})
+            }
+        return out, {
+            "year": year,
+            "reporters": params["reporterCode"],
+            "url": str(prepared_url),
+            "sha256": sha256_file(out),
+        }
+
+    for out, item_source in map_items(fetch, pages):
+        if out is not None:
+            append_text(ctx.checksums_path, f"{item_source['sha256']}  {out.relative_to(ctx.out_root)}\n")
+            downloaded.append(out)
+        sources["items"].append(item_source)
 
     existing = []
     if ctx.sources_path.exists():
@@ -2,16 +2,14 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Any, Dict, List
-import requests
+from typing import Any, Dict, List, Tuple
 
-from ._common import DatasetContext, write_json, append_text, sha256_file, utc_now_iso, USER_AGENT, ensure_dir
+from ._common import DatasetContext, http_get, map_items, write_json, append_text, sha256_file, utc_now_iso, ensure_dir, write_hashed
 
 def _download_json(indicator: str, countries: str, start_year: int, end_year: int) -> List[Dict[str, Any]]:
     base = f"https://api.worldbank.org/v2/country/{countries}/indicator/{indicator}"
     params = {"format": "json", "per_page": 20000, "date": f"{start_year}:{end_year}"}
-    headers = {"User-Agent": USER_AGENT}
-    r = requests.get(base, params=params, headers=headers, timeout=120)
+    r = http_get(base, params=params, timeout=120)
     r.raise_for_status()
     data = r.json()
     if not isinstance(data, list) or len(data) < 2:
@@ -38,37 +36,34 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
         "items": [],
     }
 
-    for ind in indicators:
+    def fetch(ind: str) -> Tuple[Path, Dict[str, Any]]:
         out_path = out_dir / f"{ind}_{countries}_{start_year}-{end_year}.json"
         if out_path.exists():
-            digest = sha256_file(out_path)
-            append_text(ctx.checksums_path, f"{digest}  {out_path.relative_to(ctx.out_root)}\n")
-            downloaded.append(out_path)
-            sources["items"].append({
+            return out_path, {
                 "indicator": ind,
                 "countries": countries,
                 "start_year": start_year,
                 "end_year": end_year,
                 "format": fmt,
-                "sha256": digest,
+                "sha256": sha256_file(out_path),
                 "status": "cached",
-            })
-            continue
+            }
 
         rows = _download_json(ind, countries, start_year, end_year)
-        out_path.write_text(json.dumps(rows, ensure_ascii=False) + "\n", encoding="utf-8")
-
-        digest = sha256_file(out_path)
-        append_text(ctx.checksums_path, f"{digest}  {out_path.relative_to(ctx.out_root)}\n")
-        downloaded.append(out_path)
-        sources["items"].append({
+        write_hashed(out_path, json.dumps(rows, ensure_ascii=False) + "\n")
+        return out_path, {
             "indicator": ind,
             "countries": countries,
             "start_year": start_year,
             "end_year": end_year,
             "format": fmt,
-            "sha256": digest,
-        })
+            "sha256": sha256_file(out_path),
+        }
+
+    for out_path, item_source in map_items(fetch, indicators):
+        append_text(ctx.checksums_path, f"{item_source['sha256']}  {out_path.relative_to(ctx.out_root)}\n")
+        downloaded.append(out_path)
+        sources["items"].append(item_source)
 
     existing = []
     if ctx.sources_path.exists():
@@ -2,20 +2,17 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-import requests
+from typing import Any, Dict, List, Optional, Tuple
 
-from ._common import DatasetContext, http_get_stream, write_json, append_text, sha256_file, utc_now_iso, USER_AGENT, ensure_dir
+from ._common import DatasetContext, http_get, http_get_stream, map_items, write_json, append_text, sha256_file, utc_now_iso, ensure_dir
 
 def _api_get(api_base: str, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
     url = api_base.rstrip("/") + "/" + path.lstrip("/")
-    headers = {"User-Agent": USER_AGENT}
-    r = requests.get(url, params=params or {}, headers=headers, timeout=120)
+    r = http_get(url, params=params or {}, timeout=120)
     r.raise_for_status()
     return r.json()
 
-def _find_candidate_layers(api_base: str, iso3: str, year: int, prefer_products: List[str]) -> List[Dict[str, Any]]:
-    root = _api_get(api_base, "")
+def _find_candidate_layers(root: Any, iso3: str, year: int, prefer_products: List[str]) -> List[Dict[str, Any]]:
     pool = root if isinstance(root, list) else []
     candidates: List[Dict[str, Any]] = []
     for item in pool:
@@ -61,8 +58,11 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
         "notes": "If no direct URL is found, candidates are recorded for manual selection.",
     }
 
-    for iso3 in iso3s:
-        candidates = _find_candidate_layers(api_base, iso3, year, prefer_products)
+    # The API root lists every layer; fetch it once for all countries.
+    root = _api_get(api_base, "") if iso3s else None
+
+    def fetch(iso3: str) -> Tuple[Optional[Path], Dict[str, Any]]:
+        candidates = _find_candidate_layers(root, iso3, year, prefer_products)
         chosen_url = None
         chosen_layer = None
         candidates_sorted = candidates[:]
@@ -84,31 +84,32 @@ def run(ctx: DatasetContext, cfg: Dict[str, Any]) -> List[Path]:
                 break
 
         if not chosen_url:
-            sources["items"].append({
+            return None, {
                 "iso3": iso3,
                 "year": year,
                 "status": "not_downloaded_no_direct_url",
                 "candidates": candidates_sorted[:25],
-            })
-            continue
+            }
 
         out_path = out_dir / iso3 / f"worldpop_{iso3}_{year}{Path(chosen_url.split('?')[0]).suffix or '.bin'}"
         if out_path.suffix.lower() not in [".tif", ".tiff", ".zip", ".gz", ".bin"]:
             out_path = out_dir / iso3 / f"worldpop_{iso3}_{year}.bin"
 
         http_get_stream(chosen_url, out_path, timeout=300)
-        digest = sha256_file(out_path)
-        append_text(ctx.checksums_path, f"{digest}  {out_path.relative_to(ctx.out_root)}\n")
-        downloaded.append(out_path)
-
-        sources["items"].append({
+        return out_path, {
             "iso3": iso3,
             "year": year,
             "status": "downloaded",
             "chosen_layer": chosen_layer,
             "download_url": chosen_url,
-            "sha256": digest,
-        })
+            "sha256": sha256_file(out_path),
+        }
+
+    for out_path, item_source in map_items(fetch, iso3s):
+        if out_path is not None:
+            append_text(ctx.checksums_path, f"{item_source['sha256']}  {out_path.relative_to(ctx.out_root)}\n")
+            downloaded.append(out_path)
+        sources["items"].append(item_source)
 
     existing = []
     if ctx.sources_path.exists():
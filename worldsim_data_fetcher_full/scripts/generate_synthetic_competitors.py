@@ -5,6 +5,8 @@ import random
 from pathlib import Path
 from typing import Any, Dict
 
+from ._common import write_hashed
+
 def run(seed: int, out_dir: Path) -> Path:
     out_dir.mkdir(parents=True, exist_ok=True)
     rnd = random.Random(seed)
@@ -19,7 +21,7 @@ def run(seed: int, out_dir: Path) -> Path:
         })
 
     out_path = out_dir / "synthetic_competitors.json"
-    out_path.write_text(json.dumps({
+    write_hashed(out_path, json.dumps({
         "synthetic": True,
         "seed": seed,
         "rivals": rivals,
@@ -28,5 +30,5 @@ def run(seed: int, out_dir: Path) -> Path:
             "price_index": "dimensionless",
             "quality_index": "dimensionless",
         }
-    }, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    }, indent=2, ensure_ascii=False) + "\n")
     return out_path
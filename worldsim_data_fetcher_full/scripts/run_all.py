@@ -2,22 +2,46 @@ from __future__ import annotations
 
 import argparse
 import json
+import shutil
 import traceback
+from dataclasses import replace
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
 
-from ._common import DatasetContext, load_yaml, save_manifest, ensure_dir, write_json
+from ._checksums import CHECKSUM_CACHE_NAME, ChecksumCache, read_checksums, set_checksums, write_checksums
+from ._common import DatasetContext, configure_http, load_yaml, save_manifest, ensure_dir, store_file, write_json
+from ._scheduler import Scheduler, set_scheduler
+from ._store import set_store, store_from_config
+
+# Conversion steps chained after a download module when its config sets the flag:
+# module key -> [(flag, error/module key, script module)].
+CONVERSIONS = {
+    "natural_earth": [("convert_geojson", "natural_earth_geojson", "convert_naturalearth_geojson")],
+    "world_bank_wdi": [("columnar", "world_bank_wdi_columnar", "convert_worldbank_wdi")],
+    "faostat": [("partitions", "faostat_partitions", "convert_faostat_partitions")],
+    "un_comtrade": [("partitions", "un_comtrade_partitions", "convert_un_comtrade_partitions")],
+}
 
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True, help="Path to YAML config")
     ap.add_argument("--dataset-version", required=True, help="Dataset version string (e.g. 2026-01-06-demo)")
+    ap.add_argument("--sequential", action="store_true", help="Run modules and items one at a time, without limits")
+    ap.add_argument("--replay", action="store_true", help="Serve every request from the HTTP cache (offline run)")
     args = ap.parse_args()
 
     cfg = load_yaml(Path(args.config))
     out_root = Path(cfg.get("output_root", "data/raw")) / args.dataset_version
     ensure_dir(out_root)
 
+    scheduler = Scheduler(workers=1) if args.sequential else Scheduler.from_config(cfg.get("scheduler") or {})
+    set_scheduler(scheduler)
+    configure_http(cfg.get("http") or {}, replay=args.replay)
+    checksum_cache = ChecksumCache(out_root / CHECKSUM_CACHE_NAME)
+    set_checksums(checksum_cache)
+    store = store_from_config(cfg.get("object_store") or {}, out_root.parent)
+    set_store(store)
+
     ctx = DatasetContext(dataset_version=args.dataset_version, out_root=out_root)
     all_files: List[Path] = []
     errors: List[Dict[str, Any]] = []
@@ -25,16 +49,19 @@ def main() -> None:
     downloads = cfg.get("downloads", {})
     generators = cfg.get("generators", {})
 
-    def run_module(key: str, module_name: str):
-        mod_cfg = downloads.get(key, {})
-        if not mod_cfg.get("enabled", False):
-            print(f"[skip] {key}")
-            return
+    # Modules run side by side, each logging sources/checksums to its own staging
+    # directory; the logs are merged below in module order, so the output matches
+    # a sequential run.
+    staging_root = out_root / ".staging"
+    shutil.rmtree(staging_root, ignore_errors=True)
+
+    def run_module(
+        key: str, module_name: str, mod_ctx: DatasetContext, errors: List[Dict[str, Any]], cfg_key: str = ""
+    ) -> List[Path]:
         print(f"[run]  {key}")
         try:
             mod = __import__(f"scripts.{module_name}", fromlist=["run"])
-            files = mod.run(ctx, mod_cfg)  # type: ignore
-            all_files.extend(files)
+            return mod.run(mod_ctx, downloads.get(cfg_key or key, {}))  # type: ignore
         except Exception as exc:
             errors.append({
                 "module": key,
@@ -42,26 +69,62 @@ def main() -> None:
                 "trace": traceback.format_exc()
             })
             print(f"[warn] {key} failed: {exc}")
+            return []
 
-    run_module("natural_earth", "download_naturalearth")
-    if downloads.get("natural_earth", {}).get("convert_geojson", False):
-        try:
-            mod = __import__("scripts.convert_naturalearth_geojson", fromlist=["run"])
-            files = mod.run(ctx, downloads.get("natural_earth", {}))  # type: ignore
-            all_files.extend(files)
-        except Exception as exc:
-            errors.append({
-                "module": "natural_earth_geojson",
-                "error": str(exc),
-                "trace": traceback.format_exc()
-            })
-            print(f"[warn] natural_earth_geojson failed: {exc}")
-    run_module("geofabrik_osm", "download_geofabrik_osm")
-    run_module("worldpop", "download_worldpop")
-    run_module("world_bank_wdi", "download_worldbank_wdi")
-    run_module("faostat", "download_faostat")
-    run_module("un_comtrade", "download_un_comtrade")
-    run_module("transitland_gtfs", "download_transitland_gtfs")
+    def module_job(key: str, module_name: str) -> Callable[[], Tuple[List[Path], List[Dict[str, Any]]]]:
+        def job() -> Tuple[List[Path], List[Dict[str, Any]]]:
+            mod_ctx = replace(ctx, log_root=staging_root / key)
+            mod_errors: List[Dict[str, Any]] = []
+            files = run_module(key, module_name, mod_ctx, mod_errors)
+            for flag, step_key, step_module in CONVERSIONS.get(key, []):
+                if downloads.get(key, {}).get(flag, False):
+                    files = files + run_module(step_key, step_module, mod_ctx, mod_errors, cfg_key=key)
+            return files, mod_errors
+        return job
+
+    modules = [
+        ("natural_earth", "download_naturalearth"),
+        ("geofabrik_osm", "download_geofabrik_osm"),
+        ("worldpop", "download_worldpop"),
+        ("world_bank_wdi", "download_worldbank_wdi"),
+        ("faostat", "download_faostat"),
+        ("un_comtrade", "download_un_comtrade"),
+        ("transitland_gtfs", "download_transitland_gtfs"),
+    ]
+    jobs = []
+    keys = []
+    for key, module_name in modules:
+        if not downloads.get(key, {}).get("enabled", False):
+            print(f"[skip] {key}")
+            continue
+        keys.append(key)
+        jobs.append(module_job(key, module_name))
+
+    try:
+        results = scheduler.run_modules(jobs)
+    finally:
+        scheduler.close()
+
+    sources: List[Any] = []
+    if ctx.sources_path.exists():
+        sources = json.loads(ctx.sources_path.read_text(encoding="utf-8"))
+        if not isinstance(sources, list):
+            sources = [sources]
+    merged = False
+    checksums = read_checksums(ctx.checksums_path)
+    for key, (files, mod_errors) in zip(keys, results):
+        all_files.extend(files)
+        errors.extend(mod_errors)
+        staged = replace(ctx, log_root=staging_root / key)
+        if staged.sources_path.exists():
+            sources.extend(json.loads(staged.sources_path.read_text(encoding="utf-8")))
+            merged = True
+        checksums.update(read_checksums(staged.checksums_path))
+    # One line per file that still exists, sorted, however many runs appended to it.
+    write_checksums(ctx.checksums_path, {name: d for name, d in checksums.items() if (out_root / name).is_file()})
+    if merged:
+        write_json(ctx.sources_path, sources)
+    shutil.rmtree(staging_root, ignore_errors=True)
 
     # Generators
     if generators.get("synthetic_competitors", {}).get("enabled", False):
@@ -77,12 +140,20 @@ def main() -> None:
     if not ctx.checksums_path.exists():
         ctx.checksums_path.write_text("", encoding="utf-8")
 
+    # Data files become links to content-addressed blobs shared with other versions.
+    objects: Dict[str, str] = {}
+    if store is not None:
+        for path in sorted(set(all_files)):
+            if path.is_file():
+                objects[str(path.relative_to(out_root))] = store_file(path)
+
     if errors:
         errors_path = ctx.out_root / "errors.json"
         write_json(errors_path, errors)
         all_files.append(errors_path)
 
-    save_manifest(ctx, all_files + [ctx.sources_path, ctx.checksums_path])
+    save_manifest(ctx, all_files + [ctx.sources_path, ctx.checksums_path], objects)
+    checksum_cache.save()
     print("\nDone.")
     print(f"Output: {out_root}")
 
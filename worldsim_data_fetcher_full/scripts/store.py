@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Set
+
+from ._common import load_yaml
+from ._store import store_from_config
+
+def referenced_digests(output_root: Path) -> Set[str]:
+    """Blob digests listed in the ``objects`` of every dataset version's manifest.json."""
+    keep: Set[str] = set()
+    for manifest_path in sorted(output_root.glob("*/manifest.json")):
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        keep.update((manifest.get("objects") or {}).values())
+    return keep
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Maintain the content-addressed object store shared by dataset versions")
+    ap.add_argument("command", choices=["gc"], help="gc: delete blobs no manifest references")
+    ap.add_argument("--config", required=True, help="Path to YAML config")
+    ap.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    args = ap.parse_args()
+
+    cfg = load_yaml(Path(args.config))
+    output_root = Path(cfg.get("output_root", "data/raw"))
+    store = store_from_config(cfg.get("object_store") or {}, output_root)
+    if store is None:
+        print("object_store is not enabled in the config")
+        sys.exit(1)
+
+    keep = referenced_digests(output_root)
+    removed, freed = store.gc(keep, dry_run=args.dry_run)
+    verb = "Would delete" if args.dry_run else "Deleted"
+    print(f"{verb} {removed} blob(s), {freed / 1e6:.1f} MB; {len(keep)} referenced blob(s) kept in {store.root}")
+
+if __name__ == "__main__":
+    main()
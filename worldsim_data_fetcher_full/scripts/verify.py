@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from ._checksums import hash_file, read_checksums
+from ._common import load_yaml
+
+def verify(out_root: Path, workers: int = 8) -> Tuple[List[str], List[str], int]:
+    """Re-hash every file listed in ``checksums.sha256``; returns (missing, mismatched, checked count).
+
+    Files are always read in full (the checksum cache is not consulted);
+    hashlib releases the GIL, so the threads hash files in parallel.
+    """
+    expected: Dict[str, str] = read_checksums(out_root / "checksums.sha256")
+
+    def check(name: str) -> str:
+        path = out_root / name
+        if not path.is_file():
+            return "missing"
+        return "ok" if hash_file(path) == expected[name] else "mismatch"
+
+    names = sorted(expected)
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        results = list(pool.map(check, names))
+    missing = [n for n, r in zip(names, results) if r == "missing"]
+    mismatched = [n for n, r in zip(names, results) if r == "mismatch"]
+    return missing, mismatched, len(names)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Check a dataset version against its checksums.sha256")
+    ap.add_argument("--config", required=True, help="Path to YAML config")
+    ap.add_argument("--dataset-version", required=True, help="Dataset version string (e.g. 2026-01-06-demo)")
+    ap.add_argument("--workers", type=int, default=8, help="Files hashed in parallel")
+    args = ap.parse_args()
+
+    cfg = load_yaml(Path(args.config))
+    out_root = Path(cfg.get("output_root", "data/raw")) / args.dataset_version
+    if not (out_root / "checksums.sha256").exists():
+        print(f"No checksums.sha256 in {out_root}")
+        sys.exit(1)
+
+    missing, mismatched, checked = verify(out_root, args.workers)
+    for name in missing:
+        print(f"[missing]  {name}")
+    for name in mismatched:
+        print(f"[mismatch] {name}")
+    print(f"{checked - len(missing) - len(mismatched)}/{checked} files OK in {out_root}")
+    if missing or mismatched:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+INDEX_NAME = "wdi_index.json"
+VALUES_NAME = "wdi_values.f64"
+SCHEMA = "wdi-columnar"
+VERSION = 1
+
+
+def build_columns(indicators: Dict[str, Tuple[str, List[Dict[str, Any]]]]) -> Tuple[Dict[str, Any], bytes]:
+    """Lay out raw World Bank V2 rows as one dense float64 matrix per indicator.
+
+    ``indicators`` maps an indicator code to ``(name, rows)``. Every matrix
+    covers the union of countries (sorted by ISO3) and years, row-major by
+    country, with NaN where the API had no value. Returns the index document
+    and the little-endian values, indicator after indicator.
+    """
+    countries: Dict[str, Dict[str, str]] = {}
+    years = set()
+    for _, rows in indicators.values():
+        for row in rows:
+            iso3 = row.get("countryiso3code") or (row.get("country") or {}).get("id")
+            if not iso3 or not str(row.get("date", "")).isdigit():
+                continue
+            country = row.get("country") or {}
+            countries.setdefault(iso3, {"iso3": iso3, "id": country.get("id", ""), "name": country.get("value", "")})
+            years.add(int(row["date"]))
+    if not years:
+        raise ValueError("No World Bank rows with a country and a year")
+
+    iso3s = sorted(countries)
+    row_of = {iso3: i for i, iso3 in enumerate(iso3s)}
+    first, last = min(years), max(years)
+    n_years = last - first + 1
+    size = len(iso3s) * n_years
+
+    values = array("d")
+    index_indicators = []
+    for code in sorted(indicators):
+        name, rows = indicators[code]
+        matrix = array("d", [math.nan]) * size
+        count = 0
+        for row in rows:
+            iso3 = row.get("countryiso3code") or (row.get("country") or {}).get("id")
+            value = row.get("value")
+            if iso3 not in row_of or value is None or not str(row.get("date", "")).isdigit():
+                continue
+            matrix[row_of[iso3] * n_years + int(row["date"]) - first] = float(value)
+            count += 1
+        index_indicators.append({"code": code, "name": name, "offset": len(values), "values": count})
+        values.extend(matrix)
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    index = {
+        "schema": SCHEMA,
+        "version": VERSION,
+        "dtype": "float64",
+        "byteorder": "little",
+        "layout": "indicator, country, year (row-major)",
+        "years": [first, last],
+        "countries": [countries[iso3] for iso3 in iso3s],
+        "indicators": index_indicators,
+    }
+    return index, values.tobytes()
+
+
+class WdiStore:
+    """Read-only, memory-mapped view of a columnar WDI store written by ``convert_worldbank_wdi``.
+
+    Lookups slice the mapped file directly, so opening the store and
+    reading a few series for one country touch only those bytes.
+    """
+
+    def __init__(self, root: Path) -> None:
+        index = json.loads((root / INDEX_NAME).read_text(encoding="utf-8"))
+        if index.get("schema") != SCHEMA:
+            raise ValueError(f"Not a columnar WDI store: {root}")
+        self.countries: List[Dict[str, str]] = index["countries"]
+        self.first_year, self.last_year = index["years"]
+        self.years = list(range(self.first_year, self.last_year + 1))
+        self.indicators: Dict[str, Dict[str, Any]] = {ind["code"]: ind for ind in index["indicators"]}
+        self._row = {country["iso3"]: i for i, country in enumerate(self.countries)}
+        self._file = (root / VALUES_NAME).open("rb")
+        self._map: Optional[mmap.mmap] = None
+        if sys.byteorder == index["byteorder"]:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._values = memoryview(self._map).cast("d")
+        else:
+            values = array("d", self._file.read())
+            values.byteswap()
+            self._values = memoryview(values)
+
+    def __enter__(self) -> "WdiStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the store; ``matrix`` views still in use stay valid and keep the mapping alive."""
+        self._values.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Exported views (or numpy arrays wrapping them) still point into the
+                # mapping; it is unmapped when the last of them is garbage collected.
+                pass
+            self._map = None
+        self._file.close()
+
+    def __contains__(self, iso3: object) -> bool:
+        return iso3 in self._row
+
+    def country_name(self, iso3: str) -> str:
+        return self.countries[self._row[iso3]]["name"]
+
+    def _start(self, indicator: str, iso3: str) -> int:
+        try:
+            offset = self.indicators[indicator]["offset"]
+        except KeyError:
+            raise KeyError(f"Unknown indicator: {indicator}") from None
+        try:
+            row = self._row[iso3]
+        except KeyError:
+            raise KeyError(f"Unknown country: {iso3}") from None
+        return offset + row * len(self.years)
+
+    def series(self, indicator: str, iso3: str) -> List[float]:
+        """Values for ``self.years`` (NaN where missing)."""
+        start = self._start(indicator, iso3)
+        return self._values[start:start + len(self.years)].tolist()
+
+    def country(self, iso3: str, indicators: Optional[Iterable[str]] = None) -> Dict[str, List[float]]:
+        """``{indicator: series}`` for one country, all indicators by default."""
+        return {code: self.series(code, iso3) for code in (indicators or self.indicators)}
+
+    def value(self, indicator: str, iso3: str, year: int) -> float:
+        if not self.first_year <= year <= self.last_year:
+            return math.nan
+        return self._values[self._start(indicator, iso3) + year - self.first_year]
+
+    def matrix(self, indicator: str) -> memoryview:
+        """The whole country × year matrix (``numpy.asarray`` wraps it without copying).
+
+        The view stays readable after ``close``.
+        """
+        offset = self.indicators[indicator]["offset"]
+        view = self._values[offset:offset + len(self.countries) * len(self.years)]
+        return view.cast("B").cast("d", [len(self.countries), len(self.years)])
+
+
+def country_slice(store: WdiStore, iso3: str, indicators: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """JSON-ready slice for the browser: years plus one series per indicator, ``null`` for missing values."""
+    series = store.country(iso3, indicators)
+    return {
+        "iso3": iso3,
+        "name": store.country_name(iso3),
+        "years": store.years,
+        "indicators": {
+            code: [None if math.isnan(v) else v for v in values] for code, values in series.items()
+        },
+    }
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+
+from scripts import _common
+
+RETRY = {"attempts": 3, "backoff_seconds": 0.01}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves ``server.files`` with ETags, 304s and byte ranges; can drop the next GET mid-body."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+    def _headers_for(self, body: bytes) -> Optional[bytes]:
+        srv = self.server
+        tag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if self.headers.get("If-None-Match") == tag:
+            srv.count("304")
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        start, end, status = 0, len(body) - 1, 200
+        rng = self.headers.get("Range")
+        if rng and srv.ranges and self.headers.get("If-Range") in (None, tag):
+            first, last = rng.split("=")[1].split("-")
+            start, end = int(first), int(last) if last else len(body) - 1
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            status = 206
+            srv.count("range")
+        self.send_response(status)
+        self.send_header("ETag", tag)
+        self.send_header("Last-Modified", "Wed, 01 Jan 2025 00:00:00 GMT")
+        if srv.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        return body[start:end + 1]
+
+    def do_HEAD(self) -> None:
+        self.server.count("head")
+        self._headers_for(self.server.files[self.path])
+
+    def do_GET(self) -> None:
+        self.server.count("get")
+        part = self._headers_for(self.server.files[self.path])
+        if part is None:
+            return
+        with self.server.lock:
+            drop, self.server.drop_after = self.server.drop_after, 0
+        if drop and drop < len(part):
+            self.wfile.write(part[:drop])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+            return
+        self.wfile.write(part)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.files: Dict[str, bytes] = {}
+        self.ranges = True
+        self.drop_after = 0
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+
+class HttpGetStreamTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = _Server()
+        cls.server.files = {"/big.bin": os.urandom(3 * 1024 * 1024 + 123), "/small.bin": os.urandom(4000)}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        _common.configure_http({})
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name) / "big.bin"
+        self.server.ranges = True
+        self.server.drop_after = 0
+        self.server.stats = {}
+        _common.configure_http({"retry": RETRY})
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def fetch(self, name: str = "/big.bin", out: Optional[Path] = None) -> bool:
+        return _common.http_get_stream(self.base + name, out or self.out)
+
+    def assertDownloaded(self, name: str = "/big.bin", out: Optional[Path] = None) -> None:
+        out = out or self.out
+        body = self.server.files[name]
+        self.assertEqual(out.read_bytes(), body)
+        self.assertEqual(_common.sha256_file(out), hashlib.sha256(body).hexdigest())
+        self.assertFalse(out.with_name(out.name + ".part").exists())
+
+    def test_fresh_download(self) -> None:
+        self.assertTrue(self.fetch())
+        self.assertDownloaded()
+        state = json.loads(self.out.with_name("big.bin.http.json").read_text(encoding="utf-8"))
+        self.assertTrue(state["etag"])
+        self.assertNotIn("partial", state)
+
+    def test_unchanged_file_is_not_fetched_again(self) -> None:
+        self.fetch()
+        self.server.stats = {}
+        self.assertFalse(self.fetch())
+        self.assertEqual(self.server.stats, {"get": 1, "304": 1})
+        self.assertDownloaded()
+
+    def test_dropped_transfer_resumes_with_range(self) -> None:
+        self.server.drop_after = 1024 * 1024
+        self.assertTrue(self.fetch())
+        self.assertDownloaded()
+        self.assertEqual(self.server.stats, {"get": 2, "range": 1})
+
+    def test_stale_part_restarts(self) -> None:
+        self.fetch()
+        self.out.unlink()
+        self.out.with_name("big.bin.part").write_bytes(b"x" * 1000)
+        state_path = self.out.with_name("big.bin.http.json")
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        state.update(partial=True, etag='"old"')
+        state_path.write_text(json.dumps(state), encoding="utf-8")
+        self.server.stats = {}
+        self.assertTrue(self.fetch())
+        self.assertDownloaded()
+        self.assertEqual(self.server.stats, {"get": 1})
+
+    def test_parallel_ranges(self) -> None:
+        _common.configure_http({"retry": RETRY, "range_parts": 4, "range_min_mb": 1})
+        self.assertTrue(self.fetch())
+        self.assertDownloaded()
+        self.assertGreater(self.server.stats["range"], 1)
+        self.assertEqual(self.server.stats["get"], self.server.stats["range"])
+        self.server.stats = {}
+        self.assertFalse(self.fetch())
+        self.assertEqual(self.server.stats, {"head": 1, "304": 1})
+
+    def test_parallel_ranges_resume_after_drop(self) -> None:
+        _common.configure_http({"retry": RETRY, "range_parts": 4, "range_min_mb": 1})
+        self.server.drop_after = 100_000
+        self.assertTrue(self.fetch())
+        self.assertDownloaded()
+
+    def test_small_file_skips_ranges(self) -> None:
+        _common.configure_http({"retry": RETRY, "range_parts": 4, "range_min_mb": 1})
+        small = self.out.with_name("small.bin")
+        self.assertTrue(self.fetch("/small.bin", small))
+        self.assertDownloaded("/small.bin", small)
+        self.assertNotIn("range", self.server.stats)
+
+    def test_server_without_range_support(self) -> None:
+        self.server.ranges = False
+        _common.configure_http({"retry": RETRY, "range_parts": 4, "range_min_mb": 1})
+        self.assertTrue(self.fetch())
+        self.assertDownloaded()
+        self.assertEqual(self.server.stats, {"head": 1, "get": 1})
+        self.server.drop_after = 1024 * 1024
+        self.out.unlink()
+        self.assertTrue(self.fetch())
+        self.assertDownloaded()
+
+    def test_down_host_is_tried_attempts_times(self) -> None:
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        sends = []
+        send = requests.Session.send
+
+        def counting_send(session: requests.Session, *args: object, **kwargs: object) -> requests.Response:
+            sends.append(1)
+            return send(session, *args, **kwargs)
+
+        requests.Session.send = counting_send  # type: ignore[method-assign]
+        try:
+            with self.assertRaises(requests.ConnectionError):
+                _common.http_get_stream(f"http://127.0.0.1:{port}/big.bin", self.out, attempts=4)
+        finally:
+            requests.Session.send = send  # type: ignore[method-assign]
+        self.assertEqual(len(sends), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import gc
+import json
+import math
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.wdi_store import INDEX_NAME, VALUES_NAME, WdiStore, build_columns
+
+
+def _rows(code: str, values: dict) -> list:
+    return [
+        {"countryiso3code": iso3, "country": {"id": iso3[:2], "value": iso3}, "date": str(year), "value": value,
+         "indicator": {"id": code, "value": code}}
+        for (iso3, year), value in values.items()
+    ]
+
+
+class WdiStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        index, values = build_columns({
+            "POP": ("Population", _rows("POP", {("ESP", 2000): 40.0, ("FRA", 2001): 60.0})),
+            "GDP": ("GDP", _rows("GDP", {("ESP", 2001): 1.5})),
+        })
+        (self.root / INDEX_NAME).write_text(json.dumps(index), encoding="utf-8")
+        (self.root / VALUES_NAME).write_bytes(values)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_lookups(self) -> None:
+        with WdiStore(self.root) as store:
+            self.assertEqual(store.years, [2000, 2001])
+            self.assertEqual(store.series("POP", "ESP")[0], 40.0)
+            self.assertTrue(math.isnan(store.value("POP", "ESP", 2001)))
+            self.assertEqual(store.value("GDP", "ESP", 2001), 1.5)
+            self.assertNotIn("PRT", store)
+
+    def test_matrix_view_outlives_close(self) -> None:
+        with WdiStore(self.root) as store:
+            matrix = store.matrix("POP")
+        self.assertEqual(matrix[1, 1], 60.0)
+        store.close()
+        del matrix
+        gc.collect()
+
+
+if __name__ == "__main__":
+    unittest.main()